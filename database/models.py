@@ -118,4 +118,16 @@ class Prompt(Base):
 
     id = Column(String(255), primary_key=True, index=True)  # Строковый ключ, не автоинкрементный (например, 'recommendation_prompt')
     name = Column(String(255), nullable=False)
-    template = Column(Text, nullable=False)  # Сам текст промпта
\ No newline at end of file
+    template = Column(Text, nullable=False)  # Сам текст промпта
+    version = Column(Integer, nullable=False, default=1)  # Увеличивается при каждом изменении template
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class Cart(Base):
+    """
+    Entity representing a server-side shopping cart (written behind by the cart service).
+    """
+    __tablename__ = 'carts'
+
+    id = Column(String(64), primary_key=True, index=True)  # cart_id сессии
+    data = Column(Text, nullable=False)  # JSON корзины: строки с ценами, итоги, версия
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
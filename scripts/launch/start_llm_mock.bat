@@ -0,0 +1,11 @@
+@echo off
+chcp 65001 >nul
+echo Starting LLM Mock (OpenRouter stand-in) on port 8013...
+echo Recommender: set OPENROUTER_BASE_URL=http://127.0.0.1:8013/api/v1
+echo.
+
+cd /d %~dp0
+cd ..\..\services\llm-mock
+python -c "from main import app; import uvicorn; uvicorn.run(app, host='127.0.0.1', port=8013)"
+
+pause
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Production-режим запуска микросервисов: N воркеров на сервис.
+
+Каждый сервис запускается отдельным супервизором uvicorn (`--workers N`),
+который держит пул процессов, пингует каждый воркер (healthcheck) и
+перезапускает зависшие/упавшие воркеры. Этот скрипт следит за
+супервизорами, поднимает их заново при падении и пробрасывает SIGHUP
+для плавного (по одному воркеру) перезапуска без простоя.
+
+Количество воркеров задается через переменные окружения / config.env:
+    CATALOG_WORKERS, AUTH_WORKERS, ORDERS_WORKERS, USERS_WORKERS,
+    RECOMMENDER_WORKERS, CART_WORKERS, PROMPTS_MANAGER_WORKERS
+Значение "auto" (или 0) означает "по числу ядер CPU".
+
+uvloop/httptools подключаются автоматически (`--loop auto --http auto`),
+если установлены (входят в uvicorn[standard]).
+
+Использование:
+    python scripts/launch/start_services_production.py
+    python scripts/launch/start_services_production.py catalog auth
+
+Перезапуск воркеров без простоя (Linux/macOS):
+    kill -HUP <PID этого скрипта>
+"""
+
+import os
+import sys
+import time
+import signal
+import subprocess
+import requests
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Настройка кодировки для корректного отображения русских символов
+if sys.platform == "win32":
+    import codecs
+    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
+    sys.stderr = codecs.getwriter("utf-8")(sys.stderr.detach())
+
+BASE_PATH = Path(__file__).parent.parent.parent
+
+# Загружаем переменные окружения (config.env в корне проекта)
+config_path = BASE_PATH / 'config.env'
+if config_path.exists():
+    load_dotenv(config_path, override=False)
+
+# (имя, переменная порта, порт по умолчанию, путь, воркеров по умолчанию)
+# auth по умолчанию масштабируется на все ядра.
+# catalog, orders, cart и recommender держат состояние в памяти процесса (товары и их версия,
+# лента изменений, популярность; заказы, корзины, кэши), поэтому по умолчанию работают
+# в одном воркере: у каждого воркера было бы свое состояние. Больше воркеров - только
+# после переноса этого состояния в общее хранилище.
+SERVICES = [
+    ("catalog", "CATALOG_PORT", 8000, "services/catalog", "1"),
+    ("auth", "AUTH_PORT", 8001, "services/auth", "auto"),
+    ("orders", "ORDERS_PORT", 8010, "services/orders", "1"),
+    ("users", "USERS_PORT", 8011, "services/users", "1"),
+    ("prompts-manager", "PROMPTS_MANAGER_PORT", 8007, "services/prompts-manager", "1"),
+    ("recommender", "RECOMMENDER_PORT", 8012, "services/recommender", "1"),
+    ("cart", "CART_PORT", 8005, "services/cart", "1"),
+]
+
+# Максимальное количество перезапусков супервизора подряд, после которого сервис считается сломанным
+MAX_RESTARTS = 5
+
+
+def resolve_workers(service_name: str, default: str) -> int:
+    """Определяет количество воркеров для сервиса из переменной <SERVICE>_WORKERS."""
+    env_name = service_name.upper().replace("-", "_") + "_WORKERS"
+    value = os.getenv(env_name, default).strip().lower()
+    if value in ("auto", "0", ""):
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(value))
+    except ValueError:
+        print(f"⚠️  Некорректное значение {env_name}={value!r}, используем 1 воркер")
+        return 1
+
+
+class ProductionServiceManager:
+    def __init__(self, only=None):
+        self.base_path = BASE_PATH
+        self.host = os.getenv("SERVICES_HOST", "127.0.0.1")
+        self.graceful_timeout = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+        self.healthcheck_timeout = int(os.getenv("WORKER_HEALTHCHECK_TIMEOUT", "10"))
+        self.running = True
+        self.reload_requested = False
+        self.processes = []
+
+        self.services = []
+        for name, port_env, default_port, path, default_workers in SERVICES:
+            if only and name not in only:
+                continue
+            self.services.append({
+                'name': name,
+                'port': int(os.getenv(port_env, default_port)),
+                'path': self.base_path / path,
+                'workers': resolve_workers(name, default_workers),
+            })
+
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._reload_handler)
+
+    def _signal_handler(self, signum, frame):
+        """Обработчик сигналов для graceful shutdown"""
+        print(f"\n🛑 Получен сигнал остановки...")
+        self.running = False
+
+    def _reload_handler(self, signum, frame):
+        """SIGHUP: плавный перезапуск воркеров всех сервисов"""
+        self.reload_requested = True
+
+    def build_command(self, service):
+        """Команда запуска супервизора uvicorn для сервиса"""
+        return [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", self.host,
+            "--port", str(service['port']),
+            "--workers", str(service['workers']),
+            "--loop", "auto",
+            "--http", "auto",
+            "--timeout-graceful-shutdown", str(self.graceful_timeout),
+            "--timeout-worker-healthcheck", str(self.healthcheck_timeout),
+            "--no-access-log",
+        ]
+
+    def start_service(self, service):
+        """Запустить супервизор uvicorn для сервиса"""
+        if not (service['path'] / "main.py").exists():
+            print(f"❌ Файл {service['path'] / 'main.py'} не найден!")
+            return None
+
+        log_dir = self.base_path / "logs"
+        log_dir.mkdir(exist_ok=True)
+        stdout_file = open(log_dir / f"{service['name']}_stdout.log", 'a', encoding='utf-8')
+        stderr_file = open(log_dir / f"{service['name']}_stderr.log", 'a', encoding='utf-8')
+
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        # Число воркеров видно сервису (catalog отключает ленту изменений при нескольких воркерах)
+        env["WEB_CONCURRENCY"] = str(service['workers'])
+
+        process = subprocess.Popen(
+            self.build_command(service),
+            cwd=service['path'],
+            env=env,
+            stdout=stdout_file,
+            stderr=stderr_file,
+            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0
+        )
+        print(f"🚀 {service['name']}: порт {service['port']}, воркеров: {service['workers']} (PID супервизора: {process.pid})")
+        return {
+            'service': service,
+            'process': process,
+            'restarts': 0,
+            'stdout_file': stdout_file,
+            'stderr_file': stderr_file,
+        }
+
+    def check_service_health(self, service):
+        """Проверка /health сервиса (балансируется между воркерами)"""
+        try:
+            response = requests.get(f"http://127.0.0.1:{service['port']}/health", timeout=2)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    def start_all_services(self):
+        """Запустить все сервисы"""
+        print("🚀 Production-запуск микросервисов (логи в папке logs/)\n")
+        for service in self.services:
+            proc_info = self.start_service(service)
+            if proc_info:
+                self.processes.append(proc_info)
+        return len(self.processes) > 0
+
+    def wait_for_services_ready(self, timeout=60):
+        """Ожидание готовности сервисов"""
+        print("\n⏳ Ожидание готовности сервисов...")
+        start_time = time.time()
+        ready = set()
+        while time.time() - start_time < timeout and self.running:
+            for proc_info in self.processes:
+                name = proc_info['service']['name']
+                if name not in ready and self.check_service_health(proc_info['service']):
+                    ready.add(name)
+                    print(f"✅ {name} готов к работе")
+            if len(ready) == len(self.processes):
+                return True
+            time.sleep(1)
+        not_ready = [p['service']['name'] for p in self.processes if p['service']['name'] not in ready]
+        if not_ready:
+            print(f"⚠️  Не готовые сервисы: {', '.join(not_ready)}")
+        return False
+
+    def reload_all_services(self):
+        """Плавный перезапуск: uvicorn перезапускает воркеры по одному по SIGHUP"""
+        print("🔄 Плавный перезапуск воркеров...")
+        for proc_info in self.processes:
+            if proc_info['process'].poll() is None:
+                proc_info['process'].send_signal(signal.SIGHUP)
+                print(f"   🔄 {proc_info['service']['name']}: SIGHUP отправлен")
+
+    def monitor(self):
+        """Мониторинг супервизоров: перезапуск упавших, обработка SIGHUP"""
+        while self.running:
+            time.sleep(2)
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload_all_services()
+
+            for index, proc_info in enumerate(self.processes):
+                if not self.running or proc_info['process'].poll() is None:
+                    continue
+                name = proc_info['service']['name']
+                return_code = proc_info['process'].returncode
+                if proc_info['restarts'] >= MAX_RESTARTS:
+                    continue
+                print(f"⚠️  {name} остановлен неожиданно (код: {return_code}), перезапуск...")
+                proc_info['stdout_file'].close()
+                proc_info['stderr_file'].close()
+                time.sleep(min(2 ** proc_info['restarts'], 30))
+                new_info = self.start_service(proc_info['service'])
+                if new_info:
+                    new_info['restarts'] = proc_info['restarts'] + 1
+                    self.processes[index] = new_info
+                    if new_info['restarts'] >= MAX_RESTARTS:
+                        print(f"❌ {name} перезапускался {MAX_RESTARTS} раз подряд, смотрите logs/{name}_stderr.log")
+
+    def stop_all_services(self):
+        """Остановить все сервисы (uvicorn дожидается завершения активных запросов)"""
+        print("🛑 Остановка сервисов...")
+        for proc_info in self.processes:
+            process = proc_info['process']
+            try:
+                if process.poll() is None:
+                    if sys.platform == "win32":
+                        process.send_signal(signal.CTRL_BREAK_EVENT)
+                    else:
+                        process.terminate()
+                    try:
+                        process.wait(timeout=self.graceful_timeout + 5)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                    print(f"✅ {proc_info['service']['name']} остановлен")
+            except Exception as e:
+                print(f"⚠️  Ошибка при остановке {proc_info['service']['name']}: {e}")
+            finally:
+                proc_info['stdout_file'].close()
+                proc_info['stderr_file'].close()
+
+
+def main():
+    """Главная функция"""
+    manager = ProductionServiceManager(only=set(sys.argv[1:]) or None)
+    try:
+        if manager.start_all_services():
+            manager.wait_for_services_ready()
+            print("\n✅ Сервисы запущены. Ctrl+C - остановка, SIGHUP - плавный перезапуск воркеров\n")
+            manager.monitor()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop_all_services()
+        print("✅ Все сервисы остановлены.")
+
+
+if __name__ == "__main__":
+    main()
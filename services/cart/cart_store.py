@@ -0,0 +1,292 @@
+"""
+Серверные корзины с инкрементальным пересчетом итогов.
+
+Раньше каждый расчет корзины (POST /api/v1/cart/calculate) получал полный
+список product_ids, скачивал весь каталог и считал сумму заново, а
+количество товаров не учитывалось вовсе. Теперь корзина хранится на
+сервере (ключ - cart_id сессии), каждая строка помнит цену товара, а
+добавление, удаление и смена количества меняют итог на разницу
+(quantity_delta * price) - без пересчета остальных строк и без обращения
+к каталогу. Суммы хранятся в копейках, поэтому накопление не дает ошибок
+округления.
+
+Корзины живут в памяти (LRU + TTL с момента последнего изменения). Если
+передан writer, измененные корзины помечаются "грязными" и сохраняются
+пачкой при flush() (write-behind: запись в БД не задерживает ответ), а
+loader подгружает корзину, которой нет в памяти.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+def to_cents(price: float) -> int:
+    return int(round(price * 100))
+
+
+class CartLine:
+    """Строка корзины: товар с ценой на момент добавления и количество"""
+
+    __slots__ = ("product_id", "title", "artist", "price_cents", "image_url", "quantity")
+
+    def __init__(self, product_id: str, title: str, artist: str, price: float,
+                 image_url: Optional[str] = None, quantity: int = 0):
+        self.product_id = product_id
+        self.title = title
+        self.artist = artist
+        self.price_cents = to_cents(price)
+        self.image_url = image_url
+        self.quantity = quantity
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.product_id,
+            "title": self.title,
+            "artist": self.artist,
+            "price": self.price_cents / 100,
+            "image_url": self.image_url,
+            "quantity": self.quantity,
+            "line_total": self.price_cents * self.quantity / 100,
+        }
+
+
+class Cart:
+    """Корзина с поддерживаемыми итогами (сумма в копейках и число товаров)"""
+
+    def __init__(self, cart_id: str, updated_at: Optional[float] = None):
+        self.cart_id = cart_id
+        self.lines: "OrderedDict[str, CartLine]" = OrderedDict()
+        self.total_cents = 0
+        self.item_count = 0
+        self.version = 0  # Увеличивается при каждом изменении
+        self.price_version = None  # Версия каталога, по которой посчитаны цены строк
+        self.updated_at = updated_at or time.time()
+
+    def set_quantity(self, line: CartLine, quantity: int) -> bool:
+        """
+        Устанавливает количество товара (0 - убрать строку). Итоги меняются на разницу.
+        line - описание товара (используется, если товара еще нет в корзине).
+        Возвращает True, если корзина изменилась.
+        """
+        current = self.lines.get(line.product_id)
+        old_quantity = current.quantity if current else 0
+        if quantity == old_quantity:
+            return False
+        if current is None:
+            current = self.lines[line.product_id] = line
+        delta = quantity - old_quantity
+        self.total_cents += delta * current.price_cents
+        self.item_count += delta
+        if quantity == 0:
+            del self.lines[line.product_id]
+        else:
+            current.quantity = quantity
+        self.version += 1
+        self.updated_at = time.time()
+        return True
+
+    def reprice(self, price_version, price_of: Callable[[str], Optional[float]]) -> bool:
+        """
+        Переводит строки на цены новой версии каталога: итог меняется на разницу по каждой строке.
+        Товары, которых нет в каталоге, сохраняют прежнюю цену. Возвращает True, если итог изменился.
+        """
+        if price_version == self.price_version:
+            return False
+        self.price_version = price_version
+        changed = False
+        for line in self.lines.values():
+            price = price_of(line.product_id)
+            if price is None or to_cents(price) == line.price_cents:
+                continue
+            new_cents = to_cents(price)
+            self.total_cents += (new_cents - line.price_cents) * line.quantity
+            line.price_cents = new_cents
+            changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def quantity(self, product_id: str) -> int:
+        line = self.lines.get(product_id)
+        return line.quantity if line else 0
+
+    def to_dict(self) -> dict:
+        return {
+            "cart_id": self.cart_id,
+            "items": [line.to_dict() for line in self.lines.values()],
+            "total": self.total_cents / 100,
+            "item_count": self.item_count,
+            "version": self.version,
+            "price_version": self.price_version,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Cart":
+        cart = cls(data["cart_id"], data.get("updated_at"))
+        for item in data["items"]:
+            cart.set_quantity(
+                CartLine(item["id"], item["title"], item["artist"], item["price"], item.get("image_url")),
+                item["quantity"]
+            )
+        cart.version = data.get("version", cart.version)
+        cart.price_version = data.get("price_version")
+        cart.updated_at = data.get("updated_at", cart.updated_at)
+        return cart
+
+
+class CartStore:
+    """Корзины в памяти: LRU + TTL, опционально write-behind в постоянное хранилище"""
+
+    def __init__(self, max_carts: int = 10000, ttl_seconds: float = 7 * 86400,
+                 writer: Optional[Callable[[List[dict], List[str]], None]] = None,
+                 loader: Optional[Callable[[str], Optional[dict]]] = None):
+        self.max_carts = max_carts
+        self.ttl_seconds = ttl_seconds
+        self.writer = writer  # writer(измененные корзины, ID удаленных корзин)
+        self.loader = loader  # loader(cart_id) -> сохраненная корзина или None
+        self._carts: "OrderedDict[str, Cart]" = OrderedDict()
+        self._dirty = set()
+        self._pending: Dict[str, dict] = {}  # Вытесненные из памяти, но еще не записанные корзины
+        self._deleted = set()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+        self.expired = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_carts = 0
+
+    def create(self, cart_id: Optional[str] = None) -> Cart:
+        with self._lock:
+            cart = Cart(cart_id or uuid.uuid4().hex)
+            self._carts[cart.cart_id] = cart
+            self._deleted.discard(cart.cart_id)
+            self._evict()
+            return cart
+
+    def get(self, cart_id: str) -> Optional[Cart]:
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None and cart_id not in self._deleted:
+                stored = self._pending.pop(cart_id, None)
+                if stored is not None:
+                    self._dirty.add(cart_id)
+                elif self.loader:
+                    stored = self.loader(cart_id)
+                if stored is not None:
+                    cart = self._carts[cart_id] = Cart.from_dict(stored)
+                    self.loaded += 1
+                    self._evict()
+            if cart is None:
+                self.misses += 1
+                return None
+            if cart.updated_at + self.ttl_seconds < time.time():
+                self._drop(cart_id)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._carts.move_to_end(cart_id)
+            self.hits += 1
+            return cart
+
+    def get_or_create(self, cart_id: str) -> Cart:
+        with self._lock:
+            return self.get(cart_id) or self.create(cart_id)
+
+    def update(self, cart: Cart, changes: Iterable) -> bool:
+        """Применяет изменения [(CartLine, количество)] под блокировкой; грязная корзина уйдет в writer"""
+        with self._lock:
+            changed = False
+            for line, quantity in changes:
+                changed = cart.set_quantity(line, quantity) or changed
+            if changed:
+                self._dirty.add(cart.cart_id)
+            return changed
+
+    def add(self, cart: Cart, line: CartLine, delta: int) -> bool:
+        """
+        Увеличивает количество товара на delta: текущее количество читается под той же
+        блокировкой, поэтому параллельные добавления в одну корзину не теряются
+        """
+        with self._lock:
+            return self.update(cart, [(cart.lines.get(line.product_id) or line, cart.quantity(line.product_id) + delta)])
+
+    def reprice(self, cart: Cart, price_version, price_of: Callable[[str], Optional[float]]) -> bool:
+        """Cart.reprice под блокировкой; корзина с новыми ценами уйдет в writer"""
+        with self._lock:
+            changed = cart.reprice(price_version, price_of)
+            if changed:
+                self._dirty.add(cart.cart_id)
+            return changed
+
+    def delete(self, cart_id: str) -> bool:
+        with self._lock:
+            existed = self._carts.pop(cart_id, None) is not None
+            self._drop(cart_id)
+            return existed
+
+    def _drop(self, cart_id: str):
+        self._carts.pop(cart_id, None)
+        self._dirty.discard(cart_id)
+        self._pending.pop(cart_id, None)
+        if self.writer:
+            self._deleted.add(cart_id)
+
+    def _evict(self):
+        while len(self._carts) > self.max_carts:
+            cart_id, cart = self._carts.popitem(last=False)
+            self.evictions += 1
+            # Вытесненная из памяти корзина остается в хранилище: несохраненные изменения запишет flush
+            if cart_id in self._dirty:
+                self._dirty.discard(cart_id)
+                if self.writer:
+                    self._pending[cart_id] = cart.to_dict()
+
+    def flush(self) -> int:
+        """Передает измененные и удаленные корзины в writer. Возвращает число записанных корзин"""
+        if not self.writer:
+            return 0
+        with self._lock:
+            dirty = [self._carts[cart_id].to_dict() for cart_id in self._dirty if cart_id in self._carts]
+            dirty.extend(self._pending.values())
+            deleted = list(self._deleted)
+            self._dirty.clear()
+            self._pending.clear()
+            self._deleted.clear()
+        if not dirty and not deleted:
+            return 0
+        try:
+            self.writer(dirty, deleted)
+        except Exception:
+            # Не записали - повторим при следующем flush (если корзину с тех пор не удалили)
+            with self._lock:
+                for cart in dirty:
+                    if cart["cart_id"] in self._carts:
+                        self._dirty.add(cart["cart_id"])
+                    elif cart["cart_id"] not in self._deleted:
+                        self._pending.setdefault(cart["cart_id"], cart)
+                self._deleted.update(deleted)
+            raise
+        self.flushes += 1
+        self.flushed_carts += len(dirty)
+        return len(dirty)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "carts": len(self._carts),
+            "max_carts": self.max_carts,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loaded": self.loaded,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "write_behind": self.writer is not None,
+            "dirty": len(self._dirty) + len(self._pending),
+            "flushes": self.flushes,
+            "flushed_carts": self.flushed_carts,
+        }
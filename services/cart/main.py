@@ -1,9 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import requests
+import asyncio
+import importlib.util
+import json
 import os
+import re
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -18,6 +23,18 @@ for config_path in config_paths:
         load_dotenv(config_path, override=False)
         break
 
+# Соседние модули сервиса - доступны и при импорте из монолитного режима
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from cart_store import CartLine, CartStore
+from price_table import PriceTable
+
+# schemas.py есть и у других сервисов (catalog, orders) - в монолитном режиме
+# загружаем DTO корзины по пути, под собственным именем модуля
+_schemas_spec = importlib.util.spec_from_file_location("cart_schemas", Path(__file__).parent / "schemas.py")
+cart_schemas = importlib.util.module_from_spec(_schemas_spec)
+_schemas_spec.loader.exec_module(cart_schemas)
+CartIn, CartItemIn, CartQuantityIn = cart_schemas.CartIn, cart_schemas.CartItemIn, cart_schemas.CartQuantityIn
+
 # --- Приложение FastAPI ---
 app = FastAPI(
     title="Cart API",
@@ -40,6 +57,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Общая HTTP-сессия для вызовов catalog (keep-alive между запросами).
+# В монолитном режиме (services/monolith) на нее монтируется in-process адаптер.
+http_session = requests.Session()
+
 # Модели данных
 class CartRequest(BaseModel):
     product_ids: List[str]
@@ -55,164 +76,112 @@ class CartResponse(BaseModel):
     items: List[CartItem]
     total: float
 
-# Моковые данные для товаров (используются только как fallback, основные данные берутся из Catalog Service)
-# Обновлены на виниловые пластинки
-MOCK_PRODUCTS = {
-    "1": CartItem(
-        id="1",
-        title="Abbey Road",
-        artist="The Beatles",
-        price=29.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b273dcf4823e7b0b2934f2e45b8b"
-    ),
-    "2": CartItem(
-        id="2",
-        title="Sgt. Pepper's Lonely Hearts Club Band",
-        artist="The Beatles",
-        price=32.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "3": CartItem(
-        id="3",
-        title="The White Album",
-        artist="The Beatles",
-        price=39.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "4": CartItem(
-        id="4",
-        title="Revolver",
-        artist="The Beatles",
-        price=28.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "5": CartItem(
-        id="5",
-        title="The Dark Side of the Moon",
-        artist="Pink Floyd",
-        price=34.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "6": CartItem(
-        id="6",
-        title="The Wall",
-        artist="Pink Floyd",
-        price=44.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "7": CartItem(
-        id="7",
-        title="Wish You Were Here",
-        artist="Pink Floyd",
-        price=31.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "8": CartItem(
-        id="8",
-        title="Led Zeppelin IV",
-        artist="Led Zeppelin",
-        price=32.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "9": CartItem(
-        id="9",
-        title="Physical Graffiti",
-        artist="Led Zeppelin",
-        price=38.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "10": CartItem(
-        id="10",
-        title="A Night at the Opera",
-        artist="Queen",
-        price=31.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "11": CartItem(
-        id="11",
-        title="News of the World",
-        artist="Queen",
-        price=29.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "12": CartItem(
-        id="12",
-        title="Sticky Fingers",
-        artist="The Rolling Stones",
-        price=33.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "13": CartItem(
-        id="13",
-        title="Exile on Main St.",
-        artist="The Rolling Stones",
-        price=39.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "14": CartItem(
-        id="14",
-        title="The Doors",
-        artist="The Doors",
-        price=27.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "15": CartItem(
-        id="15",
-        title="Back in Black",
-        artist="AC/DC",
-        price=30.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "16": CartItem(
-        id="16",
-        title="Paranoid",
-        artist="Black Sabbath",
-        price=28.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "17": CartItem(
-        id="17",
-        title="The Rise and Fall of Ziggy Stardust",
-        artist="David Bowie",
-        price=32.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "18": CartItem(
-        id="18",
-        title="Highway 61 Revisited",
-        artist="Bob Dylan",
-        price=29.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "19": CartItem(
-        id="19",
-        title="Tommy",
-        artist="The Who",
-        price=35.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "20": CartItem(
-        id="20",
-        title="Machine Head",
-        artist="Deep Purple",
-        price=30.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "21": CartItem(
-        id="21",
-        title="Are You Experienced",
-        artist="Jimi Hendrix",
-        price=31.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    ),
-    "22": CartItem(
-        id="22",
-        title="London Calling",
-        artist="The Clash",
-        price=33.99,
-        image_url="https://i.scdn.co/image/ab67616d0000b2739c39ba8e4b4b4b4b4b4b4b4b"
-    )
-}
+CATALOG_SERVICE_URL = os.getenv("CATALOG_SERVICE_URL", "http://127.0.0.1:8000")
+
+# Локальная таблица цен: загружается один раз и перепроверяется по версии каталога
+# (условный запрос, 304 без тела, пока каталог не менялся). Цена товара - поиск в словаре,
+# при недоступности каталога используется последняя загруженная версия
+price_table = PriceTable(refresh_seconds=float(os.getenv("CART_PRICE_REFRESH_SECONDS", "5")))
+price_refresh_task: Optional[asyncio.Task] = None
+
+def fetch_catalog_prices(etag: Optional[str]):
+    """Условный запрос каталога для PriceTable.refresh"""
+    headers = {"If-None-Match": etag} if etag else {}
+    response = http_session.get(f"{CATALOG_SERVICE_URL}/api/v1/products", headers=headers, timeout=5)
+    if response.status_code == 304:
+        return 304, etag, None
+    return response.status_code, response.headers.get("ETag"), response.json() if response.status_code == 200 else None
+
+def refresh_price_table() -> bool:
+    """Перепроверяет таблицу цен; ошибка пробрасывается (таблица остается прежней)"""
+    reloaded = price_table.refresh(fetch_catalog_prices)
+    if reloaded:
+        print(f"Cart Service: загружена таблица цен: {len(price_table.entries)} товаров (версия каталога {price_table.version})")
+    return reloaded
+
+def ensure_price_table():
+    """
+    Таблица цен для обработки запроса. Без фоновой перепроверки (или если она давно
+    не срабатывала) перепроверяет каталог сама; если таблицы еще нет и каталог
+    недоступен - 503.
+    """
+    if price_table.age() < price_table.refresh_seconds * 3:
+        return
+    try:
+        refresh_price_table()
+    except Exception as e:
+        if not price_table.loaded:
+            raise HTTPException(status_code=503, detail=f"Каталог недоступен, цены не загружены: {e}")
+        print(f"Cart Service: каталог недоступен, используем цены версии {price_table.version}: {e}")
+
+def price_of(product_id: str) -> Optional[float]:
+    entry = price_table.get(product_id)
+    return entry.price if entry else None
+
+def cart_line(product_id: str) -> CartLine:
+    """Описание товара для строки корзины (404, если товара нет в каталоге)"""
+    ensure_price_table()
+    entry = price_table.get(product_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Товар {product_id} не найден")
+    return CartLine(entry.id, entry.title, entry.artist, entry.price, entry.image_url)
+
+# --- Write-behind корзин в БД (CART_DB_WRITE_BEHIND=true) ---
+CART_DB_WRITE_BEHIND = os.getenv("CART_DB_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+CART_DB_FLUSH_SECONDS = float(os.getenv("CART_DB_FLUSH_SECONDS", "5"))
+
+def write_carts_to_db(carts: List[dict], deleted_ids: List[str]):
+    """Сохраняет измененные корзины и удаляет удаленные (одна транзакция на пачку)"""
+    db = connection.SessionLocal()
+    try:
+        for cart in carts:
+            db.merge(models.Cart(id=cart["cart_id"], data=json.dumps(cart, ensure_ascii=False)))
+        if deleted_ids:
+            db.query(models.Cart).filter(models.Cart.id.in_(deleted_ids)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def load_cart_from_db(cart_id: str) -> Optional[dict]:
+    db = connection.SessionLocal()
+    try:
+        record = db.get(models.Cart, cart_id)
+        return json.loads(record.data) if record else None
+    finally:
+        db.close()
+
+if CART_DB_WRITE_BEHIND:
+    # Корневая папка проекта - для пакета database
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+    from database import models, connection
+
+# Серверные корзины: ключ - cart_id сессии, итоги пересчитываются инкрементально
+cart_store = CartStore(
+    max_carts=int(os.getenv("CART_MAX_CARTS", "10000")),
+    ttl_seconds=float(os.getenv("CART_TTL_SECONDS", str(7 * 86400))),
+    writer=write_carts_to_db if CART_DB_WRITE_BEHIND else None,
+    loader=load_cart_from_db if CART_DB_WRITE_BEHIND else None
+)
+cart_flush_task: Optional[asyncio.Task] = None
+
+CART_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def require_cart(cart_id: str):
+    cart = cart_store.get(cart_id)
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Корзина не найдена или истекла")
+    refresh_cart_prices(cart)
+    return cart
+
+def refresh_cart_prices(cart):
+    """Переводит корзину на цены текущей версии каталога (пересчет только при смене версии)"""
+    if price_table.loaded:
+        ensure_price_table()
+        cart_store.reprice(cart, price_table.version, price_of)
+
+def validate_cart_id(cart_id: str):
+    if not CART_ID_PATTERN.match(cart_id):
+        raise HTTPException(status_code=400, detail="cart_id: до 64 символов из латиницы, цифр, '-' и '_'")
 
 @app.get("/health", tags=["Health Check"])
 def health_check():
@@ -220,81 +189,193 @@ def health_check():
 
 @app.post("/api/v1/cart/calculate", tags=["Cart"])
 def calculate_cart(request: CartRequest):
-    """Рассчитывает стоимость корзины на основе переданных ID товаров."""
+    """Рассчитывает стоимость корзины на основе переданных ID товаров (по локальной таблице цен)."""
+    ensure_price_table()
     items = []
     total = 0.0
-    found_ids = []
     missing_ids = []
     
-    print(f"Cart Service: получен запрос с ID товаров: {request.product_ids}")
-    
-    # Сначала пытаемся получить данные из Catalog Service
-    catalog_url = os.getenv("CATALOG_SERVICE_URL", "http://127.0.0.1:8000")
-    
-    try:
-        # Получаем все товары из каталога
-        catalog_response = requests.get(f"{catalog_url}/api/v1/products", timeout=5)
-        if catalog_response.status_code == 200:
-            catalog_data = catalog_response.json()
-            catalog_products = catalog_data.get("products", [])
-            
-            # Создаем словарь для быстрого поиска
-            catalog_dict = {str(p["id"]): p for p in catalog_products}
-            
-            for product_id in request.product_ids:
-                product_id_str = str(product_id)
-                if product_id_str in catalog_dict:
-                    # Используем данные из каталога
-                    product = catalog_dict[product_id_str]
-                    item = CartItem(
-                        id=product_id_str,
-                        title=product.get("name") or product.get("title", ""),
-                        artist=product.get("artist") or product.get("author", "Неизвестный исполнитель"),
-                        price=product.get("price", 0.0),
-                        image_url=product.get("cover_url") or product.get("cover_image_url") or product.get("image_url")
-                    )
-                    items.append(item)
-                    total += item.price
-                    found_ids.append(product_id)
-                elif product_id_str in MOCK_PRODUCTS:
-                    # Fallback на моковые данные
-                    item = MOCK_PRODUCTS[product_id_str]
-                    items.append(item)
-                    total += item.price
-                    found_ids.append(product_id)
-                else:
-                    missing_ids.append(product_id)
-                    print(f"Cart Service: товар с ID '{product_id}' не найден")
-        else:
-            # Если не удалось получить из каталога, используем моки
-            print(f"Cart Service: не удалось получить данные из Catalog Service (status: {catalog_response.status_code}), используем моковые данные")
-            for product_id in request.product_ids:
-                product_id_str = str(product_id)
-                if product_id_str in MOCK_PRODUCTS:
-                    item = MOCK_PRODUCTS[product_id_str]
-                    items.append(item)
-                    total += item.price
-                    found_ids.append(product_id)
-                else:
-                    missing_ids.append(product_id)
-    except Exception as e:
-        # Если ошибка при обращении к каталогу, используем моки
-        print(f"Cart Service: ошибка при обращении к Catalog Service: {e}, используем моковые данные")
-        for product_id in request.product_ids:
-            product_id_str = str(product_id)
-            if product_id_str in MOCK_PRODUCTS:
-                item = MOCK_PRODUCTS[product_id_str]
-                items.append(item)
-                total += item.price
-                found_ids.append(product_id)
-            else:
-                missing_ids.append(product_id)
+    for product_id in request.product_ids:
+        entry = price_table.get(str(product_id))
+        if entry is None:
+            missing_ids.append(product_id)
+            continue
+        items.append(CartItem(
+            id=entry.id,
+            title=entry.title,
+            artist=entry.artist,
+            price=entry.price,
+            image_url=entry.image_url
+        ))
+        total += entry.price
     
-    print(f"Cart Service: найдено товаров: {len(found_ids)}, не найдено: {len(missing_ids)}")
-    print(f"Cart Service: итоговая сумма: {total}")
+    if missing_ids:
+        print(f"Cart Service: товары не найдены в каталоге (версия {price_table.version}): {missing_ids}")
     
     return CartResponse(items=items, total=total)
 
+@app.post("/api/v1/carts", tags=["Carts"])
+def create_cart(request: Optional[CartIn] = None):
+    """Создает серверную корзину (опционально сразу с товарами). cart_id хранится на клиенте"""
+    cart = cart_store.create()
+    refresh_cart_prices(cart)
+    if request and request.items:
+        cart_store.update(cart, [(cart_line(str(item.vinyl_id)), item.quantity) for item in request.items])
+    return cart.to_dict()
+
+@app.get("/api/v1/carts/stats", tags=["Carts"])
+def get_cart_store_stats():
+    """Статистика хранилища корзин и таблицы цен"""
+    return {**cart_store.stats(), "price_table": price_table.stats()}
+
+@app.get("/api/v1/carts/{cart_id}", tags=["Carts"])
+def get_cart(cart_id: str):
+    """Корзина с готовыми итогами (без пересчета и без обращения к каталогу)"""
+    return require_cart(cart_id).to_dict()
+
+@app.put("/api/v1/carts/{cart_id}", tags=["Carts"])
+def replace_cart(cart_id: str, request: CartIn):
+    """
+    Синхронизирует корзину с переданным составом (создает, если ее нет или она истекла).
+    Меняются только строки с другим количеством; товары, которых нет в запросе, убираются.
+    """
+    validate_cart_id(cart_id)
+    cart = cart_store.get_or_create(cart_id)
+    refresh_cart_prices(cart)
+    wanted = {}
+    for item in request.items:
+        wanted[str(item.vinyl_id)] = wanted.get(str(item.vinyl_id), 0) + item.quantity
+    changes = [(line, 0) for product_id, line in list(cart.lines.items()) if product_id not in wanted]
+    for product_id, quantity in wanted.items():
+        if cart.quantity(product_id) != quantity:
+            line = cart.lines.get(product_id) or cart_line(product_id)
+            changes.append((line, quantity))
+    cart_store.update(cart, changes)
+    return cart.to_dict()
+
+@app.post("/api/v1/carts/{cart_id}/items", tags=["Carts"])
+def add_cart_item(cart_id: str, item: CartItemIn):
+    """Добавляет quantity экземпляров товара"""
+    cart = require_cart(cart_id)
+    product_id = str(item.vinyl_id)
+    line = cart.lines.get(product_id) or cart_line(product_id)
+    cart_store.add(cart, line, item.quantity)
+    return cart.to_dict()
+
+@app.put("/api/v1/carts/{cart_id}/items/{product_id}", tags=["Carts"])
+def set_cart_item_quantity(cart_id: str, product_id: str, request: CartQuantityIn):
+    """Устанавливает количество товара (0 - убрать)"""
+    cart = require_cart(cart_id)
+    line = cart.lines.get(product_id)
+    if line is None:
+        if request.quantity == 0:
+            return cart.to_dict()
+        line = cart_line(product_id)
+    cart_store.update(cart, [(line, request.quantity)])
+    return cart.to_dict()
+
+@app.delete("/api/v1/carts/{cart_id}/items/{product_id}", tags=["Carts"])
+def remove_cart_item(cart_id: str, product_id: str):
+    """Убирает товар из корзины"""
+    cart = require_cart(cart_id)
+    line = cart.lines.get(product_id)
+    if line is not None:
+        cart_store.update(cart, [(line, 0)])
+    return cart.to_dict()
+
+@app.delete("/api/v1/carts/{cart_id}", tags=["Carts"])
+def delete_cart(cart_id: str):
+    """Удаляет корзину (например, после оформления заказа)"""
+    if not cart_store.delete(cart_id):
+        raise HTTPException(status_code=404, detail="Корзина не найдена")
+    return {"deleted": True}
+
+async def flush_carts_periodically():
+    """Раз в CART_DB_FLUSH_SECONDS записывает измененные корзины в БД"""
+    while True:
+        await asyncio.sleep(CART_DB_FLUSH_SECONDS)
+        try:
+            flushed = await asyncio.to_thread(cart_store.flush)
+            if flushed:
+                print(f"Cart Service: сохранено корзин в БД: {flushed}")
+        except Exception as e:
+            print(f"Cart Service: ошибка записи корзин в БД (повторим): {e}")
+
+def fetch_catalog_changes() -> dict:
+    """Long-poll ленты изменений каталога после текущей позиции таблицы цен"""
+    poll_timeout = price_table.refresh_seconds * 2
+    response = http_session.get(
+        f"{CATALOG_SERVICE_URL}/api/v1/changes",
+        params={"since": price_table.feed_seq, "epoch": price_table.feed_epoch, "timeout": poll_timeout},
+        timeout=poll_timeout + 10
+    )
+    if response.status_code == 409:
+        # Каталог перезапущен в нескольких воркерах - ленты нет, загружаем каталог заново
+        return {"reset": True}
+    response.raise_for_status()
+    return response.json()
+
+async def watch_catalog_prices():
+    """
+    Фоновая задача: таблица цен обновляется лентой изменений каталога (приходят только
+    измененные пластинки); каталог без ленты перепроверяется раз в CART_PRICE_REFRESH_SECONDS
+    """
+    catalog_available = True
+    while True:
+        try:
+            if price_table.feed_epoch is None:
+                await asyncio.to_thread(refresh_price_table)
+            if price_table.feed_epoch is None:
+                await asyncio.sleep(price_table.refresh_seconds)
+                continue
+            feed = await asyncio.to_thread(fetch_catalog_changes)
+            if not price_table.apply_changes(feed):
+                print("Cart Service: лента изменений каталога не продолжает таблицу цен, загружаем каталог заново")
+                price_table.reset_feed()
+            catalog_available = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if catalog_available:
+                print(f"Cart Service: не удалось обновить таблицу цен: {e}")
+            catalog_available = False
+            await asyncio.sleep(price_table.refresh_seconds)
+
+@app.on_event("startup")
+async def start_price_refresh():
+    global price_refresh_task
+    price_refresh_task = asyncio.create_task(watch_catalog_prices())
+
+@app.on_event("shutdown")
+async def stop_price_refresh():
+    if price_refresh_task:
+        price_refresh_task.cancel()
+        try:
+            await price_refresh_task
+        except asyncio.CancelledError:
+            pass
+
+@app.on_event("startup")
+async def start_cart_write_behind():
+    global cart_flush_task
+    if CART_DB_WRITE_BEHIND:
+        connection.init_db()
+        cart_flush_task = asyncio.create_task(flush_carts_periodically())
+
+@app.on_event("shutdown")
+async def stop_cart_write_behind():
+    if cart_flush_task:
+        cart_flush_task.cancel()
+        try:
+            await cart_flush_task
+        except asyncio.CancelledError:
+            pass
+        try:
+            flushed = cart_store.flush()
+            print(f"Cart Service: при остановке сохранено корзин в БД: {flushed}")
+        except Exception as e:
+            print(f"Cart Service: не удалось сохранить корзины при остановке: {e}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8005)  # Изменено с 8001 на 8005 для избежания конфликта с auth
\ No newline at end of file
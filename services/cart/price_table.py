@@ -0,0 +1,158 @@
+"""
+Локальная таблица цен и описаний товаров для cart service.
+
+Раньше calculate_cart на каждый запрос скачивал весь каталог и строил из
+него словарь, а при недоступности каталога подставлял устаревший
+MOCK_PRODUCTS с ценами в другой валюте. Теперь таблица загружается один
+раз и перепроверяется условным запросом по версии каталога (If-None-Match
+с ETag): пока каталог не менялся, он отвечает 304 без тела, и таблица
+остается прежней. Новая версия заменяет таблицу целиком одной операцией
+присваивания - читатели видят либо старую, либо новую таблицу.
+
+Между полными загрузками таблица обновляется лентой изменений каталога
+(GET /api/v1/changes): apply_changes применяет только измененные пластинки.
+Если лента сообщает о пропуске изменений (reset), таблица загружается заново.
+
+Цена товара в корзине - поиск в словаре. Если каталог ненадолго
+недоступен, используется последняя загруженная версия.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class PriceEntry:
+    """Цена и данные товара для строки корзины"""
+
+    __slots__ = ("id", "title", "artist", "price", "image_url")
+
+    def __init__(self, id: str, title: str, artist: str, price: float, image_url: Optional[str] = None):
+        self.id = id
+        self.title = title
+        self.artist = artist
+        self.price = price
+        self.image_url = image_url
+
+    @classmethod
+    def from_product(cls, product: dict) -> "PriceEntry":
+        return cls(
+            id=str(product["id"]),
+            title=product.get("name") or product.get("title", ""),
+            artist=product.get("artist") or product.get("author", "Неизвестный исполнитель"),
+            price=float(product.get("price", 0.0)),
+            image_url=product.get("cover_url") or product.get("cover_image_url") or product.get("image_url")
+        )
+
+
+# fetch(etag) -> (HTTP-статус, ETag ответа, JSON каталога или None при 304)
+CatalogFetch = Callable[[Optional[str]], Tuple[int, Optional[str], Optional[dict]]]
+
+
+class PriceTable:
+    """Таблица товаров каталога (ID -> PriceEntry), обновляемая по версии каталога"""
+
+    def __init__(self, refresh_seconds: float = 5.0):
+        self.refresh_seconds = refresh_seconds
+        self.entries: Dict[str, PriceEntry] = {}
+        self.version = None
+        self.etag: Optional[str] = None
+        self.loaded = False
+        self.checked_at = 0.0  # time.monotonic() последней успешной перепроверки
+        self.last_error: Optional[str] = None
+        self.feed_epoch: Optional[str] = None  # Позиция в ленте изменений каталога
+        self.feed_seq = 0
+        self.reloads = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.changes_applied = 0
+        self._refresh_lock = threading.Lock()
+
+    def get(self, product_id: str) -> Optional[PriceEntry]:
+        return self.entries.get(product_id)
+
+    def age(self) -> float:
+        return time.monotonic() - self.checked_at if self.loaded else float("inf")
+
+    def refresh(self, fetch: CatalogFetch) -> bool:
+        """
+        Перепроверяет каталог. Возвращает True, если загружена новая версия.
+        Одновременные перепроверки не дублируются: пока идет одна, остальные сразу возвращают False.
+        Ошибка загрузки пробрасывается, таблица при этом остается прежней.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            status, etag, data = fetch(self.etag if self.loaded else None)
+            if status == 304 and self.loaded:
+                self.checked_at = time.monotonic()
+                self.last_error = None
+                self.not_modified += 1
+                return False
+            if status != 200 or data is None:
+                raise RuntimeError(f"каталог вернул статус {status}")
+            entries = {}
+            for product in data.get("products", []):
+                entry = PriceEntry.from_product(product)
+                entries[entry.id] = entry
+            self.entries = entries
+            self.version = data.get("version")
+            self.etag = etag
+            self.feed_epoch = data.get("epoch")
+            self.feed_seq = data.get("seq", 0)
+            self.loaded = True
+            self.checked_at = time.monotonic()
+            self.last_error = None
+            self.reloads += 1
+            return True
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            raise
+        finally:
+            self._refresh_lock.release()
+
+    def apply_changes(self, feed: dict) -> bool:
+        """
+        Применяет ответ ленты изменений каталога. Возвращает False, если лента не продолжает
+        загруженную версию (reset или другой epoch) - тогда таблицу нужно загрузить заново.
+        """
+        if feed.get("reset") or not self.loaded or feed.get("epoch") != self.feed_epoch:
+            return False
+        changes = feed.get("changes", [])
+        if changes:
+            # Копия с изменениями заменяет таблицу целиком, как и при полной загрузке
+            entries = dict(self.entries)
+            for change in changes:
+                product_id = str(change["product_id"])
+                if change["op"] == "delete" or change.get("product") is None:
+                    entries.pop(product_id, None)
+                else:
+                    entries[product_id] = PriceEntry.from_product(change["product"])
+            self.entries = entries
+            self.changes_applied += len(changes)
+        self.version = feed.get("version", self.version)
+        self.etag = feed.get("etag")
+        self.feed_seq = feed.get("seq", self.feed_seq)
+        self.checked_at = time.monotonic()
+        self.last_error = None
+        return True
+
+    def reset_feed(self):
+        """Следующий refresh загрузит каталог целиком (лента изменений не продолжает таблицу)"""
+        self.feed_epoch = None
+        self.etag = None
+
+    def stats(self) -> dict:
+        return {
+            "products": len(self.entries),
+            "version": self.version,
+            "loaded": self.loaded,
+            "age_seconds": round(self.age(), 1) if self.loaded else None,
+            "stale": self.age() > self.refresh_seconds * 3,
+            "reloads": self.reloads,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "changes_applied": self.changes_applied,
+            "feed_seq": self.feed_seq if self.feed_epoch else None,
+            "last_error": self.last_error,
+        }
@@ -18,6 +18,12 @@ class CartIn(BaseModel):
     """
     items: List[CartItemIn]
 
+class CartQuantityIn(BaseModel):
+    """
+    Новое количество товара в серверной корзине (0 - убрать товар).
+    """
+    quantity: int = Field(..., ge=0, description="Количество экземпляров")
+
 # ====================================================================
 # Output DTOs
 # ====================================================================
@@ -0,0 +1,157 @@
+"""
+Неизменяемые версионные снимки каталога (copy-on-write).
+
+Обработчики catalog синхронные и выполняются в потоках threadpool. Раньше
+update_product менял общие объекты Product на месте, а delete_product
+подменял глобальный список products, поэтому читатель в соседнем потоке
+мог увидеть наполовину обновленную пластинку или перебирать список,
+который в этот момент заменяют.
+
+Теперь каталог - снимок CatalogSnapshot: кортеж неизменяемых (frozen)
+пластинок, индекс по ID и номер версии. Читатель берет текущий снимок
+одним чтением атрибута, без блокировок, и работает с ним до конца запроса -
+все, что он видит, относится к одной версии. Писатель под блокировкой
+записи собирает черновик из текущего снимка, заменяет в нем измененные
+пластинки новыми объектами и публикует новый снимок одним присваиванием.
+Писатели выстраиваются в очередь на блокировке записи, читателей они не
+задерживают.
+
+Для больших каталогов есть компактный вариант снимка с тем же интерфейсом
+(compact_catalog.CompactSnapshot): колонки NumPy вместо объектов Product.
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (операция create/update/delete, ID пластинки, пластинка после изменения или None для delete)
+Change = Tuple[str, int, Optional[dict]]
+
+
+class CatalogSnapshot:
+    """Версия каталога: пластинки в порядке каталога и индекс по ID. После публикации не меняется"""
+
+    __slots__ = ("version", "seq", "products", "by_id", "_fingerprint")
+
+    def __init__(self, version: int, products: Iterable, seq: int = 0):
+        self.version = version
+        self.seq = seq  # Позиция ленты изменений, соответствующая этой версии
+        self.products = tuple(products)
+        self.by_id: Dict[int, object] = {product.id: product for product in self.products}
+        self._fingerprint: Optional[str] = None
+
+    def fingerprint(self) -> str:
+        """
+        Хэш содержимого снимка (для ETag): одинаковый в любом процессе с тем же каталогом,
+        в отличие от номера версии. Считается один раз на снимок
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=12)
+            for product in self.products:
+                digest.update(product.model_dump_json().encode("utf-8"))
+                digest.update(b"\n")
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def get(self, product_id) -> Optional[object]:
+        """Пластинка по ID (строка из пути запроса или число); None, если нет"""
+        try:
+            return self.by_id.get(int(product_id))
+        except (TypeError, ValueError):
+            return None
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def select(self, artist_id: Optional[int] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, sort: Optional[str] = None, ranking: Sequence[int] = (),
+               offset: int = 0, limit: Optional[int] = None) -> Tuple[int, list]:
+        """
+        Фильтр по исполнителю и цене, сортировка (price, -price, popular - по ranking,
+        остальные в порядке каталога) и страница. Возвращает (всего найдено, пластинки страницы)
+        """
+        items = [
+            p for p in self.products
+            if (artist_id is None or p.artist_id == artist_id)
+            and (min_price is None or p.price >= min_price)
+            and (max_price is None or p.price <= max_price)
+        ]
+        if sort == "price":
+            items.sort(key=lambda p: p.price)
+        elif sort == "-price":
+            items.sort(key=lambda p: -p.price)
+        elif sort == "popular":
+            rank = {product_id: position for position, product_id in enumerate(ranking)}
+            items.sort(key=lambda p: rank.get(p.id, len(rank)))
+        end = None if limit is None else offset + limit
+        return len(items), items[offset:end]
+
+    def draft(self) -> "SnapshotDraft":
+        return SnapshotDraft(self)
+
+
+class SnapshotDraft:
+    """Черновик следующей версии: изменения копятся здесь, текущий снимок не трогается"""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.base = snapshot
+        self._products = dict(snapshot.by_id)  # dict сохраняет порядок каталога
+        self.changes: List[Change] = []
+
+    def get(self, product_id) -> Optional[object]:
+        try:
+            return self._products.get(int(product_id))
+        except (TypeError, ValueError):
+            return None
+
+    def next_id(self) -> int:
+        return max(self._products, default=0) + 1
+
+    def put(self, product):
+        """Добавляет пластинку или заменяет ее новой версией (объект в снимке не меняется)"""
+        op = "update" if product.id in self._products else "create"
+        self._products[product.id] = product
+        self.changes.append((op, product.id, product.model_dump()))
+
+    def delete(self, product_id: int) -> bool:
+        if self._products.pop(product_id, None) is None:
+            return False
+        self.changes.append(("delete", product_id, None))
+        return True
+
+    def build(self, seq: int) -> CatalogSnapshot:
+        return CatalogSnapshot(self.base.version + 1, self._products.values(), seq)
+
+
+class CatalogStore:
+    """Текущий снимок каталога; запись - сборка и атомарная публикация нового снимка"""
+
+    def __init__(self, products: Iterable, on_publish: Optional[Callable[[int, List[Change]], int]] = None,
+                 snapshot_factory: Callable[[int, Iterable], object] = CatalogSnapshot):
+        # on_publish(версия, изменения) -> позиция ленты изменений после них
+        # snapshot_factory(версия, пластинки) - первый снимок (CatalogSnapshot или компактный)
+        self.on_publish = on_publish
+        self._snapshot = snapshot_factory(1, products)
+        self._write_lock = threading.Lock()
+        self.publishes = 0
+
+    def current(self) -> CatalogSnapshot:
+        """Текущий снимок (без блокировок): читатель работает с ним до конца запроса"""
+        return self._snapshot
+
+    @contextmanager
+    def update(self):
+        """
+        Изменение каталога: with store.update() as draft: draft.put(...) / draft.delete(...).
+        Новый снимок публикуется при выходе из блока, если были изменения; при исключении
+        черновик отбрасывается.
+        """
+        with self._write_lock:
+            draft = self._snapshot.draft()
+            yield draft
+            if not draft.changes:
+                return
+            version = self._snapshot.version + 1
+            seq = self.on_publish(version, draft.changes) if self.on_publish else self._snapshot.seq
+            self._snapshot = draft.build(seq)
+            self.publishes += 1
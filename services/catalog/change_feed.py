@@ -0,0 +1,113 @@
+"""
+Лента изменений каталога для локальных реплик в других сервисах.
+
+Cart, orders и recommender держат копию каталога и раньше перепроверяли ее
+только целиком: любое изменение одной пластинки означало повторную загрузку
+всего каталога. Теперь каждое изменение из админки (create, update, delete)
+получает порядковый номер seq и попадает в ленту вместе с новым состоянием
+пластинки. Реплика один раз загружает каталог (ответ GET /api/v1/products
+содержит epoch и seq, с которого продолжать), а дальше long-poll запросами
+GET /api/v1/changes получает только изменения после своего seq - так же,
+как recommender следит за лентой prompts-manager.
+
+Лента хранит последние max_changes изменений. Если реплика отстала сильнее
+(или каталог перезапущен - другой epoch), ответ содержит reset=true, и
+реплика загружает каталог заново.
+
+Лента живет в памяти процесса, как и сам каталог. Если catalog запущен в
+нескольких воркерах (CATALOG_WORKERS > 1), у каждого воркера своя лента
+со своим epoch, а запросы реплики попадают в случайный воркер. Поэтому в
+этом режиме GET /api/v1/changes отвечает 409, список товаров не содержит
+epoch и seq, и реплики перепроверяют каталог целиком по таймеру.
+"""
+import asyncio
+import threading
+from collections import deque
+from itertools import islice
+from typing import Iterable, Optional, Tuple
+
+# (операция create/update/delete, ID пластинки, пластинка после изменения или None для delete)
+Change = Tuple[str, int, Optional[dict]]
+
+
+class CatalogChangeFeed:
+    """Лента изменений каталога в памяти процесса (long-poll)"""
+
+    def __init__(self, epoch: str, max_changes: int = 1000):
+        self.epoch = epoch
+        self.seq = 0
+        self.changes = deque(maxlen=max_changes)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._event = None
+
+    def publish(self, version: int, changes: Iterable[Change]):
+        """
+        Регистрирует изменения, вошедшие в версию каталога version, и будит ожидающих
+        клиентов (вызывается из обработчиков в потоках threadpool). Возвращает seq последнего изменения
+        """
+        with self._lock:
+            for op, product_id, product in changes:
+                self.seq += 1
+                self.changes.append({
+                    "seq": self.seq,
+                    "op": op,
+                    "product_id": product_id,
+                    "version": version,
+                    "product": product,
+                })
+            seq = self.seq
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # Event loop уже закрыт
+                self._loop = None
+        return seq
+
+    def _wake(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, since: int, timeout: float):
+        """Ждет изменений после since не дольше timeout секунд"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._event = asyncio.Event()
+        deadline = loop.time() + timeout
+        while self.seq <= since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def snapshot(self, since: int, epoch: Optional[str], limit: int = 500) -> dict:
+        """
+        Не более limit изменений после since; reset=True - реплика пропустила изменения
+        (или каталог перезапущен) и должна загрузить каталог заново
+        """
+        with self._lock:
+            seq = self.seq
+            oldest_seq = self.changes[0]["seq"] if self.changes else seq + 1
+            reset = epoch != self.epoch or since > seq or since < oldest_seq - 1
+            # Номера в ленте идут подряд: нужные изменения - хвост deque
+            changes = [] if reset else list(islice(self.changes, since - oldest_seq + 1, since - oldest_seq + 1 + limit))
+        return {
+            "epoch": self.epoch,
+            "seq": changes[-1]["seq"] if changes else seq,
+            "reset": reset,
+            "has_more": bool(changes) and changes[-1]["seq"] < seq,
+            "changes": changes,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "retained": len(self.changes),
+            "max_changes": self.changes.maxlen,
+        }
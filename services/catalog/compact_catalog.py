@@ -0,0 +1,318 @@
+"""
+Компактное колоночное хранение каталога для больших каталогов.
+
+Каждая пластинка в обычном снимке - объект pydantic Product со своим
+__dict__ и отдельными объектами строк и чисел: на миллионе пластинок это
+гигабайты, а фильтр по цене или исполнителю - перебор объектов в Python.
+CompactProducts хранит те же данные по колонкам: ID, цены и ID исполнителей -
+массивы NumPy, имена исполнителей - таблица строк (каждое имя один раз,
+в строке - номер в таблице), названия, описания и обложки - один буфер
+UTF-8 на колонку со смещениями. Фильтр и сортировка - операции над
+массивами, а объект Product создается только для пластинок, попавших в
+ответ.
+
+CompactSnapshot - снимок каталога с интерфейсом CatalogSnapshot поверх
+неизменяемых колонок. Изменения из админки не перестраивают колонки: новый
+снимок разделяет колонки предыдущего и хранит небольшой слой изменений
+(ID -> новая пластинка или None для удаленной). Когда слой разрастается,
+колонки пересобираются (compaction) - это происходит в потоке писателя,
+читатели продолжают работать со своими снимками.
+"""
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog_store import Change
+
+# Слой изменений пересобирается в колонки, когда в нем больше записей, чем
+# max(COMPACT_OVERLAY_MIN, доля COMPACT_OVERLAY_RATIO от размера каталога)
+COMPACT_OVERLAY_MIN = 1024
+COMPACT_OVERLAY_RATIO = 0.01
+
+# artist_id отсутствует
+NO_ARTIST = -1
+
+
+def ordered_positions(keys: np.ndarray, ids: np.ndarray, stop: int) -> np.ndarray:
+    """
+    Первые stop позиций в порядке (keys, ids). Для короткой страницы сортируются только
+    кандидаты не больше stop-го ключа (np.partition), а не весь результат фильтра.
+    """
+    if 0 < stop < len(keys) // 4:
+        kth = np.partition(keys, stop - 1)[stop - 1]
+        candidates = np.flatnonzero(keys <= kth)
+        return candidates[np.lexsort((ids[candidates], keys[candidates]))][:stop]
+    return np.lexsort((ids, keys))[:stop]
+
+
+class StringColumn:
+    """Колонка строк: один буфер UTF-8 и смещения начала каждой строки; None хранится маской"""
+
+    def __init__(self, values: Iterable[Optional[str]]):
+        chunks = []
+        offsets = [0]
+        nulls = []
+        position = 0
+        for value in values:
+            nulls.append(value is None)
+            if value:
+                chunk = value.encode("utf-8")
+                chunks.append(chunk)
+                position += len(chunk)
+            offsets.append(position)
+        self._buffer = b"".join(chunks)
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._nulls = np.array(nulls, dtype=bool) if any(nulls) else None
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        if self._nulls is not None and self._nulls[row]:
+            return None
+        return self._buffer[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")
+
+    def hash_into(self, digest):
+        digest.update(self._buffer)
+        digest.update(self._offsets.tobytes())
+        if self._nulls is not None:
+            digest.update(self._nulls.tobytes())
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer) + self._offsets.nbytes + (self._nulls.nbytes if self._nulls is not None else 0)
+
+
+class StringTable:
+    """Колонка повторяющихся строк: каждое значение хранится один раз, в строке - номер значения"""
+
+    def __init__(self, values: Iterable[str]):
+        codes: Dict[str, int] = {}
+        self.values: List[str] = []
+        rows = []
+        for value in values:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(value)
+            rows.append(code)
+        self.codes = np.array(rows, dtype=np.int32)
+
+    def __getitem__(self, row: int) -> str:
+        return self.values[self.codes[row]]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(value.encode("utf-8")) for value in self.values)
+
+
+class CompactProducts:
+    """Неизменяемые колонки пластинок, упорядоченные по ID (порядок каталога)"""
+
+    def __init__(self, products: Iterable, model: Callable):
+        self.model = model  # Класс пластинки (Product), создается только при выдаче
+        products = sorted(products, key=lambda p: p.id)
+        self.ids = np.array([p.id for p in products], dtype=np.int64)
+        self.prices = np.array([p.price for p in products], dtype=np.float64)
+        self.artist_ids = np.array([NO_ARTIST if p.artist_id is None else p.artist_id for p in products], dtype=np.int64)
+        self.artists = StringTable(p.artist for p in products)
+        self.names = StringColumn(p.name for p in products)
+        self.descriptions = StringColumn(p.description for p in products)
+        self.cover_urls = StringColumn(p.cover_url for p in products)
+        self._fingerprint = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row_of(self, product_id: int) -> Optional[int]:
+        """Номер строки пластинки (бинарный поиск по ID) или None"""
+        row = int(np.searchsorted(self.ids, product_id))
+        if row < len(self.ids) and self.ids[row] == product_id:
+            return row
+        return None
+
+    def materialize(self, row: int):
+        """Пластинка строки row (данные проверены при записи - без повторной валидации)"""
+        artist_id = int(self.artist_ids[row])
+        return self.model.model_construct(
+            id=int(self.ids[row]),
+            name=self.names[row],
+            artist=self.artists[row],
+            artist_id=None if artist_id == NO_ARTIST else artist_id,
+            description=self.descriptions[row],
+            price=float(self.prices[row]),
+            cover_url=self.cover_urls[row],
+        )
+
+    def fingerprint(self) -> str:
+        """Хэш содержимого колонок (считается один раз: колонки не меняются)"""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=12)
+            for array in (self.ids, self.prices, self.artist_ids, self.artists.codes):
+                digest.update(array.tobytes())
+            digest.update("\n".join(self.artists.values).encode("utf-8"))
+            for column in (self.names, self.descriptions, self.cover_urls):
+                column.hash_into(digest)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def nbytes(self) -> int:
+        return (self.ids.nbytes + self.prices.nbytes + self.artist_ids.nbytes + self.artists.nbytes
+                + self.names.nbytes + self.descriptions.nbytes + self.cover_urls.nbytes)
+
+
+class CompactSnapshot:
+    """Снимок каталога поверх колонок CompactProducts и слоя изменений (интерфейс CatalogSnapshot)"""
+
+    def __init__(self, version: int, base: CompactProducts, overlay: Optional[Dict[int, object]] = None, seq: int = 0):
+        self.version = version
+        self.seq = seq
+        self.base = base
+        self.overlay: Dict[int, object] = overlay or {}  # ID -> новая пластинка или None (удалена)
+        self._added = sorted(pid for pid, p in self.overlay.items() if p is not None and base.row_of(pid) is None)
+        deleted = sum(1 for pid, p in self.overlay.items() if p is None and base.row_of(pid) is not None)
+        self._size = len(base) - deleted + len(self._added)
+        self._visible = None  # Маска строк base, не замененных слоем (строится при первом select)
+        self._fingerprint = None
+
+    @classmethod
+    def from_products(cls, version: int, products: Iterable, model: Callable) -> "CompactSnapshot":
+        return cls(version, CompactProducts(products, model))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, product_id) -> Optional[object]:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return None
+        if product_id in self.overlay:
+            return self.overlay[product_id]
+        row = self.base.row_of(product_id)
+        return None if row is None else self.base.materialize(row)
+
+    @property
+    def products(self) -> list:
+        """Все пластинки в порядке каталога (создаются при каждом обращении)"""
+        overlay = self.overlay
+        items = []
+        for row, product_id in enumerate(self.base.ids.tolist()):
+            if product_id in overlay:
+                if overlay[product_id] is not None:
+                    items.append(overlay[product_id])
+            else:
+                items.append(self.base.materialize(row))
+        items.extend(overlay[product_id] for product_id in self._added)
+        return items
+
+    def fingerprint(self) -> str:
+        """Хэш содержимого (для ETag): хэш колонок и слоя изменений"""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(self.base.fingerprint().encode("ascii"), digest_size=12)
+            for product_id in sorted(self.overlay):
+                product = self.overlay[product_id]
+                digest.update(f"{product_id}:".encode("ascii"))
+                digest.update(b"-" if product is None else product.model_dump_json().encode("utf-8"))
+                digest.update(b"\n")
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _visible_rows(self) -> np.ndarray:
+        if self._visible is None:
+            visible = np.ones(len(self.base), dtype=bool)
+            if self.overlay:
+                visible &= ~np.isin(self.base.ids, np.fromiter(self.overlay, dtype=np.int64, count=len(self.overlay)))
+            self._visible = visible
+        return self._visible
+
+    def select(self, artist_id: Optional[int] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, sort: Optional[str] = None, ranking: Sequence[int] = (),
+               offset: int = 0, limit: Optional[int] = None) -> Tuple[int, list]:
+        """То же, что CatalogSnapshot.select: фильтр и сортировка по колонкам, Product - только для страницы"""
+        base = self.base
+        mask = self._visible_rows().copy()
+        if artist_id is not None:
+            mask &= base.artist_ids == artist_id
+        if min_price is not None:
+            mask &= base.prices >= min_price
+        if max_price is not None:
+            mask &= base.prices <= max_price
+        rows = np.flatnonzero(mask)
+        # Пластинки из слоя изменений (их немного) проверяются по одной
+        extra = [
+            p for p in self.overlay.values()
+            if p is not None
+            and (artist_id is None or p.artist_id == artist_id)
+            and (min_price is None or p.price >= min_price)
+            and (max_price is None or p.price <= max_price)
+        ]
+        ids = np.concatenate([base.ids[rows], np.array([p.id for p in extra], dtype=np.int64)])
+        end = len(ids) if limit is None else min(offset + limit, len(ids))
+        # Равные ключи - в порядке каталога (по ID), как у стабильной сортировки CatalogSnapshot
+        if sort == "price" or sort == "-price":
+            prices = np.concatenate([base.prices[rows], np.array([p.price for p in extra], dtype=np.float64)])
+            order = ordered_positions(prices if sort == "price" else -prices, ids, end)
+        elif sort == "popular":
+            rank = {product_id: position for position, product_id in enumerate(ranking)}
+            ranks = np.fromiter((rank.get(product_id, len(rank)) for product_id in ids.tolist()), dtype=np.int64, count=len(ids))
+            order = ordered_positions(ranks, ids, end)
+        else:
+            order = np.argsort(ids, kind="stable")[:end]
+        page = []
+        for position in order[offset:].tolist():
+            if position < len(rows):
+                page.append(base.materialize(int(rows[position])))
+            else:
+                page.append(extra[position - len(rows)])
+        return len(ids), page
+
+    def draft(self) -> "CompactDraft":
+        return CompactDraft(self)
+
+
+class CompactDraft:
+    """Черновик компактного снимка: изменения копятся в копии слоя, колонки не копируются"""
+
+    def __init__(self, snapshot: CompactSnapshot):
+        self.snapshot = snapshot
+        self._overlay = dict(snapshot.overlay)
+        self.changes: List[Change] = []
+
+    def get(self, product_id) -> Optional[object]:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return None
+        if product_id in self._overlay:
+            return self._overlay[product_id]
+        columns = self.snapshot.base
+        row = columns.row_of(product_id)
+        return None if row is None else columns.materialize(row)
+
+    def next_id(self) -> int:
+        ids = self.snapshot.base.ids
+        row = len(ids) - 1
+        # Последние строки колонок могли быть удалены в слое изменений
+        while row >= 0 and int(ids[row]) in self._overlay and self._overlay[int(ids[row])] is None:
+            row -= 1
+        last_id = int(ids[row]) if row >= 0 else 0
+        return max([last_id] + [pid for pid, p in self._overlay.items() if p is not None]) + 1
+
+    def put(self, product):
+        op = "update" if self.get(product.id) is not None else "create"
+        self._overlay[product.id] = product
+        self.changes.append((op, product.id, product.model_dump()))
+
+    def delete(self, product_id: int) -> bool:
+        if self.get(product_id) is None:
+            return False
+        self._overlay[product_id] = None
+        self.changes.append(("delete", product_id, None))
+        return True
+
+    def build(self, seq: int) -> CompactSnapshot:
+        columns = self.snapshot.base
+        snapshot = CompactSnapshot(self.snapshot.version + 1, columns, self._overlay, seq)
+        if len(self._overlay) > max(COMPACT_OVERLAY_MIN, len(snapshot) * COMPACT_OVERLAY_RATIO):
+            snapshot = CompactSnapshot(snapshot.version, CompactProducts(snapshot.products, columns.model), seq=seq)
+        return snapshot
@@ -1,9 +1,11 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Literal, Optional
+import hmac
 import uuid
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -18,6 +20,13 @@ for config_path in config_paths:
         load_dotenv(config_path, override=False)
         break
 
+# Соседние модули сервиса - доступны и при импорте из монолитного режима
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from catalog_store import CatalogSnapshot, CatalogStore
+from change_feed import CatalogChangeFeed
+from compact_catalog import CompactSnapshot
+from popularity import PopularityCounters
+
 # --- Приложение FastAPI ---
 app = FastAPI(
     title="Catalog Service API",
@@ -46,6 +55,9 @@ class Artist(BaseModel):
     name: str
 
 class Product(BaseModel):
+    # Пластинки неизменяемы: изменение - новый объект в новом снимке каталога (catalog_store)
+    model_config = ConfigDict(frozen=True)
+
     id: int
     name: str
     artist: str
@@ -70,6 +82,17 @@ class ProductUpdate(BaseModel):
     price: Optional[float] = None
     cover_url: Optional[str] = None
 
+class ProductBatchUpdateItem(ProductUpdate):
+    id: int
+
+class ProductBatchUpdate(BaseModel):
+    updates: List[ProductBatchUpdateItem]
+
+class ProductEvent(BaseModel):
+    event: Literal["order", "view"]
+    product_ids: List[str] = Field(max_length=100)
+    quantities: Optional[Dict[str, int]] = None  # Для заказа: количество по ID (по умолчанию 1)
+
 # Хранилище данных (в реальном приложении это была бы база данных)
 artists = [
     Artist(id=1, name="The Beatles"),
@@ -101,7 +124,7 @@ artists = [
 ]
 
 # Используем реальные обложки альбомов из открытых источников
-products = [
+initial_products = [
     # The Beatles
     Product(
         id=1,
@@ -470,6 +493,55 @@ products = [
     )
 ]
 
+# Каталог - неизменяемые версионные снимки: читатели берут catalog.current() без блокировок,
+# изменения собираются в черновике и публикуются новым снимком (catalog.update()).
+# ETag - хэш содержимого снимка, чтобы клиенты (recommender, cart) могли делать условные
+# запросы и не скачивать каталог заново, если он не менялся: хэш не зависит от процесса,
+# поэтому 304 приходит и после перезапуска, и от другого воркера с тем же каталогом.
+# catalog_epoch отличает процессы (перезапуск, разные воркеры) в ленте изменений.
+catalog_epoch = uuid.uuid4().hex[:8]
+
+# Лента изменений для реплик каталога в других сервисах (GET /api/v1/changes).
+# Лента и каталог - в памяти процесса: при нескольких воркерах (WEB_CONCURRENCY задает
+# start_services_production.py) у каждого своя лента, и реплика видела бы изменения
+# только того воркера, который ответил. Поэтому лента работает только в одном процессе.
+CATALOG_PROCESSES = int(os.getenv("WEB_CONCURRENCY", "1") or 1)
+if CATALOG_PROCESSES > 1:
+    print(f"Catalog Service: воркеров {CATALOG_PROCESSES}, лента изменений отключена (реплики перепроверяют каталог целиком)")
+catalog_changes = CatalogChangeFeed(catalog_epoch, max_changes=int(os.getenv("CATALOG_CHANGE_FEED_SIZE", "1000")))
+
+# CATALOG_STORAGE=compact - колонки NumPy вместо объектов Product (большие каталоги):
+# меньше памяти на пластинку, фильтр и сортировка по массивам, Product создается только для ответа
+CATALOG_STORAGE = os.getenv("CATALOG_STORAGE", "objects").lower()
+catalog = CatalogStore(
+    initial_products,
+    on_publish=catalog_changes.publish,
+    snapshot_factory=(
+        (lambda version, items: CompactSnapshot.from_products(version, items, Product))
+        if CATALOG_STORAGE == "compact" else CatalogSnapshot
+    )
+)
+
+def catalog_etag(snapshot) -> str:
+    return f'"{snapshot.fingerprint()}"'
+
+# Популярность пластинок: заказы (из orders service) и, если включено, просмотры карточек.
+# Вклад события убывает вдвое за POPULARITY_HALF_LIFE_DAYS; учет события - O(1)
+popularity = PopularityCounters(
+    half_life_days=float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "14")),
+    event_weights={
+        "order": 1.0,
+        "view": float(os.getenv("POPULARITY_VIEW_WEIGHT", "0.05")),
+    }
+)
+POPULARITY_TRACK_VIEWS = os.getenv("POPULARITY_TRACK_VIEWS", "true").lower() in ("1", "true", "yes")
+# Количество одной пластинки в заказе, учитываемое в популярности (крупный заказ не выводит пластинку в топ)
+POPULARITY_MAX_QUANTITY = int(os.getenv("POPULARITY_MAX_QUANTITY", "10"))
+# Общий токен сервисов: события заказа принимаются только с ним (заголовок X-Service-Token)
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "change-me-internal-service-token")
+if SERVICE_TOKEN == "change-me-internal-service-token":
+    print("WARNING: Используется дефолтный SERVICE_TOKEN! Это небезопасно для production!")
+
 # Эндпоинты для админ-панели
 @app.get("/health", tags=["Health Check"])
 def health_check():
@@ -478,12 +550,12 @@ def health_check():
 @app.get("/api/v1/admin/products", tags=["Admin"])
 def get_all_products():
     """Получает все товары для админ-панели."""
-    return {"products": products}
+    return {"products": catalog.current().products}
 
 @app.get("/api/v1/admin/products/{product_id}", tags=["Admin"])
 def get_product(product_id: str):
     """Получает конкретный товар по ID."""
-    product = next((p for p in products if str(p.id) == str(product_id)), None)
+    product = catalog.current().get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -500,57 +572,81 @@ def create_product(product_data: ProductCreate):
         artist_name = "Неизвестный исполнитель"
     
     # Создаем новый товар
-    new_id = max([p.id for p in products if isinstance(p.id, int)], default=0) + 1
-    new_product = Product(
-        id=new_id,
-        name=product_data.name,
-        artist=artist_name,
-        artist_id=product_data.artist_id,
-        description=product_data.description,
-        price=product_data.price,
-        cover_url=product_data.cover_url
-    )
-    
-    products.append(new_product)
+    with catalog.update() as draft:
+        new_product = Product(
+            id=draft.next_id(),
+            name=product_data.name,
+            artist=artist_name,
+            artist_id=product_data.artist_id,
+            description=product_data.description,
+            price=product_data.price,
+            cover_url=product_data.cover_url
+        )
+        draft.put(new_product)
+        # ID удаленной пластинки может вернуться: счетчик от параллельного события по старой не наследуется
+        popularity.forget(new_product.id)
     return new_product
 
-@app.put("/api/v1/admin/products/{product_id}", tags=["Admin"])
-def update_product(product_id: str, product_data: ProductUpdate):
-    """Обновляет существующий товар."""
-    product = next((p for p in products if str(p.id) == str(product_id)), None)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
+def apply_product_update(product: Product, product_data: ProductUpdate) -> Product:
+    """Новая версия товара с переданными (не None) полями; исходный объект не меняется"""
     # Обновляем поля
-    if product_data.name is not None:
-        product.name = product_data.name
-    if product_data.description is not None:
-        product.description = product_data.description
-    if product_data.price is not None:
-        product.price = product_data.price
-    if product_data.cover_url is not None:
-        product.cover_url = product_data.cover_url
+    changes = {
+        field: value
+        for field, value in product_data.model_dump(include={"name", "description", "price", "cover_url"}).items()
+        if value is not None
+    }
     
     # Обновляем исполнителя
     if product_data.artist_name:
-        product.artist = product_data.artist_name
+        changes["artist"] = product_data.artist_name
     elif product_data.artist_id:
         artist = next((a for a in artists if a.id == product_data.artist_id), None)
         if artist:
-            product.artist = artist.name
-            product.artist_id = product_data.artist_id
-    
+            changes["artist"] = artist.name
+            changes["artist_id"] = product_data.artist_id
+    return product.model_copy(update=changes)
+
+@app.patch("/api/v1/admin/products", tags=["Admin"])
+def batch_update_products(batch: ProductBatchUpdate):
+    """
+    Пакетно обновляет товары (например, описания после массовой AI-генерации).
+    Версия каталога увеличивается один раз на весь пакет.
+    """
+    updated = []
+    not_found = []
+    with catalog.update() as draft:
+        for item in batch.updates:
+            product = draft.get(item.id)
+            if product is None:
+                not_found.append(item.id)
+                continue
+            draft.put(apply_product_update(product, item))
+            updated.append(item.id)
+    return {"updated": updated, "not_found": not_found, "version": catalog.current().version}
+
+@app.put("/api/v1/admin/products/{product_id}", tags=["Admin"])
+def update_product(product_id: str, product_data: ProductUpdate):
+    """Обновляет существующий товар."""
+    with catalog.update() as draft:
+        product = draft.get(product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        product = apply_product_update(product, product_data)
+        draft.put(product)
     return product
 
 @app.delete("/api/v1/admin/products/{product_id}", tags=["Admin"])
 def delete_product(product_id: str):
     """Удаляет товар."""
-    global products
-    product = next((p for p in products if str(p.id) == str(product_id)), None)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    products = [p for p in products if str(p.id) != str(product_id)]
+    with catalog.update() as draft:
+        product = draft.get(product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        draft.delete(product.id)
+        # Под блокировкой записи: новая пластинка с этим ID не унаследует счетчик
+        popularity.forget(product.id)
     return {"message": "Product deleted successfully"}
 
 @app.get("/api/v1/admin/artists", tags=["Admin"])
@@ -560,14 +656,117 @@ def get_all_artists():
 
 # Эндпоинты для публичного каталога
 @app.get("/api/v1/products", tags=["Public"])
-def get_products():
-    """Получает все товары для публичного каталога."""
-    return {"products": products}
+def get_products(
+    request: Request,
+    response: Response,
+    sort: Optional[Literal["popular", "price", "-price"]] = None,
+    artist_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000)
+):
+    """
+    Получает все товары для публичного каталога.
+    Поддерживает условный запрос: If-None-Match с ETag текущей версии -> 304 без тела.
+    sort=popular - по убыванию популярности (порядок меняется без смены версии, поэтому без ETag),
+    price / -price - по цене. artist_id, min_price, max_price - фильтр; offset и limit - страница
+    (total - сколько всего товаров подходит под фильтр).
+    epoch и seq - позиция в ленте изменений, с которой реплика продолжает (GET /api/v1/changes).
+    """
+    # Товары, версия и позиция ленты - из одного снимка
+    snapshot = catalog.current()
+    # Без ленты (несколько воркеров) epoch и seq не отдаются - реплика перепроверяет каталог целиком
+    epoch, seq = (catalog_epoch, snapshot.seq) if CATALOG_PROCESSES == 1 else (None, None)
+    if sort != "popular":
+        etag = catalog_etag(snapshot)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+    if sort is None and artist_id is None and min_price is None and max_price is None and not offset and limit is None:
+        return {"products": snapshot.products, "version": snapshot.version, "epoch": epoch, "seq": seq}
+    total, items = snapshot.select(
+        artist_id=artist_id,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort,
+        ranking=popularity.ranking() if sort == "popular" else (),
+        offset=offset,
+        limit=limit
+    )
+    return {"products": items, "total": total, "version": snapshot.version, "epoch": epoch, "seq": seq}
+
+@app.get("/api/v1/changes", tags=["Public"])
+async def get_catalog_changes(
+    since: int = 0,
+    epoch: Optional[str] = None,
+    timeout: float = Query(25.0, ge=0, le=60),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """
+    Лента изменений каталога (long-poll) для локальных реплик.
+
+    Возвращает изменения с seq > since: op (create/update/delete), ID, версию каталога
+    и пластинку после изменения. Если новых изменений нет, запрос ждет до timeout секунд.
+    reset=true означает, что реплика пропустила изменения (или каталог перезапущен)
+    и должна загрузить каталог заново (GET /api/v1/products).
+    409 - каталог запущен в нескольких воркерах, у каждого своя лента (см. CATALOG_PROCESSES).
+    """
+    if CATALOG_PROCESSES > 1:
+        raise HTTPException(
+            status_code=409,
+            detail="Лента изменений недоступна: каталог запущен в нескольких воркерах (CATALOG_WORKERS=1)"
+        )
+    if epoch == catalog_changes.epoch and since >= catalog_changes.seq and timeout > 0:
+        await catalog_changes.wait(since, timeout)
+    snapshot = catalog.current()
+    feed = catalog_changes.snapshot(since, epoch, limit)
+    # Версия и ETag соответствуют последнему отданному изменению
+    feed["version"] = feed["changes"][-1]["version"] if feed["changes"] else snapshot.version
+    # (если лента уже ушла дальше взятого снимка, ETag неизвестен - следующий запрос каталога без него)
+    feed["etag"] = catalog_etag(snapshot) if not feed["has_more"] and feed["version"] == snapshot.version else None
+    return feed
+
+@app.get("/api/v1/products/top", tags=["Public"])
+def get_top_products(limit: int = 10):
+    """Самые популярные пластинки (заказы и просмотры с затуханием во времени)"""
+    limit = max(1, min(limit, 100))
+    snapshot = catalog.current()
+    top = []
+    for product_id, score in popularity.top(limit):
+        product = snapshot.get(product_id)
+        if product:
+            top.append({**product.model_dump(), "popularity": round(score, 3)})
+    return {"products": top, "half_life_days": popularity.half_life_days}
+
+@app.post("/api/v1/products/events", tags=["Public"])
+def record_product_events(event: ProductEvent, request: Request):
+    """
+    Учитывает события для популярности: order - оформленный заказ (orders service),
+    view - просмотр карточки пластинки (учитывается, если POPULARITY_TRACK_VIEWS=true).
+    Учитываются только пластинки, которые есть в каталоге: счетчики - плотный массив по ID.
+    """
+    if event.event == "order" and not hmac.compare_digest(request.headers.get("x-service-token", ""), SERVICE_TOKEN):
+        # Заказы сообщает orders service с общим токеном; без него - только просмотры
+        raise HTTPException(status_code=403, detail="События заказа принимаются только от orders service")
+    if event.event == "view" and not POPULARITY_TRACK_VIEWS:
+        return {"recorded": 0}
+    snapshot = catalog.current()
+    quantities = event.quantities or {}
+    recorded = 0
+    for product_id in dict.fromkeys(event.product_ids):
+        product = snapshot.get(product_id)
+        if product is None:
+            continue
+        quantity = min(max(quantities.get(product_id, 1), 1), POPULARITY_MAX_QUANTITY)
+        popularity.record(event.event, product.id, quantity=quantity)
+        recorded += 1
+    return {"recorded": recorded}
 
 @app.get("/api/v1/products/{product_id}", tags=["Public"])
 def get_public_product(product_id: str):
     """Получает конкретный товар для публичного каталога."""
-    product = next((p for p in products if str(p.id) == str(product_id)), None) 
+    product = catalog.current().get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -0,0 +1,91 @@
+"""
+Популярность пластинок с затуханием во времени.
+
+Счетчик популярности - одно число на пластинку в плотном массиве array('d'),
+индекс - ID пластинки. Заказ (и, по желанию, просмотр карточки) добавляет
+к числу вес события, старые события весят меньше: вклад убывает вдвое за
+half_life_days. Как и в счетчиках совместных покупок recommender, веса
+хранятся в масштабе опорного момента - событие в момент t добавляет
+weight·exp(λ·(t - t_ref)), поэтому обработка события - одно сложение в
+массиве (O(1)), без пересчета остальных пластинок. Рейтинг (сортировка)
+строится при чтении и кэшируется до следующего события.
+"""
+import heapq
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# При таком показателе масштаба веса пересчитываются к текущему моменту (защита от переполнения)
+MAX_SCALE_EXPONENT = 50.0
+
+
+class PopularityCounters:
+    """Затухающие счетчики популярности в плотном массиве (индекс - ID пластинки)"""
+
+    def __init__(self, half_life_days: float = 14.0, event_weights: Optional[Dict[str, float]] = None):
+        self.half_life_days = half_life_days
+        self.decay_rate = math.log(2) / (half_life_days * 86400)
+        self.event_weights = dict(event_weights or {"order": 1.0, "view": 0.05})
+        self.reference_time = time.time()
+        self._scores = array("d")
+        self._ranking: Optional[List[int]] = None  # ID по убыванию популярности (до следующего события)
+        self.events = {event: 0 for event in self.event_weights}
+
+    def record(self, event: str, product_id: int, quantity: float = 1.0, timestamp: Optional[float] = None):
+        """Событие с пластинкой (order - quantity штук в заказе, view - просмотр карточки)"""
+        if product_id < 0:
+            return
+        exponent = self.decay_rate * ((time.time() if timestamp is None else timestamp) - self.reference_time)
+        if exponent > MAX_SCALE_EXPONENT:
+            self._rescale(exponent)
+            exponent = 0.0
+        if product_id >= len(self._scores):
+            self._scores.extend([0.0] * (product_id + 1 - len(self._scores)))
+        self._scores[product_id] += self.event_weights[event] * quantity * math.exp(exponent)
+        self.events[event] += 1
+        self._ranking = None
+
+    def _rescale(self, exponent: float):
+        """Переводит все счетчики в масштаб текущего момента (раз в ~50/λ секунд)"""
+        factor = math.exp(-exponent)
+        for i in range(len(self._scores)):
+            self._scores[i] *= factor
+        self.reference_time += exponent / self.decay_rate
+
+    def forget(self, product_id: int):
+        """Сбрасывает счетчик (пластинка удалена из каталога)"""
+        if 0 <= product_id < len(self._scores):
+            self._scores[product_id] = 0.0
+            self._ranking = None
+
+    def score(self, product_id: int) -> float:
+        """Текущая популярность пластинки (взвешенное число событий с учетом затухания)"""
+        if not 0 <= product_id < len(self._scores):
+            return 0.0
+        return self._scores[product_id] * math.exp(-self.decay_rate * (time.time() - self.reference_time))
+
+    def ranking(self) -> List[int]:
+        """ID пластинок с ненулевой популярностью по убыванию популярности"""
+        if self._ranking is None:
+            scores = self._scores
+            self._ranking = sorted((i for i in range(len(scores)) if scores[i] > 0), key=scores.__getitem__, reverse=True)
+        return self._ranking
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        """limit самых популярных пластинок: [(ID, популярность)]"""
+        if self._ranking is not None:
+            ids = self._ranking[:limit]
+        else:
+            scores = self._scores
+            ids = heapq.nlargest(limit, (i for i in range(len(scores)) if scores[i] > 0), key=scores.__getitem__)
+        return [(product_id, self.score(product_id)) for product_id in ids]
+
+    def stats(self) -> dict:
+        return {
+            "half_life_days": self.half_life_days,
+            "event_weights": self.event_weights,
+            "events": self.events,
+            "products_with_events": sum(1 for value in self._scores if value > 0),
+            "array_bytes": self._scores.itemsize * len(self._scores),
+        }
@@ -0,0 +1,344 @@
+"""
+Локальная заглушка OpenRouter (OpenAI-совместимый API) для нагрузочных тестов.
+
+Recommender ходит в LLM по адресу OPENROUTER_BASE_URL; если указать адрес
+этого сервиса (http://127.0.0.1:8013/api/v1), рекомендации, чат и описания
+(а через recommender - и письма orders) работают офлайн, без ключа и без
+расхода токенов. Заглушка имитирует:
+- задержку ответа с настраиваемым распределением (в т.ч. по моделям);
+- ошибки провайдера (429/500/503) с заданной вероятностью;
+- потоковые ответы (stream=true) с заданной скоростью генерации;
+- правдоподобные ответы: JSON рекомендаций и текст чата с ID пластинок из
+  каталога в системном промпте, описания пластинок.
+
+Параметры задаются переменными окружения LLM_MOCK_* и меняются на лету
+через PUT /api/v1/mock/config (например, между прогонами нагрузочного теста).
+"""
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
+from typing import Dict, List, Literal, Optional
+from collections import Counter
+from dotenv import load_dotenv
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+
+# Загружаем переменные окружения
+config_paths = [
+    Path(__file__).parent.parent.parent / 'config.env',
+    Path(__file__).parent.parent / 'config.env',
+    Path.cwd() / 'config.env',
+]
+for config_path in config_paths:
+    if config_path.exists():
+        load_dotenv(config_path, override=False)
+        break
+
+# --- Приложение FastAPI ---
+app = FastAPI(
+    title="LLM Mock API",
+    description="OpenAI-совместимая заглушка OpenRouter для офлайн-тестов и бенчмарков",
+    version="1.0.0"
+)
+
+# Строки каталога в системном промпте recommender (см. build_catalog_context)
+CATALOG_LINE = re.compile(r'ID:\s*(\d+)\s*\|\s*Название:\s*([^|\n]+?)\s*\|\s*Исполнитель:\s*([^|\n]*?)\s*\|')
+RECOMMENDATION_COUNT = re.compile(r'Количество рекомендаций:\s*(\d+)')
+# Пластинка в запросе описания: ...для пластинки "Название" от исполнителя Исполнитель.
+DESCRIPTION_TARGET = re.compile(r'пластинки\s+["“«]([^"”»\n]+)["”»]\s+от исполнителя\s+([^.\n]+)')
+
+CHARS_PER_TOKEN = 3.0
+
+
+class MockConfig(BaseModel):
+    """Параметры заглушки"""
+    latency_distribution: Literal["fixed", "uniform", "normal", "lognormal"] = "lognormal"
+    latency_mean_ms: float = 800.0
+    latency_stddev_ms: float = 400.0
+    latency_max_ms: float = 30000.0
+    model_latency_mean_ms: Dict[str, float] = {}  # Средняя задержка отдельных моделей
+    error_rate: float = 0.0
+    model_error_rate: Dict[str, float] = {}  # Доля ошибок отдельных моделей
+    error_statuses: List[int] = [429, 500, 503]
+    stream_tokens_per_second: float = 60.0
+    stream_chunk_tokens: int = 4
+    seed: Optional[int] = None
+
+    @field_validator("error_rate")
+    @classmethod
+    def validate_rate(cls, v):
+        if not 0.0 <= v <= 1.0:
+            raise ValueError("error_rate должен быть от 0 до 1")
+        return v
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        def env_json(name: str, default):
+            value = os.getenv(name)
+            return json.loads(value) if value else default
+
+        return cls(
+            latency_distribution=os.getenv("LLM_MOCK_LATENCY_DISTRIBUTION", "lognormal"),
+            latency_mean_ms=float(os.getenv("LLM_MOCK_LATENCY_MEAN_MS", "800")),
+            latency_stddev_ms=float(os.getenv("LLM_MOCK_LATENCY_STDDEV_MS", "400")),
+            latency_max_ms=float(os.getenv("LLM_MOCK_LATENCY_MAX_MS", "30000")),
+            model_latency_mean_ms=env_json("LLM_MOCK_MODEL_LATENCY_MEAN_MS", {}),
+            error_rate=float(os.getenv("LLM_MOCK_ERROR_RATE", "0")),
+            model_error_rate=env_json("LLM_MOCK_MODEL_ERROR_RATE", {}),
+            error_statuses=[int(s) for s in os.getenv("LLM_MOCK_ERROR_STATUSES", "429,500,503").split(",") if s.strip()],
+            stream_tokens_per_second=float(os.getenv("LLM_MOCK_STREAM_TOKENS_PER_SECOND", "60")),
+            stream_chunk_tokens=int(os.getenv("LLM_MOCK_STREAM_CHUNK_TOKENS", "4")),
+            seed=int(os.getenv("LLM_MOCK_SEED")) if os.getenv("LLM_MOCK_SEED") else None,
+        )
+
+
+class ChatCompletionMessage(BaseModel):
+    role: str
+    content: Optional[str] = ""
+
+
+class ChatCompletionRequest(BaseModel):
+    model: str
+    messages: List[ChatCompletionMessage]
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    stream: bool = False
+
+
+config = MockConfig.from_env()
+rng = random.Random(config.seed)
+stats = Counter()
+stats_by_model: Dict[str, Counter] = {}
+
+
+def sample_latency(model: str) -> float:
+    """Задержка ответа в секундах по распределению из config"""
+    mean = config.model_latency_mean_ms.get(model, config.latency_mean_ms)
+    stddev = config.latency_stddev_ms * (mean / config.latency_mean_ms if config.latency_mean_ms else 1.0)
+    if config.latency_distribution == "fixed" or mean <= 0:
+        value = mean
+    elif config.latency_distribution == "uniform":
+        spread = stddev * math.sqrt(3)  # То же стандартное отклонение, что у нормального
+        value = rng.uniform(mean - spread, mean + spread)
+    elif config.latency_distribution == "normal":
+        value = rng.gauss(mean, stddev)
+    else:
+        # Логнормальное с заданными средним и отклонением: длинный хвост, как у настоящих LLM
+        sigma2 = math.log(1 + (stddev / mean) ** 2)
+        value = rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+    return min(max(value, 0.0), config.latency_max_ms) / 1000.0
+
+
+def count_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def generate_content(request: ChatCompletionRequest) -> str:
+    """
+    Правдоподобный ответ по содержимому запроса. Выбор пластинок детерминирован
+    (зависит от сообщений), чтобы одинаковые запросы давали одинаковые ответы.
+    """
+    system = "\n".join(m.content or "" for m in request.messages if m.role == "system")
+    user = next((m.content or "" for m in reversed(request.messages) if m.role == "user"), "")
+    records = CATALOG_LINE.findall(system)
+    picker = random.Random(hashlib.sha256(json.dumps([m.model_dump() for m in request.messages]).encode()).digest())
+
+    # Запрос рекомендаций (generate): JSON в формате RecommendationResponse
+    count_match = RECOMMENDATION_COUNT.search(system)
+    if records and count_match:
+        chosen = picker.sample(records, min(int(count_match.group(1)), len(records)))
+        return json.dumps({
+            "recommendations": [
+                {
+                    "id": int(record_id),
+                    "name": name,
+                    "artist": artist,
+                    "reason": f"Подходит под ваши предпочтения: {name} - классика своего жанра",
+                    "match_score": round(picker.uniform(0.7, 0.95), 2),
+                }
+                for record_id, name, artist in chosen
+            ],
+            "reasoning": "Подборка основана на ваших предпочтениях и любимых жанрах.",
+            "confidence_score": 0.85,
+        }, ensure_ascii=False)
+
+    # Описание пластинки (generate-description)
+    target = DESCRIPTION_TARGET.search(user)
+    if target and "описани" in user.lower():
+        name, artist = target.group(1).strip(), target.group(2).strip()
+        return (
+            f"«{name}» - одна из самых узнаваемых работ {artist}. Альбом сочетает продуманную "
+            f"драматургию, насыщенные аранжировки и теплое аналоговое звучание, которое особенно "
+            f"раскрывается на виниле. Эта пластинка станет украшением любой коллекции и подарит "
+            f"много часов внимательного прослушивания."
+        )
+
+    # Чат и простые промпты: текст с упоминанием пластинок по ID
+    if records:
+        chosen = picker.sample(records, min(2, len(records)))
+        lines = [f"Могу предложить {len(chosen)} пластинки из нашего каталога:"]
+        for record_id, name, artist in chosen:
+            lines.append(f"- **\"{name}\"** ({artist}, ID: {record_id}) - отличный выбор для вас.")
+        lines.append("Если расскажете о любимых жанрах, подберу еще.")
+        return "\n".join(lines)
+
+    return "Спасибо за вопрос! Расскажите подробнее, какую музыку вы любите, и я подберу пластинки."
+
+
+def should_fail(model: str) -> bool:
+    return rng.random() < config.model_error_rate.get(model, config.error_rate)
+
+
+def error_response(model: str) -> JSONResponse:
+    status_code = rng.choice(config.error_statuses) if config.error_statuses else 500
+    headers = {"Retry-After": "1"} if status_code == 429 else None
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": f"Mock error {status_code} for model {model}", "code": status_code}},
+        headers=headers,
+    )
+
+
+def completion_id() -> str:
+    return f"gen-mock-{uuid.uuid4().hex[:16]}"
+
+
+async def stream_completion(request: ChatCompletionRequest, content: str, latency: float):
+    """SSE в формате OpenAI: чанки chat.completion.chunk, затем data: [DONE]"""
+    chunk_id = completion_id()
+    created = int(time.time())
+
+    def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+        return "data: " + json.dumps({
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": request.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }, ensure_ascii=False) + "\n\n"
+
+    # Задержка до первого токена, затем фрагменты со скоростью генерации
+    await asyncio.sleep(latency)
+    yield chunk({"role": "assistant", "content": ""})
+    step = max(1, int(config.stream_chunk_tokens * CHARS_PER_TOKEN))
+    delay = config.stream_chunk_tokens / config.stream_tokens_per_second if config.stream_tokens_per_second > 0 else 0.0
+    for start in range(0, len(content), step):
+        yield chunk({"content": content[start:start + step]})
+        if delay:
+            await asyncio.sleep(delay)
+    yield chunk({}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/api/v1/chat/completions", tags=["OpenAI-compatible"])
+@app.post("/v1/chat/completions", tags=["OpenAI-compatible"], include_in_schema=False)
+async def chat_completions(request: ChatCompletionRequest):
+    """Ответ в формате OpenAI Chat Completions (обычный или потоковый)"""
+    model_stats = stats_by_model.setdefault(request.model, Counter())
+    stats["requests"] += 1
+    model_stats["requests"] += 1
+    latency = sample_latency(request.model)
+
+    if should_fail(request.model):
+        # Ошибка провайдера приходит не мгновенно - после части обычной задержки
+        await asyncio.sleep(latency * rng.random())
+        stats["errors"] += 1
+        model_stats["errors"] += 1
+        return error_response(request.model)
+
+    content = generate_content(request)
+    if request.max_tokens:
+        content = content[:int(request.max_tokens * CHARS_PER_TOKEN)]
+    prompt_tokens = sum(count_tokens(m.content or "") for m in request.messages)
+    completion_tokens = count_tokens(content)
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    model_stats["prompt_tokens"] += prompt_tokens
+    model_stats["completion_tokens"] += completion_tokens
+
+    if request.stream:
+        stats["streams"] += 1
+        return StreamingResponse(stream_completion(request, content, latency), media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": completion_id(),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/api/v1/models", tags=["OpenAI-compatible"])
+async def list_models():
+    """Список моделей (любая модель принимается; здесь - модели с настройками и уже вызванные)"""
+    models = sorted(set(config.model_latency_mean_ms) | set(config.model_error_rate) | set(stats_by_model))
+    return {"object": "list", "data": [{"id": model, "object": "model"} for model in models]}
+
+
+@app.get("/api/v1/mock/config", tags=["Mock"])
+async def get_config():
+    return config
+
+
+@app.put("/api/v1/mock/config", tags=["Mock"])
+async def update_config(update: dict):
+    """Частичное обновление параметров заглушки (остальные не меняются)"""
+    global config, rng
+    try:
+        new_config = MockConfig(**{**config.model_dump(), **update})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if new_config.seed != config.seed:
+        rng = random.Random(new_config.seed)
+    config = new_config
+    print(f"[Mock] Параметры обновлены: {update}")
+    return config
+
+
+@app.get("/api/v1/mock/stats", tags=["Mock"])
+async def get_stats():
+    return {
+        **stats,
+        "by_model": {model: dict(model_stats) for model, model_stats in stats_by_model.items()},
+    }
+
+
+@app.delete("/api/v1/mock/stats", tags=["Mock"])
+async def reset_stats():
+    stats.clear()
+    stats_by_model.clear()
+    return {"message": "Статистика сброшена"}
+
+
+@app.get("/health", tags=["Health Check"])
+async def health_check():
+    return {
+        "status": "healthy",
+        "service": "llm-mock",
+        "version": "1.0.0",
+        "requests": stats["requests"],
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("LLM_MOCK_PORT", "8013")))
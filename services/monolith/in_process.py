@@ -0,0 +1,120 @@
+"""
+Межсервисные вызовы внутри процесса монолита.
+
+InProcessAdapter подключается к requests.Session сервиса и передает запрос
+в ASGI-приложение другого сервиса без сокетов. Sync-эндпоинты FastAPI
+выполняются в потоках anyio, поэтому вызов возвращается в основной event
+loop через anyio.from_thread и ждет ответа в своем потоке.
+
+Пока вызывающий sync-эндпоинт ждет, он занимает поток пула. Если вызванный
+sync-эндпоинт берет поток из того же пула, при заполненном пуле все потоки
+ждут ответов, а вложенным вызовам потоков не остается - процесс зависает
+(при любом размере пула). Поэтому sync-обработчики вложенных запросов
+выполняются в отдельном пуле своего уровня вложенности (cart -> catalog -
+уровень 1, orders -> recommender -> catalog - уровень 2): поток уровня N
+ждет только потоков уровня N + 1, а самый глубокий уровень никого не ждет.
+install() подменяет run_in_threadpool, через который FastAPI вызывает
+sync-эндпоинты и зависимости; запросы снаружи (уровень 0) по-прежнему
+выполняются в общем пуле anyio.
+"""
+import asyncio
+import contextvars
+import functools
+
+import anyio
+import anyio.from_thread
+import anyio.to_thread
+import fastapi.dependencies.utils
+import fastapi.routing
+import httpx
+import requests
+from anyio.lowlevel import RunVar
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from starlette.concurrency import run_in_threadpool as starlette_run_in_threadpool
+
+# Уровень вложенности обрабатываемого запроса (0 - запрос снаружи)
+nesting_depth = contextvars.ContextVar("monolith_nesting_depth", default=0)
+
+# Пулы потоков уровней вложенности: лимитеры anyio привязаны к event loop
+_nested_limiters = RunVar("monolith_nested_limiters")
+# Потоков в пуле каждого уровня (задается install)
+pool_size = 40
+
+
+def nested_limiter(depth: int) -> anyio.CapacityLimiter:
+    """Лимитер потоков уровня вложенности depth в текущем event loop"""
+    try:
+        limiters = _nested_limiters.get()
+    except LookupError:
+        limiters = {}
+        _nested_limiters.set(limiters)
+    limiter = limiters.get(depth)
+    if limiter is None:
+        limiter = limiters[depth] = anyio.CapacityLimiter(pool_size)
+    return limiter
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """run_in_threadpool Starlette, но вложенные запросы - в пуле своего уровня"""
+    depth = nesting_depth.get()
+    if depth == 0:
+        return await starlette_run_in_threadpool(func, *args, **kwargs)
+    return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=nested_limiter(depth))
+
+
+def install(threadpool_size: int):
+    """Подключает пулы уровней вложенности к FastAPI (вызывается один раз при загрузке монолита)"""
+    global pool_size
+    pool_size = threadpool_size
+    fastapi.routing.run_in_threadpool = run_in_threadpool
+    fastapi.dependencies.utils.run_in_threadpool = run_in_threadpool
+
+
+class InProcessAdapter(BaseAdapter):
+    """
+    Адаптер для requests.Session, который передает запрос в ASGI-приложение
+    в том же процессе (запрос обрабатывается на следующем уровне вложенности)
+    """
+
+    def __init__(self, asgi_app):
+        super().__init__()
+        self.transport = httpx.ASGITransport(app=asgi_app, raise_app_exceptions=False)
+
+    async def _send_async(self, request, timeout, depth):
+        nesting_depth.set(depth)
+        async with httpx.AsyncClient(transport=self.transport) as client:
+            with anyio.fail_after(timeout):
+                return await client.request(
+                    request.method,
+                    request.url,
+                    headers=dict(request.headers),
+                    content=request.body,
+                )
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if isinstance(timeout, tuple):
+            timeout = timeout[-1]
+        # Поток эндпоинта получил копию контекста запроса: вызываемый сервис - на уровень глубже
+        depth = nesting_depth.get() + 1
+        try:
+            try:
+                asgi_response = anyio.from_thread.run(self._send_async, request, timeout, depth)
+            except RuntimeError:
+                # Вызов не из рабочего потока anyio (например, из скрипта) - свой event loop
+                asgi_response = asyncio.run(self._send_async(request, timeout, depth))
+        except TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e), request=request)
+
+        response = requests.Response()
+        response.status_code = asgi_response.status_code
+        response.headers = CaseInsensitiveDict(asgi_response.headers)
+        response._content = asgi_response.content
+        response.encoding = asgi_response.encoding
+        response.reason = asgi_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
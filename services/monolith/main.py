@@ -0,0 +1,138 @@
+"""
+Монолитный режим: все микросервисы в одном ASGI-приложении (один процесс).
+
+Для небольших установок на одной машине. Каждое приложение монтируется
+под своим префиксом:
+
+    /catalog, /auth, /orders, /users, /cart, /prompts-manager, /recommender
+
+Межсервисные вызовы (cart/orders/recommender -> catalog, recommender ->
+prompts-manager, orders -> auth/recommender) перехватываются на уровне
+HTTP-клиентов и выполняются in-process через ASGI, без сокетов и loopback-TCP.
+Раздельный деплой сервисов при этом не меняется.
+
+Межсервисный вызов из sync-эндпоинта (cart -> catalog) ждет ответа в
+потоке пула, поэтому вызванные sync-эндпоинты выполняются в отдельном пуле
+своего уровня вложенности (in_process.py) - ожидающие вызовы не могут
+занять все потоки, нужные вложенным. Размер каждого пула -
+MONOLITH_THREADPOOL_SIZE (по умолчанию 40, как у anyio).
+
+Запуск:
+    cd services/monolith
+    python main.py            # порт MONOLITH_PORT (по умолчанию 8080)
+"""
+import contextlib
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import anyio.to_thread
+import httpx
+from fastapi import FastAPI
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import in_process
+from in_process import InProcessAdapter
+
+# Потоков для sync-эндпоинтов в пуле каждого уровня вложенности межсервисных вызовов
+MONOLITH_THREADPOOL_SIZE = int(os.getenv("MONOLITH_THREADPOOL_SIZE", "40"))
+
+SERVICES_DIR = Path(__file__).parent.parent
+PROJECT_ROOT = SERVICES_DIR.parent
+sys.path.append(str(PROJECT_ROOT))
+
+# (имя, префикс монтирования, переменная URL, URL по умолчанию)
+SERVICES = [
+    ("catalog", "/catalog", "CATALOG_SERVICE_URL", "http://127.0.0.1:8000"),
+    ("auth", "/auth", "AUTH_SERVICE_URL", "http://127.0.0.1:8001"),
+    ("prompts-manager", "/prompts-manager", "PROMPTS_MANAGER_SERVICE_URL", "http://127.0.0.1:8007"),
+    ("recommender", "/recommender", "RECOMMENDER_SERVICE_URL", "http://127.0.0.1:8012"),
+    ("orders", "/orders", "ORDERS_SERVICE_URL", "http://127.0.0.1:8010"),
+    ("users", "/users", "USERS_SERVICE_URL", "http://127.0.0.1:8011"),
+    ("cart", "/cart", "CART_SERVICE_URL", "http://127.0.0.1:8005"),
+]
+
+
+def load_service(name: str):
+    """Импортирует services/<name>/main.py под уникальным именем модуля"""
+    service_path = SERVICES_DIR / name
+    module_name = f"vinyl_{name.replace('-', '_')}_main"
+    spec = importlib.util.spec_from_file_location(module_name, service_path / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Вложенные sync-вызовы - в пулах своего уровня
+in_process.install(MONOLITH_THREADPOOL_SIZE)
+
+# Загружаем сервисы; недоступные (например, recommender без OPENROUTER_API_KEY) пропускаем
+loaded_services = {}
+for name, prefix, url_env, default_url in SERVICES:
+    try:
+        loaded_services[name] = load_service(name)
+        print(f"[Monolith] ✅ {name} загружен -> {prefix}")
+    except (Exception, SystemExit) as e:
+        print(f"[Monolith] ⚠️  {name} не загружен: {e}")
+
+service_urls = {
+    name: os.getenv(url_env, default_url).rstrip("/")
+    for name, prefix, url_env, default_url in SERVICES
+}
+
+# Перенаправляем межсервисные вызовы в соответствующие ASGI-приложения
+for name, module in loaded_services.items():
+    for target, target_module in loaded_services.items():
+        if target == name:
+            continue
+        target_url = service_urls[target]
+        if hasattr(module, "service_transport_mounts"):
+            module.service_transport_mounts[target_url] = httpx.ASGITransport(
+                app=target_module.app, raise_app_exceptions=False
+            )
+        if hasattr(module, "http_session"):
+            module.http_session.mount(target_url, InProcessAdapter(target_module.app))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Выполняет startup/shutdown обработчики всех смонтированных сервисов"""
+    # Лимитер общего пула потоков - свой у каждого event loop, поэтому задается при старте
+    anyio.to_thread.current_default_thread_limiter().total_tokens = MONOLITH_THREADPOOL_SIZE
+    print(f"[Monolith] Потоков sync-эндпоинтов на уровень вложенности: {MONOLITH_THREADPOOL_SIZE}")
+    async with contextlib.AsyncExitStack() as stack:
+        for module in loaded_services.values():
+            await stack.enter_async_context(module.app.router.lifespan_context(module.app))
+        yield
+
+
+# --- Приложение FastAPI ---
+app = FastAPI(
+    title="Vinyl Store (monolith mode)",
+    description="Все микросервисы Винил Шоп в одном процессе.",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+for name, prefix, url_env, default_url in SERVICES:
+    if name in loaded_services:
+        app.mount(prefix, loaded_services[name].app)
+
+
+@app.get("/health", tags=["Health Check"])
+def health_check():
+    return {
+        "status": "ok",
+        "mode": "monolith",
+        "services": {
+            prefix: name in loaded_services
+            for name, prefix, url_env, default_url in SERVICES
+        }
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("MONOLITH_PORT", "8080")))
@@ -67,6 +67,12 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 CATALOG_SERVICE_URL = os.getenv("CATALOG_SERVICE_URL", "http://127.0.0.1:8000")
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://127.0.0.1:8001")
 RECOMMENDER_SERVICE_URL = os.getenv("RECOMMENDER_SERVICE_URL", "http://127.0.0.1:8012")
+# Общий токен сервисов (catalog принимает события заказа только с ним)
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "change-me-internal-service-token")
+
+# Общая HTTP-сессия для вызовов catalog/auth/recommender (keep-alive между запросами).
+# В монолитном режиме (services/monolith) на нее монтируются in-process адаптеры.
+http_session = requests.Session()
 
 # Конфигурация Email
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
@@ -124,7 +130,7 @@ def get_product_info(product_id: str) -> Optional[Dict]:
     """
     try:
         url = f"{CATALOG_SERVICE_URL}/api/v1/products/{product_id}"
-        response = requests.get(url, timeout=5)
+        response = http_session.get(url, timeout=5)
         if response.status_code == 200:
             product_data = response.json()
             print(f"✅ Получена информация о товаре {product_id}: {product_data.get('name', 'N/A')}", flush=True)
@@ -159,7 +165,7 @@ def get_user_info(authorization: Optional[str] = None, required: bool = False) -
         token = authorization.replace("Bearer ", "")
         url = f"{AUTH_SERVICE_URL}/users/me"
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(url, headers=headers, timeout=5)
+        response = http_session.get(url, headers=headers, timeout=5)
         if response.status_code == 200:
             return response.json()
         elif required:
@@ -201,7 +207,7 @@ def generate_ai_praise(products_info: List[Dict]) -> str:
         url = f"{RECOMMENDER_SERVICE_URL}/api/v1/recommendations/generate"
         payload = {"prompt": prompt}
         
-        response = requests.post(url, json=payload, timeout=30)
+        response = http_session.post(url, json=payload, timeout=30)
         if response.status_code == 200:
             data = response.json()
             # Извлекаем текст из ответа (разные форматы ответа)
@@ -235,9 +241,64 @@ def generate_ai_praise(products_info: List[Dict]) -> str:
         print(f"⚠️  Ошибка при генерации мнения эксперта: {e}", flush=True)
         return ""
 
+def record_co_purchase(order: Dict) -> bool:
+    """
+    Передает созданный заказ в счетчики совместных покупок recommender service.
+    Повторная отправка того же заказа не учитывается дважды (ключ - order_id).
+    """
+    try:
+        url = f"{RECOMMENDER_SERVICE_URL}/api/v1/co-purchases/orders"
+        payload = {
+            "order_id": order["order_id"],
+            "product_ids": [str(product_id) for product_id in order["product_ids"]],
+            "created_at": order["created_at"]
+        }
+        response = http_session.post(url, json=payload, timeout=3)
+        if response.status_code == 200:
+            return response.json().get("recorded", False)
+        print(f"⚠️  Recommender не принял заказ для совместных покупок: статус {response.status_code}", flush=True)
+    except Exception as e:
+        print(f"⚠️  Не удалось передать заказ в совместные покупки: {e}", flush=True)
+    return False
+
+def record_popularity(order: Dict) -> bool:
+    """
+    Передает заказанные пластинки (с количеством) в счетчики популярности catalog service.
+    """
+    try:
+        url = f"{CATALOG_SERVICE_URL}/api/v1/products/events"
+        payload = {
+            "event": "order",
+            "product_ids": [str(product_id) for product_id in order["product_ids"]],
+            "quantities": order.get("quantities") or None
+        }
+        response = http_session.post(url, json=payload, headers={"X-Service-Token": SERVICE_TOKEN}, timeout=3)
+        if response.status_code == 200:
+            return True
+        print(f"⚠️  Catalog не принял заказ для популярности: статус {response.status_code}", flush=True)
+    except Exception as e:
+        print(f"⚠️  Не удалось передать заказ в популярность: {e}", flush=True)
+    return False
+
+def get_also_bought_recommendations(product_ids: List[int], limit: int = 3) -> List[Dict]:
+    """
+    Готовые рекомендации "с этими пластинками также покупают" (без LLM, по истории заказов).
+    Пустой список, если совместных покупок еще нет или recommender недоступен.
+    """
+    try:
+        url = f"{RECOMMENDER_SERVICE_URL}/api/v1/recommendations/also-bought"
+        response = http_session.post(url, json={"current_books": product_ids, "max_recommendations": limit}, timeout=5)
+        if response.status_code == 200:
+            return response.json().get("recommendations", [])
+        print(f"⚠️  Recommender вернул статус {response.status_code} для совместных покупок", flush=True)
+    except Exception as e:
+        print(f"⚠️  Ошибка при получении совместных покупок: {e}", flush=True)
+    return []
+
 def generate_recommendations(products_info: List[Dict]) -> List[Dict]:
     """
     Генерирует рекомендации на основе покупки через recommender service.
+    Сначала берутся готовые списки совместных покупок; LLM - если их еще нет.
     """
     try:
         if not products_info:
@@ -256,6 +317,13 @@ def generate_recommendations(products_info: List[Dict]) -> List[Dict]:
                 except (ValueError, TypeError):
                     pass
         
+        # Мгновенный источник - история заказов (без вызова LLM)
+        if product_ids:
+            also_bought = get_also_bought_recommendations(product_ids, limit=3)
+            if also_bought:
+                print(f"✅ Найдено {len(also_bought)} рекомендаций по совместным покупкам", flush=True)
+                return also_bought
+        
         # Формируем запрос для рекомендаций
         purchase_description = ', '.join([f"{name} - {artist}" for name, artist in zip(product_names, artists) if name])
         
@@ -272,7 +340,7 @@ def generate_recommendations(products_info: List[Dict]) -> List[Dict]:
         print(f"📤 Данные запроса: {request_data}", flush=True)
         
         try:
-            response = requests.post(url, json=request_data, timeout=30)
+            response = http_session.post(url, json=request_data, timeout=30)
             print(f"📥 Получен ответ со статусом {response.status_code}", flush=True)
         except requests.exceptions.ConnectionError as e:
             print(f"❌ Не удалось подключиться к recommender service: {e}", flush=True)
@@ -330,7 +398,7 @@ def generate_recommendations(products_info: List[Dict]) -> List[Dict]:
                 fallback_request = {
                     "prompt": f"Пользователь только что купил: {purchase_description}. Подбери 3 похожие виниловые пластинки с объяснением почему они подходят."
                 }
-                fallback_response = requests.post(url, json=fallback_request, timeout=30)
+                fallback_response = http_session.post(url, json=fallback_request, timeout=30)
                 if fallback_response.status_code == 200:
                     fallback_data = fallback_response.json()
                     if isinstance(fallback_data, dict) and "recommendations" in fallback_data:
@@ -665,14 +733,14 @@ def create_order(
     try:
         # Сначала проверяем доступность catalog service
         health_url = f"{CATALOG_SERVICE_URL}/health"
-        health_response = requests.get(health_url, timeout=2)
+        health_response = http_session.get(health_url, timeout=2)
         if health_response.status_code == 200:
             catalog_available = True
             print(f"✅ Catalog service доступен на {CATALOG_SERVICE_URL}", flush=True)
         
         if catalog_available:
             all_products_url = f"{CATALOG_SERVICE_URL}/api/v1/products"
-            all_products_response = requests.get(all_products_url, timeout=5)
+            all_products_response = http_session.get(all_products_url, timeout=5)
             if all_products_response.status_code == 200:
                 all_products_data = all_products_response.json()
                 all_products = {str(p.get("id")): p for p in all_products_data.get("products", [])}
@@ -714,6 +782,11 @@ def create_order(
                 "price": 0.0
             })
     
+    # Учитываем заказ в совместных покупках (до рекомендаций: сами пластинки заказа в них не попадают)
+    if record_co_purchase(order):
+        print(f"✅ Заказ {order_id} учтен в совместных покупках", flush=True)
+    record_popularity(order)
+    
     # Генерируем мнение музыкального эксперта о выборе пластинок
     ai_praise = ""
     try:
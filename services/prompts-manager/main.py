@@ -1,10 +1,14 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, field_validator
 from typing import List, Optional
 from datetime import datetime
+from collections import deque
+import asyncio
+import threading
+import uuid
 import sys
 import os
 from dotenv import load_dotenv
@@ -157,6 +161,8 @@ class PromptResponse(BaseModel):
     id: str  # Строковый ID (например, 'recommendation_prompt')
     name: str
     template: str
+    version: int = 1
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -164,6 +170,93 @@ class PromptResponse(BaseModel):
             datetime: lambda v: v.isoformat() if v else None
         }
 
+# --- Лента изменений промптов ---
+class PromptChangeFeed:
+    """
+    Лента изменений промптов в памяти процесса (long-poll).
+
+    Каждое изменение получает порядковый номер seq. Клиенты (recommender)
+    запрашивают изменения после своего seq и держат кэш промптов, пока
+    лента не сообщит об изменении. epoch меняется при перезапуске сервиса -
+    клиент в этом случае сбрасывает кэш целиком.
+    """
+
+    def __init__(self, max_changes: int = 256):
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self.changes = deque(maxlen=max_changes)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._event = None
+
+    def publish(self, prompt_id: str, version: int, updated_at: Optional[datetime]):
+        """Регистрирует изменение промпта и будит ожидающих клиентов (можно вызывать из потоков)"""
+        with self._lock:
+            self.seq += 1
+            self.changes.append({
+                "seq": self.seq,
+                "prompt_id": prompt_id,
+                "version": version,
+                "updated_at": updated_at.isoformat() if updated_at else None
+            })
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # Event loop уже закрыт
+                self._loop = None
+
+    def _wake(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, since: int, timeout: float):
+        """Ждет изменений после since не дольше timeout секунд"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._event = asyncio.Event()
+        deadline = loop.time() + timeout
+        while self.seq <= since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def snapshot(self, since: int, epoch: Optional[str]) -> dict:
+        """Изменения после since; reset=True - клиент должен сбросить весь кэш"""
+        with self._lock:
+            changes = list(self.changes)
+            seq = self.seq
+        oldest_seq = changes[0]["seq"] if changes else seq + 1
+        reset = epoch != self.epoch or since > seq or since < oldest_seq - 1
+        return {
+            "epoch": self.epoch,
+            "seq": seq,
+            "reset": reset,
+            "changes": [] if reset else [c for c in changes if c["seq"] > since]
+        }
+
+
+prompt_changes = PromptChangeFeed()
+
+
+def ensure_prompt_version_columns():
+    """Добавляет колонки version/updated_at в таблицу prompts, созданную до их появления"""
+    from sqlalchemy import inspect, text
+    columns = {column["name"] for column in inspect(connection.engine).get_columns("prompts")}
+    datetime_type = "TIMESTAMP" if connection.engine.dialect.name == "postgresql" else "DATETIME"
+    with connection.engine.begin() as conn:
+        if "version" not in columns:
+            conn.execute(text("ALTER TABLE prompts ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+            print("Добавлена колонка prompts.version")
+        if "updated_at" not in columns:
+            conn.execute(text(f"ALTER TABLE prompts ADD COLUMN updated_at {datetime_type}"))
+            print("Добавлена колонка prompts.updated_at")
+
 # --- Дефолтные промпты ---
 DEFAULT_DESCRIPTION_PROMPT = """Ты - эксперт по написанию продающих описаний для виниловых пластинок.
 
@@ -265,6 +358,7 @@ async def startup_event():
         )
         
         connection.init_db()
+        ensure_prompt_version_columns()
         print("База данных инициализирована успешно")
         
         # Создаем или обновляем дефолтные промпты
@@ -395,7 +489,9 @@ def get_prompts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
             PromptResponse(
                 id=prompt.id,
                 name=prompt.name,
-                template=prompt.template
+                template=prompt.template,
+                version=prompt.version or 1,
+                updated_at=prompt.updated_at
             )
             for prompt in prompts
         ]
@@ -423,7 +519,9 @@ def get_prompt(prompt_id: str, db: Session = Depends(get_db)):
         return PromptResponse(
             id=prompt.id,
             name=prompt.name,
-            template=prompt.template
+            template=prompt.template,
+            version=prompt.version or 1,
+            updated_at=prompt.updated_at
         )
     except HTTPException:
         raise  # Передаем HTTPException дальше, обработчик добавит CORS
@@ -446,15 +544,19 @@ def update_prompt(prompt_id: str, prompt_update: PromptUpdate, db: Session = Dep
         raise HTTPException(status_code=404, detail=f"Промпт '{prompt_id}' не найден")
     
     prompt.template = prompt_update.template
+    prompt.version = (prompt.version or 1) + 1
     
     try:
         db.commit()
         db.refresh(prompt)
+        prompt_changes.publish(prompt.id, prompt.version, prompt.updated_at)
         # Явно преобразуем SQLAlchemy объект в Pydantic модель
         return PromptResponse(
             id=prompt.id,
             name=prompt.name,
-            template=prompt.template
+            template=prompt.template,
+            version=prompt.version or 1,
+            updated_at=prompt.updated_at
         )
     except Exception as e:
         db.rollback()
@@ -518,14 +620,18 @@ def reset_prompt(prompt_id: str, db: Session = Depends(get_db)):
             status_code=400, 
             detail=f"Промпт '{prompt_id}' не имеет дефолтного значения для сброса"
         )
+    prompt.version = (prompt.version or 1) + 1
     
     try:
         db.commit()
         db.refresh(prompt)
+        prompt_changes.publish(prompt.id, prompt.version, prompt.updated_at)
         return PromptResponse(
             id=prompt.id,
             name=prompt.name,
-            template=prompt.template
+            template=prompt.template,
+            version=prompt.version or 1,
+            updated_at=prompt.updated_at
         )
     except Exception as e:
         db.rollback()
@@ -534,6 +640,23 @@ def reset_prompt(prompt_id: str, db: Session = Depends(get_db)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Ошибка при сбросе промпта: {str(e)}")
 
+@app.get("/api/v1/changes")
+async def get_prompt_changes(
+    since: int = 0,
+    epoch: Optional[str] = None,
+    timeout: float = Query(25.0, ge=0, le=60)
+):
+    """
+    Лента изменений промптов (long-poll).
+
+    Возвращает изменения с seq > since. Если новых изменений нет, запрос
+    ждет до timeout секунд. reset=true означает, что клиент пропустил
+    изменения (или сервис перезапущен) и должен сбросить весь кэш промптов.
+    """
+    if epoch == prompt_changes.epoch and since >= prompt_changes.seq and timeout > 0:
+        await prompt_changes.wait(since, timeout)
+    return prompt_changes.snapshot(since, epoch)
+
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
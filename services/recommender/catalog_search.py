@@ -0,0 +1,122 @@
+"""
+Локальный поиск по каталогу для recommender service (BM25).
+
+Вместо того чтобы вставлять в системный промпт весь каталог, recommender
+выбирает несколько наиболее подходящих к запросу пластинок и укладывает их
+в бюджет токенов. Размер промпта перестает расти вместе с каталогом.
+
+Индекс строится один раз на версию каталога (см. CatalogSnapshot.search_index).
+"""
+import itertools
+import math
+import re
+from typing import Callable, Iterable, List
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Название и исполнитель важнее описания: их токены учитываются с весом 2
+NAME_WEIGHT = 2
+ARTIST_WEIGHT = 2
+
+# Грубая оценка: ~3 символа на токен (кириллица токенизируется хуже латиницы)
+CHARS_PER_TOKEN = 3
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбивает текст на термы: слова в нижнем регистре плюс их 4-символьная основа
+    ("джаз", "джазовый" и "джазовая" совпадут по основе "джаз").
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) < 2:
+            continue
+        terms.append(token)
+        if len(token) > 4:
+            terms.append(token[:4])
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class BM25Index:
+    """BM25 по полям name, artist, description"""
+
+    def __init__(self, records: list, k1: float = 1.5, b: float = 0.75):
+        self.records = records
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> [(doc_index, term_frequency)]
+        self.doc_lengths = []
+
+        for doc_index, record in enumerate(records):
+            terms = (
+                tokenize(record.name) * NAME_WEIGHT
+                + tokenize(record.artist) * ARTIST_WEIGHT
+                + tokenize(record.description or "")
+            )
+            self.doc_lengths.append(len(terms))
+            frequencies = {}
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term, frequency in frequencies.items():
+                self.postings.setdefault(term, []).append((doc_index, frequency))
+
+        total_docs = len(records)
+        self.avg_doc_length = (sum(self.doc_lengths) / total_docs) if total_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Возвращает до k записей, отсортированных по релевантности запросу"""
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for doc_index, frequency in docs:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_doc_length
+                score = idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                scores[doc_index] = scores.get(doc_index, 0.0) + score
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [self.records[doc_index] for doc_index, score in ranked]
+
+
+def select_context_records(
+    index: BM25Index,
+    query: str,
+    format_line: Callable[[object], str],
+    token_budget: int,
+    max_records: int,
+    pinned: Iterable = (),
+    count_tokens: Callable[[str], int] = estimate_tokens
+) -> List[str]:
+    """
+    Отбирает строки каталога для контекста LLM в пределах бюджета токенов.
+
+    Порядок: сначала pinned (например, текущая пластинка), затем найденные
+    по запросу, затем остальные пластинки каталога - пока не исчерпан бюджет
+    или лимит записей. count_tokens - подсчет токенов для модели запроса.
+    """
+    lines = []
+    seen_ids = set()
+    used_tokens = 0
+    candidates = list(pinned) + index.search(query, max_records)
+    for record in itertools.chain(candidates, index.records):
+        if len(lines) >= max_records:
+            break
+        if record.id in seen_ids:
+            continue
+        line = format_line(record)
+        line_tokens = count_tokens(line)
+        if used_tokens + line_tokens > token_budget:
+            break
+        seen_ids.add(record.id)
+        lines.append(line)
+        used_tokens += line_tokens
+    return lines
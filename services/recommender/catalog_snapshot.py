@@ -0,0 +1,78 @@
+"""
+Снимок каталога для recommender service.
+
+Recommender держит в памяти последнюю загруженную версию каталога вместе
+с индексами по ID и по названию, чтобы не скачивать каталог на каждый
+запрос рекомендаций или сообщение чата. Снимок обновляется целиком
+(новый объект), поэтому обработчики, получившие ссылку на снимок, видят
+согласованные данные до конца запроса.
+"""
+import time
+from typing import Optional
+
+from catalog_search import BM25Index
+from item_similarity import ItemSimilarityIndex
+from title_matcher import TitleMatcher, normalize_title
+
+
+def build_name_index(records: list) -> dict:
+    """Индекс нормализованное название -> пластинка (плюс вариант без коротких слов)"""
+    records_by_name = {}
+    for record in records:
+        normalized_name = normalize_title(record.name)
+        records_by_name[normalized_name] = record
+        # Также добавляем варианты без некоторых слов
+        name_parts = [part for part in normalized_name.split() if len(part) > 2]
+        if len(name_parts) > 1:
+            records_by_name[' '.join(name_parts)] = record
+    return records_by_name
+
+
+class CatalogSnapshot:
+    """Загруженная версия каталога с индексами по ID и названию"""
+
+    def __init__(self, products: list, version: Optional[int] = None, etag: Optional[str] = None):
+        self.products = products
+        self.version = version
+        self.etag = etag
+        self.by_id = {product.id: product for product in products}
+        self.by_name = build_name_index(products)
+        self.loaded_at = time.monotonic()
+        # Время последней успешной проверки актуальности (в т.ч. ответом 304)
+        self.checked_at = self.loaded_at
+        self._search_index = None
+        self._similarity_index = None
+        self._title_matcher = None
+
+    @property
+    def search_index(self) -> BM25Index:
+        """Поисковый индекс по каталогу (строится при первом обращении)"""
+        if self._search_index is None:
+            self._search_index = BM25Index(self.products)
+        return self._search_index
+
+    @property
+    def similarity_index(self) -> ItemSimilarityIndex:
+        """Матрица сходства пластинок (строится при первом обращении)"""
+        if self._similarity_index is None:
+            self._similarity_index = ItemSimilarityIndex(self.products)
+        return self._similarity_index
+
+    @property
+    def title_matcher(self) -> TitleMatcher:
+        """Автомат поиска названий пластинок в ответах LLM (строится при первом обращении)"""
+        if self._title_matcher is None:
+            self._title_matcher = TitleMatcher(self.products)
+        return self._title_matcher
+
+    def age(self) -> float:
+        """Сколько секунд прошло с последней проверки актуальности"""
+        return time.monotonic() - self.checked_at
+
+    def stats(self) -> dict:
+        return {
+            "products": len(self.products),
+            "version": self.version,
+            "etag": self.etag,
+            "age_seconds": round(self.age(), 1),
+        }
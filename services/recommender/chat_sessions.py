@@ -0,0 +1,151 @@
+"""
+Серверные сессии чата для recommender service.
+
+Раньше клиент на каждое сообщение присылал всю историю диалога, и она
+каждый раз заново валидировалась. Теперь история хранится на сервере:
+клиент присылает session_id и новое сообщение, размер запроса не растет
+с длиной диалога. Число сессий ограничено (LRU-вытеснение), неактивные
+сессии живут не дольше TTL, в каждой хранится не больше max_messages
+последних сообщений. Сессии могут сохраняться на диск (JSON) между
+перезапусками сервиса - как кэш ответов LLM.
+
+Если присланный session_id неизвестен (истек TTL, вытеснен, сервис
+перезапущен без сохранения), сервер не начинает молча пустой диалог:
+resume возвращает None, клиент получает 409 и повторяет запрос со своей
+локальной историей.
+"""
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+
+class ChatSession:
+    """История одного диалога"""
+
+    def __init__(self, session_id: str, messages: Optional[List[dict]] = None,
+                 created_at: Optional[float] = None, updated_at: Optional[float] = None):
+        self.id = session_id
+        self.messages: List[dict] = messages or []
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "messages": self.messages,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class ChatSessionStore:
+    """LRU-хранилище сессий с TTL неактивности и опциональным сохранением на диск"""
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 86400.0,
+                 max_messages: int = 50, persist_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.persist_path = Path(persist_path) if persist_path else None
+        self._sessions = OrderedDict()  # session_id -> ChatSession
+        self.created = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def create(self, messages: Optional[List[dict]] = None) -> ChatSession:
+        """Новая сессия (можно сразу передать историю, например, присланную старым клиентом)"""
+        session = ChatSession(uuid.uuid4().hex, list(messages or [])[-self.max_messages:])
+        self._sessions[session.id] = session
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Сессия или None (не существует / истек TTL)"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.updated_at + self.ttl_seconds <= time.time():
+            del self._sessions[session_id]
+            self.expired += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def resume(self, session_id: Optional[str], history: Optional[List[dict]] = None) -> Optional[ChatSession]:
+        """
+        Сессия для очередного сообщения: существующая по session_id или новая с историей клиента.
+        None - session_id неизвестен, а истории в запросе нет (клиент должен прислать ее заново)
+        """
+        if session_id:
+            session = self.get(session_id)
+            if session is not None:
+                return session
+            if not history:
+                return None
+        return self.create(history)
+
+    def append(self, session: ChatSession, *messages: dict) -> None:
+        """Добавляет сообщения в конец истории (старые сверх max_messages отбрасываются)"""
+        session.messages.extend(messages)
+        if len(session.messages) > self.max_messages:
+            del session.messages[:len(session.messages) - self.max_messages]
+        session.updated_at = time.time()
+        if session.id in self._sessions:
+            self._sessions.move_to_end(session.id)
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "max_messages": self.max_messages,
+            "created": self.created,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "persist_path": str(self.persist_path) if self.persist_path else None,
+        }
+
+    def load(self) -> int:
+        """Подгружает непросроченные сессии с диска. Возвращает количество загруженных"""
+        if not self.persist_path or not self.persist_path.exists():
+            return 0
+        with open(self.persist_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        now = time.time()
+        loaded = 0
+        for data in stored:
+            if data["updated_at"] + self.ttl_seconds > now:
+                self._sessions[data["session_id"]] = ChatSession(
+                    data["session_id"], data["messages"], data["created_at"], data["updated_at"]
+                )
+                loaded += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return loaded
+
+    def save(self) -> int:
+        """Сохраняет непросроченные сессии на диск (атомарно). Возвращает количество сохраненных"""
+        if not self.persist_path:
+            return 0
+        now = time.time()
+        stored = [
+            session.to_dict()
+            for session in self._sessions.values()
+            if session.updated_at + self.ttl_seconds > now
+        ]
+        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.persist_path.with_suffix(self.persist_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, ensure_ascii=False)
+        os.replace(tmp_path, self.persist_path)
+        return len(stored)
@@ -0,0 +1,205 @@
+"""
+"С этой пластинкой также покупают" по истории заказов.
+
+Заказы несут product_ids, но раньше история покупок нигде не использовалась:
+рекомендации в письме о заказе - всегда живой вызов LLM. Теперь каждый
+созданный заказ инкрементально добавляется в счетчик совместных покупок:
+для каждой пары пластинок из одного заказа растет вес пары, и для каждой
+пластинки поддерживается top-N самых частых соседей - ответ готов заранее.
+
+Старые заказы весят меньше: вес заказа затухает экспоненциально с периодом
+полураспада half_life_days. Чтобы не пересчитывать все веса со временем,
+хранятся веса в масштабе опорного момента: заказ в момент t добавляет
+exp(λ·(t - t_ref)). Затухание одинаково для всех пар, поэтому порядок соседей
+меняется только при росте веса конкретной пары - top-N обновляется за O(N).
+"""
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Крупные заказы (оптовые) дают квадратичное число пар - учитываем первые позиции
+MAX_ORDER_ITEMS = 50
+# При таком показателе масштаба веса пересчитываются к текущему моменту (защита от переполнения)
+MAX_SCALE_EXPONENT = 50.0
+
+
+class CoPurchaseIndex:
+    """Затухающие счетчики совместных покупок и top-N соседей каждой пластинки"""
+
+    def __init__(self, half_life_days: float = 30.0, top_n: int = 20, max_neighbors: int = 200,
+                 max_order_ids: int = 10000, persist_path: Optional[str] = None):
+        self.decay_rate = math.log(2) / (half_life_days * 86400)
+        self.half_life_days = half_life_days
+        self.top_n = top_n
+        self.max_neighbors = max_neighbors
+        self.max_order_ids = max_order_ids
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.reference_time = time.time()
+        self._pairs: Dict[int, Dict[int, float]] = {}  # пластинка -> {сосед: вес в масштабе reference_time}
+        self._purchases: Dict[int, float] = {}         # пластинка -> вес заказов с ней
+        self._top: Dict[int, List[int]] = {}           # пластинка -> top_n соседей по убыванию веса
+        self._order_ids = OrderedDict()                # Уже учтенные заказы (повторная отправка не удваивает веса)
+        self.orders_recorded = 0
+        self.duplicates = 0
+
+    def _weight_at(self, timestamp: float) -> float:
+        exponent = self.decay_rate * (timestamp - self.reference_time)
+        if exponent > MAX_SCALE_EXPONENT:
+            self._rescale(timestamp)
+            exponent = 0.0
+        return math.exp(exponent)
+
+    def _rescale(self, timestamp: float):
+        """Переводит все веса в масштаб нового опорного момента"""
+        factor = math.exp(-self.decay_rate * (timestamp - self.reference_time))
+        for neighbors in self._pairs.values():
+            for neighbor in neighbors:
+                neighbors[neighbor] *= factor
+        for product_id in self._purchases:
+            self._purchases[product_id] *= factor
+        self.reference_time = timestamp
+
+    def _decay_now(self) -> float:
+        """Множитель перевода хранимых весов в текущие"""
+        return math.exp(-self.decay_rate * (time.time() - self.reference_time))
+
+    def record_order(self, product_ids: Iterable, timestamp: Optional[float] = None,
+                     order_id: Optional[str] = None) -> bool:
+        """Учитывает заказ. Возвращает False, если заказ уже был учтен или в нем меньше двух пластинок"""
+        if order_id is not None:
+            if order_id in self._order_ids:
+                self.duplicates += 1
+                return False
+            self._order_ids[order_id] = True
+            while len(self._order_ids) > self.max_order_ids:
+                self._order_ids.popitem(last=False)
+
+        items = []
+        for product_id in product_ids:
+            try:
+                product_id = int(product_id)
+            except (TypeError, ValueError):
+                continue
+            if product_id not in items:
+                items.append(product_id)
+        items = items[:MAX_ORDER_ITEMS]
+
+        # Время заказа присылает клиент: заказ "из будущего" весил бы больше всех настоящих
+        # (а дата вроде 9999 года переполнила бы math.exp) - считаем его сделанным сейчас
+        now = time.time()
+        weight = self._weight_at(now if timestamp is None else min(timestamp, now))
+        for product_id in items:
+            self._purchases[product_id] = self._purchases.get(product_id, 0.0) + weight
+        if len(items) < 2:
+            return False
+        for product_id in items:
+            neighbors = self._pairs.setdefault(product_id, {})
+            for neighbor in items:
+                if neighbor != product_id:
+                    neighbors[neighbor] = neighbors.get(neighbor, 0.0) + weight
+                    self._promote(product_id, neighbor)
+            if len(neighbors) > self.max_neighbors * 2:
+                self._prune(product_id)
+        self.orders_recorded += 1
+        return True
+
+    def _promote(self, product_id: int, neighbor: int):
+        """Вес пары вырос: сосед может подняться в top-N (остальные веса относительно не изменились)"""
+        weights = self._pairs[product_id]
+        top = self._top.setdefault(product_id, [])
+        if neighbor in top:
+            top.remove(neighbor)
+        elif len(top) >= self.top_n and weights[top[-1]] >= weights[neighbor]:
+            return
+        position = len(top)
+        while position > 0 and weights[top[position - 1]] < weights[neighbor]:
+            position -= 1
+        top.insert(position, neighbor)
+        del top[self.top_n:]
+
+    def _prune(self, product_id: int):
+        """Оставляет max_neighbors самых тяжелых соседей (top-N среди них)"""
+        neighbors = self._pairs[product_id]
+        kept = sorted(neighbors.items(), key=lambda item: item[1], reverse=True)[:self.max_neighbors]
+        self._pairs[product_id] = dict(kept)
+        self._top[product_id] = [neighbor for neighbor in self._top.get(product_id, []) if neighbor in self._pairs[product_id]]
+
+    def related(self, product_id: int, limit: int = 5) -> List[Tuple[int, float, float]]:
+        """
+        Соседи пластинки: [(id, затухающее число совместных заказов, доля заказов пластинки с этим соседом)]
+        """
+        decay = self._decay_now()
+        weights = self._pairs.get(product_id, {})
+        purchases = self._purchases.get(product_id) or 1.0
+        return [
+            (neighbor, weights[neighbor] * decay, weights[neighbor] / purchases)
+            for neighbor in self._top.get(product_id, [])[:limit]
+        ]
+
+    def related_to_basket(self, product_ids: Iterable[int], limit: int = 5) -> List[Tuple[int, float, float]]:
+        """Соседи набора пластинок (веса складываются, сами пластинки набора исключаются)"""
+        basket = list(dict.fromkeys(product_ids))
+        weights: Dict[int, float] = {}
+        shares: Dict[int, float] = {}
+        for product_id in basket:
+            for neighbor, weight, share in self.related(product_id, self.top_n):
+                if neighbor in basket:
+                    continue
+                weights[neighbor] = weights.get(neighbor, 0.0) + weight
+                shares[neighbor] = max(shares.get(neighbor, 0.0), share)
+        ranked = sorted(weights, key=lambda neighbor: weights[neighbor], reverse=True)[:limit]
+        return [(neighbor, weights[neighbor], shares[neighbor]) for neighbor in ranked]
+
+    def stats(self) -> dict:
+        return {
+            "products": len(self._purchases),
+            "products_with_neighbors": len(self._top),
+            "pairs": sum(len(neighbors) for neighbors in self._pairs.values()) // 2,
+            "orders_recorded": self.orders_recorded,
+            "duplicates": self.duplicates,
+            "half_life_days": self.half_life_days,
+            "top_n": self.top_n,
+            "persist_path": str(self.persist_path) if self.persist_path else None,
+        }
+
+    def load(self) -> int:
+        """Подгружает счетчики с диска и перестраивает top-N. Возвращает количество пластинок"""
+        if not self.persist_path or not self.persist_path.exists():
+            return 0
+        with open(self.persist_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        self.reference_time = stored["reference_time"]
+        self.orders_recorded = stored.get("orders_recorded", 0)
+        self._purchases = {int(product_id): weight for product_id, weight in stored["purchases"].items()}
+        self._pairs = {
+            int(product_id): {int(neighbor): weight for neighbor, weight in neighbors.items()}
+            for product_id, neighbors in stored["pairs"].items()
+        }
+        self._order_ids = OrderedDict((order_id, True) for order_id in stored.get("order_ids", []))
+        self._top = {
+            product_id: sorted(neighbors, key=lambda neighbor: neighbors[neighbor], reverse=True)[:self.top_n]
+            for product_id, neighbors in self._pairs.items()
+        }
+        return len(self._purchases)
+
+    def save(self) -> int:
+        """Сохраняет счетчики на диск (атомарно). Возвращает количество пластинок"""
+        if not self.persist_path:
+            return 0
+        stored = {
+            "reference_time": self.reference_time,
+            "orders_recorded": self.orders_recorded,
+            "purchases": self._purchases,
+            "pairs": self._pairs,
+            "order_ids": list(self._order_ids),
+        }
+        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.persist_path.with_suffix(self.persist_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, self.persist_path)
+        return len(self._purchases)
@@ -0,0 +1,140 @@
+"""
+Задания массовой генерации описаний для recommender service.
+
+Вместо тысяч блокирующих запросов generate-description/{id} админ-панель
+создает одно задание на набор пластинок. Задание выполняется в фоне
+(см. run_description_job в main.py), а здесь хранится его состояние:
+общий статус, прогресс и статус каждой пластинки.
+"""
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+# Статусы задания
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+JOB_FAILED = "failed"
+JOB_FINISHED_STATUSES = (JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED)
+
+# Статусы пластинки в задании
+ITEM_PENDING = "pending"
+ITEM_RUNNING = "running"
+ITEM_GENERATED = "generated"  # Описание получено, ждет пакетной записи в каталог
+ITEM_SAVED = "saved"
+ITEM_FAILED = "failed"
+ITEM_STATUSES = (ITEM_PENDING, ITEM_RUNNING, ITEM_GENERATED, ITEM_SAVED, ITEM_FAILED)
+
+
+class DescriptionJob:
+    """Состояние одного задания генерации описаний"""
+
+    def __init__(self, product_ids: Iterable[int], no_cache: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.no_cache = no_cache
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.items = OrderedDict(
+            (product_id, {"product_id": product_id, "status": ITEM_PENDING, "error": None})
+            for product_id in product_ids
+        )
+        self.counts = {status: 0 for status in ITEM_STATUSES}
+        self.counts[ITEM_PENDING] = len(self.items)
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task = None  # asyncio.Task выполнения задания
+
+    @property
+    def product_ids(self) -> List[int]:
+        return list(self.items.keys())
+
+    @property
+    def finished(self) -> bool:
+        return self.status in JOB_FINISHED_STATUSES
+
+    def start(self):
+        self.status = JOB_RUNNING
+        self.started_at = time.time()
+
+    def finish(self, status: str = JOB_COMPLETED, error: Optional[str] = None):
+        # Прерванные на середине пластинки возвращаются в ожидание
+        for product_id, item in self.items.items():
+            if item["status"] == ITEM_RUNNING:
+                self.mark(product_id, ITEM_PENDING)
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+
+    def mark(self, product_id: int, status: str, error: Optional[str] = None):
+        """Обновляет статус пластинки (счетчики пересчитываются инкрементально)"""
+        item = self.items[product_id]
+        self.counts[item["status"]] -= 1
+        self.counts[status] += 1
+        item["status"] = status
+        item["error"] = error
+
+    def progress(self) -> dict:
+        total = len(self.items)
+        processed = self.counts[ITEM_SAVED] + self.counts[ITEM_FAILED]
+        progress = {
+            "total": total,
+            "processed": processed,
+            "percent": round(100 * processed / total, 1) if total else 100.0,
+            **self.counts,
+        }
+        # Оценка оставшегося времени по средней скорости задания
+        if self.status == JOB_RUNNING and processed:
+            elapsed = time.time() - self.started_at
+            progress["eta_seconds"] = round(elapsed / processed * (total - processed))
+        return progress
+
+    def to_dict(self, include_items: bool = False, item_status: Optional[str] = None,
+                offset: int = 0, limit: int = 100) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "no_cache": self.no_cache,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress(),
+        }
+        if include_items:
+            items = [
+                item for item in self.items.values()
+                if item_status is None or item["status"] == item_status
+            ]
+            data["items"] = [dict(item) for item in items[offset:offset + limit]]
+            data["items_total"] = len(items)
+        return data
+
+
+class DescriptionJobStore:
+    """Задания в памяти процесса; хранится не больше keep_finished завершенных заданий"""
+
+    def __init__(self, keep_finished: int = 20):
+        self.keep_finished = keep_finished
+        self._jobs = OrderedDict()  # job_id -> DescriptionJob (в порядке создания)
+
+    def add(self, job: DescriptionJob) -> DescriptionJob:
+        self._jobs[job.id] = job
+        self._evict()
+        return job
+
+    def get(self, job_id: str) -> Optional[DescriptionJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[DescriptionJob]:
+        return list(self._jobs.values())
+
+    def running(self) -> List[DescriptionJob]:
+        return [job for job in self._jobs.values() if not job.finished]
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
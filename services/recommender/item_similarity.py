@@ -0,0 +1,99 @@
+"""
+Контентные рекомендации без LLM: сходство пластинок на NumPy.
+
+Для каждой пластинки заранее строится TF-IDF вектор признаков (исполнитель,
+слова описания и названия, ценовой диапазон) с хешированием признаков в
+пространство фиксированной размерности. Векторы нормализованы, поэтому
+"похожие на эти пластинки" - одно умножение матрицы на вектор запроса.
+
+Индекс строится один раз на версию каталога (см. CatalogSnapshot.similarity_index).
+"""
+import zlib
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from catalog_search import tokenize
+
+# Размерность пространства признаков (хеширование признаков)
+FEATURE_DIM = 4096
+
+# Веса групп признаков
+ARTIST_WEIGHT = 3.0
+PRICE_WEIGHT = 1.0
+TEXT_WEIGHT = 1.0
+
+# Границы ценовых диапазонов, ₽
+PRICE_BANDS = (1000, 2000, 3000, 4000, 5000, 7000)
+
+
+def price_band(price: float) -> int:
+    """Номер ценового диапазона"""
+    for band, upper in enumerate(PRICE_BANDS):
+        if price < upper:
+            return band
+    return len(PRICE_BANDS)
+
+
+def extract_features(record) -> List[Tuple[str, float]]:
+    """Признаки пластинки: (название признака, вес)"""
+    features = [(f"artist:{record.artist.strip().lower()}", ARTIST_WEIGHT)]
+    band = price_band(record.price)
+    features.append((f"price:{band}", PRICE_WEIGHT))
+    # Соседние ценовые диапазоны тоже немного похожи
+    features.append((f"price:{band - 1}~", PRICE_WEIGHT / 2))
+    features.append((f"price:{band + 1}~", PRICE_WEIGHT / 2))
+    features.append((f"price:{band}~", PRICE_WEIGHT / 2))
+    for term in set(tokenize(f"{record.name} {record.description or ''}")):
+        features.append((f"text:{term}", TEXT_WEIGHT))
+    return features
+
+
+def feature_slot(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % FEATURE_DIM
+
+
+class ItemSimilarityIndex:
+    """Матрица нормализованных TF-IDF векторов пластинок"""
+
+    def __init__(self, records: list):
+        self.records = records
+        self.position = {record.id: i for i, record in enumerate(records)}
+
+        rows = [extract_features(record) for record in records]
+        # Документная частота признаков -> IDF (редкие признаки важнее)
+        document_frequency = {}
+        for features in rows:
+            for feature, _ in features:
+                document_frequency[feature] = document_frequency.get(feature, 0) + 1
+        total = max(len(records), 1)
+
+        self.matrix = np.zeros((len(records), FEATURE_DIM), dtype=np.float32)
+        for i, features in enumerate(rows):
+            for feature, weight in features:
+                idf = np.log((1 + total) / (1 + document_frequency[feature])) + 1.0
+                self.matrix[i, feature_slot(feature)] += weight * idf
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix /= norms
+
+    def similar(self, record_ids: Iterable[int], k: int = 5) -> List[Tuple[object, float]]:
+        """
+        Пластинки, похожие на заданные (сами заданные исключаются).
+        Возвращает [(пластинка, сходство 0..1)], по убыванию сходства.
+        """
+        positions = [self.position[record_id] for record_id in record_ids if record_id in self.position]
+        if not positions or k <= 0:
+            return []
+
+        query = self.matrix[positions].mean(axis=0)
+        scores = self.matrix @ query
+        scores[positions] = -np.inf
+
+        k = min(k, len(self.records) - len(set(positions)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        return [(self.records[i], float(scores[i]) / query_norm) for i in top]
@@ -0,0 +1,124 @@
+"""
+Кэш ответов LLM для recommender service.
+
+Ключ - (model, messages, temperature, max_tokens). Размер ограничен
+(LRU-вытеснение), записи живут не дольше TTL. Кэш может сохраняться на диск
+(JSON) и подгружаться при старте сервиса. Значения должны быть
+JSON-сериализуемыми (recommender хранит response.model_dump()).
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+
+class LLMResponseCache:
+    """LRU-кэш с TTL, статистикой попаданий и опциональным сохранением на диск"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0, persist_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = Path(persist_path) if persist_path else None
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def make_key(model: str, messages: list, temperature: float, max_tokens: int) -> str:
+        """Строит ключ кэша из параметров запроса к LLM"""
+        payload = json.dumps(
+            [model, messages, temperature, max_tokens],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Возвращает значение из кэша или None (промах / истек TTL)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Сохраняет значение, вытесняя самые давно использованные записи"""
+        if not self.enabled:
+            return
+        self._entries[key] = (time.time() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_bypass(self) -> None:
+        """Учитывает запрос, который явно попросил не использовать кэш"""
+        self.bypassed += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "persist_path": str(self.persist_path) if self.persist_path else None,
+        }
+
+    def load(self) -> int:
+        """Подгружает непросроченные записи с диска. Возвращает количество загруженных"""
+        if not self.persist_path or not self.persist_path.exists():
+            return 0
+        with open(self.persist_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        now = time.time()
+        loaded = 0
+        for key, expires_at, value in stored:
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+                loaded += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return loaded
+
+    def save(self) -> int:
+        """Сохраняет непросроченные записи на диск (атомарно). Возвращает количество сохраненных"""
+        if not self.persist_path:
+            return 0
+        now = time.time()
+        stored = [
+            [key, expires_at, value]
+            for key, (expires_at, value) in self._entries.items()
+            if expires_at > now
+        ]
+        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.persist_path.with_suffix(self.persist_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, ensure_ascii=False)
+        os.replace(tmp_path, self.persist_path)
+        return len(stored)
@@ -0,0 +1,189 @@
+"""
+Хеджированные запросы к нескольким моделям LLM.
+
+Раньше модели перебирались строго по очереди, каждая с таймаутом 90 секунд:
+в худшем случае описание генерировалось ~4.5 минуты. Теперь запрос к
+следующей модели отправляется параллельно, если текущая не ответила за
+"обычное" для нее время (перцентиль наблюдаемых задержек). Берется первый
+валидный ответ, остальные запросы отменяются; общее время ограничено
+дедлайном эндпоинта.
+
+Параметры задаются отдельно для каждого эндпоинта (HedgePolicy.from_env).
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+
+class HedgeDeadlineExceeded(asyncio.TimeoutError):
+    """Ни одна модель не дала валидный ответ до дедлайна эндпоинта"""
+
+
+class ModelLatencyTracker:
+    """Скользящее окно задержек успешных ответов по каждой модели"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}  # model -> deque[seconds]
+
+    def record(self, model: str, seconds: float):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, model: str, percentile: float) -> Optional[float]:
+        """Перцентиль задержки модели (None, если наблюдений еще нет)"""
+        samples = self._samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        position = min(len(ordered) - 1, max(0, int(round(percentile / 100 * (len(ordered) - 1)))))
+        return ordered[position]
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "samples": len(samples),
+                "p50_seconds": round(self.percentile(model, 50), 3),
+                "p95_seconds": round(self.percentile(model, 95), 3),
+            }
+            for model, samples in self._samples.items()
+            if samples
+        }
+
+
+def env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+class HedgePolicy:
+    """Настройки хеджирования для одного эндпоинта"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        percentile: float = 90.0,
+        min_delay: float = 2.0,
+        default_delay: float = 15.0,
+        deadline: float = 60.0
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay          # Не хеджируем раньше (кэш и быстрые ответы занижают перцентиль)
+        self.default_delay = default_delay  # Пока по модели нет наблюдений
+        self.deadline = deadline            # Бюджет на весь запрос, секунды
+
+    @classmethod
+    def from_env(cls, prefix: str, **defaults) -> "HedgePolicy":
+        """
+        Читает настройки эндпоинта из переменных окружения:
+        {prefix}_HEDGE_ENABLED, {prefix}_HEDGE_PERCENTILE, {prefix}_HEDGE_MIN_DELAY_SECONDS,
+        {prefix}_HEDGE_DEFAULT_DELAY_SECONDS, {prefix}_DEADLINE_SECONDS
+        """
+        policy = cls(**defaults)
+        return cls(
+            enabled=env_bool(f"{prefix}_HEDGE_ENABLED", policy.enabled),
+            percentile=float(os.getenv(f"{prefix}_HEDGE_PERCENTILE", policy.percentile)),
+            min_delay=float(os.getenv(f"{prefix}_HEDGE_MIN_DELAY_SECONDS", policy.min_delay)),
+            default_delay=float(os.getenv(f"{prefix}_HEDGE_DEFAULT_DELAY_SECONDS", policy.default_delay)),
+            deadline=float(os.getenv(f"{prefix}_DEADLINE_SECONDS", policy.deadline))
+        )
+
+    def hedge_delay(self, tracker: ModelLatencyTracker, model: str) -> float:
+        """Сколько ждать ответа модели, прежде чем параллельно запустить следующую"""
+        observed = tracker.percentile(model, self.percentile)
+        if observed is None:
+            return self.default_delay
+        return max(self.min_delay, observed)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "min_delay_seconds": self.min_delay,
+            "default_delay_seconds": self.default_delay,
+            "deadline_seconds": self.deadline,
+        }
+
+
+async def hedged_call(
+    models: Sequence[str],
+    call: Callable[[str], Awaitable],
+    policy: HedgePolicy,
+    tracker: ModelLatencyTracker,
+    is_valid: Callable[[object], bool] = lambda result: result is not None,
+    label: str = "LLM"
+) -> Tuple[object, str]:
+    """
+    Запрашивает модели по очереди с хеджированием и возвращает (ответ, модель).
+
+    - следующая модель запускается, если текущая упала / дала невалидный ответ
+      или не ответила за policy.hedge_delay (при policy.enabled);
+    - первый валидный ответ выигрывает, остальные запросы отменяются;
+    - по истечении policy.deadline все запросы отменяются - HedgeDeadlineExceeded.
+
+    HTTPException (перегрузка llm_limiter) пробрасывается, только если
+    ни одна модель не ответила.
+    """
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + policy.deadline
+    pending = {}  # task -> model
+    remaining: List[str] = list(models)
+    errors = []
+    overload_error: Optional[HTTPException] = None
+    next_hedge_at = None
+
+    def launch():
+        nonlocal next_hedge_at
+        model = remaining.pop(0)
+        print(f"[{label}] Запрос к модели {model} ({len(pending) + 1} параллельно)")
+        pending[asyncio.ensure_future(call(model))] = model
+        if policy.enabled and remaining:
+            next_hedge_at = loop.time() + policy.hedge_delay(tracker, model)
+        else:
+            next_hedge_at = None
+
+    try:
+        launch()
+        while pending:
+            now = loop.time()
+            if now >= deadline_at:
+                raise HedgeDeadlineExceeded(
+                    f"Ни одна модель не ответила за {policy.deadline:.0f} с (ошибки: {errors})"
+                )
+            wake_at = deadline_at if next_hedge_at is None else min(deadline_at, next_hedge_at)
+            done, _ = await asyncio.wait(
+                pending.keys(), timeout=max(0.0, wake_at - now), return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                model = pending.pop(task)
+                error = task.exception()
+                if error is None and is_valid(task.result()):
+                    print(f"[{label}] Модель {model} ответила первой")
+                    return task.result(), model
+                if isinstance(error, HTTPException):
+                    overload_error = overload_error or error
+                reason = f"{type(error).__name__}: {error}" if error else "невалидный ответ"
+                print(f"[{label}] Модель {model} не подошла ({reason})")
+                errors.append(f"{model}: {reason}")
+
+            if remaining and (not pending or (next_hedge_at is not None and loop.time() >= next_hedge_at)):
+                if pending:
+                    print(f"[{label}] Модель {pending[next(iter(pending))]} отвечает дольше обычного - хеджируем")
+                launch()
+
+        if overload_error is not None:
+            raise overload_error
+        raise Exception(f"Не удалось получить ответ ни от одной модели: {errors}")
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            # Дожидаемся отмены, чтобы освободить места в llm_limiter и соединения
+            await asyncio.gather(*pending.keys(), return_exceptions=True)
@@ -0,0 +1,86 @@
+"""
+Ограничение числа одновременных запросов к LLM для recommender service.
+
+Каждый запрос к OpenRouter может длиться десятки секунд. Чтобы всплеск
+сообщений в чате не забивал сервис, одновременно выполняется не больше
+max_concurrent запросов к LLM, остальные ждут в очереди ограниченного
+размера. Если очередь заполнена - сразу 429, если место в очереди не
+освободилось за queue_timeout секунд - 503. В обоих случаях клиент
+получает заголовок Retry-After.
+"""
+import asyncio
+import contextlib
+
+from fastapi import HTTPException
+
+
+class LLMOverloadedError(HTTPException):
+    """LLM-запрос отклонен из-за перегрузки (HTTPException, чтобы проходить через обработчики эндпоинтов)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+class LLMConcurrencyLimiter:
+    """Семафор на запросы к LLM с ограниченной очередью ожидания"""
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 32, queue_timeout: float = 10.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Занимает место для запроса к LLM на время блока async with"""
+        if self.waiting == 0 and not self._semaphore.locked():
+            # Есть свободное место и никто не ждет - занимаем без ожидания. Пока в очереди есть
+            # ожидающие, новый запрос встает за ними: иначе он мог бы занять освободившееся место
+            # раньше них (ожидающий еще не дошел до семафора), и очередь голодала бы до 503
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise LLMOverloadedError(
+                    status_code=429,
+                    detail="Слишком много одновременных запросов к AI-консультанту. Попробуйте через несколько секунд.",
+                    retry_after=max(1, int(self.queue_timeout))
+                )
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise LLMOverloadedError(
+                    status_code=503,
+                    detail="AI-сервис перегружен, запрос не дождался очереди. Попробуйте позже.",
+                    retry_after=max(1, int(self.queue_timeout))
+                )
+            finally:
+                self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
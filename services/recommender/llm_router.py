@@ -0,0 +1,209 @@
+"""
+Выбор модели LLM по типу запроса с учетом задержек и ошибок.
+
+Раньше эндпоинты жестко задавали модель (openai/gpt-4o-mini или
+AVAILABLE_MODELS["gpt-4"]), а таймаут был фиксированным - 90 секунд.
+Теперь для каждого типа запроса (чат, рекомендации, описание...) задан
+маршрут: уровень качества моделей, порядок предпочтения и дедлайн. Роутер
+упорядочивает модели маршрута по наблюдаемому перцентилю задержки с
+поправкой на долю ошибок: медленная или сбоящая модель уступает первое
+место автоматически, а после серии отказов временно исключается. Таймаут
+вызова - p99 задержки модели с запасом, но не больше остатка дедлайна.
+"""
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Дедлайн текущего запроса к LLM (time.monotonic()); наследуется задачами эндпоинта
+llm_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """Сколько секунд осталось до дедлайна текущего запроса (None - дедлайна нет)"""
+    deadline = llm_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class ModelHealth:
+    """Доля ошибок моделей в скользящем окне; после серии отказов подряд модель исключается на cooldown"""
+
+    def __init__(self, window: int = 50, eject_after: int = 3, cooldown_seconds: float = 30.0):
+        self.window = window
+        self.eject_after = eject_after
+        self.cooldown_seconds = cooldown_seconds
+        self._outcomes = {}  # model -> deque[bool]
+        self._consecutive_failures = {}
+        self._ejected_until = {}
+
+    def record(self, model: str, ok: bool):
+        outcomes = self._outcomes.get(model)
+        if outcomes is None:
+            outcomes = self._outcomes[model] = deque(maxlen=self.window)
+        outcomes.append(ok)
+        if ok:
+            self._consecutive_failures[model] = 0
+            self._ejected_until.pop(model, None)
+            return
+        failures = self._consecutive_failures.get(model, 0) + 1
+        self._consecutive_failures[model] = failures
+        if failures >= self.eject_after:
+            # После cooldown модель снова получает запрос: успех вернет ее, отказ продлит исключение
+            self._ejected_until[model] = time.monotonic() + self.cooldown_seconds
+            self._consecutive_failures[model] = self.eject_after - 1
+
+    def error_rate(self, model: str) -> float:
+        outcomes = self._outcomes.get(model)
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def available(self, model: str) -> bool:
+        return self._ejected_until.get(model, 0.0) <= time.monotonic()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            model: {
+                "samples": len(outcomes),
+                "error_rate": round(self.error_rate(model), 3),
+                "ejected_for_seconds": round(max(0.0, self._ejected_until.get(model, 0.0) - now), 1),
+            }
+            for model, outcomes in self._outcomes.items()
+        }
+
+
+class Route:
+    """Маршрут типа запроса: модели в порядке предпочтения, уровень качества, дедлайн"""
+
+    def __init__(self, models: List[str], tier: Optional[str] = None, deadline: float = 60.0):
+        self.models = models
+        self.tier = tier
+        self.deadline = deadline
+
+    @classmethod
+    def from_env(cls, name: str, tiers: Dict[str, str], tier: Optional[str] = None,
+                 models: Optional[List[str]] = None, deadline: float = 60.0) -> "Route":
+        """
+        Переменные LLM_ROUTE_{NAME}_MODELS (через запятую), _TIER, _DEADLINE_SECONDS.
+        Без списка моделей берутся модели уровня tier, затем остальные - на случай деградации.
+        """
+        prefix = f"LLM_ROUTE_{name.upper()}"
+        tier = os.getenv(f"{prefix}_TIER", tier)
+        env_models = [model.strip() for model in os.getenv(f"{prefix}_MODELS", "").split(",") if model.strip()]
+        if env_models:
+            models = env_models
+        elif models is None:
+            models = [model for model, model_tier in tiers.items() if model_tier == tier]
+            models += [model for model in tiers if model not in models]
+        return cls(models, tier, float(os.getenv(f"{prefix}_DEADLINE_SECONDS", str(deadline))))
+
+    def stats(self) -> dict:
+        return {"models": self.models, "tier": self.tier, "deadline_seconds": self.deadline}
+
+
+class ModelRouter:
+    """Порядок моделей для запроса и адаптивные таймауты"""
+
+    def __init__(
+        self,
+        latency,                        # ModelLatencyTracker (задержки успешных ответов)
+        routes: Dict[str, Route],
+        tiers: Dict[str, str],          # model -> уровень качества
+        health: Optional[ModelHealth] = None,
+        percentile: float = 90.0,
+        default_latency: float = 10.0,  # Ожидаемая задержка модели без наблюдений
+        error_penalty: float = 4.0,     # 25% ошибок удваивают оценку модели
+        switch_ratio: float = 1.5,      # Предпочтительная модель остается первой, пока не хуже лучшей в 1.5 раза
+        timeout_multiplier: float = 2.0,
+        min_timeout: float = 10.0,
+        max_timeout: float = 90.0
+    ):
+        self.latency = latency
+        self.routes = routes
+        self.tiers = tiers
+        self.health = health or ModelHealth()
+        self.percentile = percentile
+        self.default_latency = default_latency
+        self.error_penalty = error_penalty
+        self.switch_ratio = switch_ratio
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+    def score(self, model: str, unknown: Optional[float] = None) -> float:
+        """
+        Ожидаемая задержка модели с поправкой на долю ошибок (меньше - лучше).
+        Модель без наблюдений получает оценку unknown (по умолчанию - default_latency).
+        """
+        expected = self.latency.percentile(model, self.percentile)
+        if expected is None:
+            expected = self.default_latency if unknown is None else unknown
+        return expected * (1 + self.error_penalty * self.health.error_rate(model))
+
+    def candidates(self, request_type: str, preferred: Optional[str] = None,
+                   remaining: Optional[float] = None) -> List[str]:
+        """
+        Модели для запроса в порядке попыток. preferred (модель, выбранная клиентом) идет
+        первой, пока она здорова и не сильно медленнее лучшей; иначе - лучшая по оценке.
+        """
+        route = self.routes[request_type]
+        models = list(route.models)
+        if preferred:
+            models = [preferred] + [model for model in models if model != preferred]
+
+        # Исключенные после серии отказов пропускаем (если исключены все - пробуем все)
+        available = [model for model in models if self.health.available(model)] or models
+        # Модели, обычно не укладывающиеся в остаток дедлайна, - только в крайнем случае
+        fitting = [
+            model for model in available
+            if remaining is None or (self.latency.percentile(model, 50) or 0.0) < remaining
+        ]
+        # Модели своего уровня качества - раньше моделей другого уровня (деградация - крайний случай)
+        in_tier = [model for model in available if route.tier is None or self.tiers.get(model) == route.tier or model == preferred]
+        pool = [model for model in in_tier if model in fitting] or fitting or in_tier or available
+        # Модель без наблюдений считаем типичной для маршрута: она не вытесняет проверенные
+        # модели и не уступает им только из-за отсутствия статистики
+        observed = sorted(
+            expected for expected in (self.latency.percentile(model, self.percentile) for model in available)
+            if expected is not None
+        )
+        unknown = observed[len(observed) // 2] if observed else None
+        scores = {model: self.score(model, unknown) for model in available}
+        best = min(scores[model] for model in pool)
+        # Первая по предпочтению модель, не сильно уступающая лучшей: без «дребезга» между близкими моделями
+        primary = next(model for model in pool if scores[model] <= best * self.switch_ratio)
+        rest = sorted(
+            (model for model in available if model != primary),
+            key=lambda model: (model not in fitting, model not in in_tier, scores[model])
+        )
+        return [primary] + rest
+
+    def timeout(self, model: str, remaining: Optional[float] = None) -> float:
+        """Таймаут вызова: p99 задержки модели с запасом (без наблюдений - max_timeout), не больше остатка дедлайна"""
+        p99 = self.latency.percentile(model, 99)
+        if p99 is None:
+            timeout = self.max_timeout
+        else:
+            timeout = min(max(p99 * self.timeout_multiplier, self.min_timeout), self.max_timeout)
+        if remaining is not None:
+            timeout = max(0.1, min(timeout, remaining))
+        return timeout
+
+    def stats(self) -> dict:
+        models = sorted(set(self.tiers) | {model for route in self.routes.values() for model in route.models})
+        return {
+            "routes": {name: route.stats() for name, route in self.routes.items()},
+            "order": {name: self.candidates(name) for name in self.routes},
+            "models": {
+                model: {
+                    "tier": self.tiers.get(model),
+                    "score_seconds": round(self.score(model), 3),
+                    "timeout_seconds": round(self.timeout(model), 1),
+                    "available": self.health.available(model),
+                }
+                for model in models
+            },
+            "health": self.health.stats(),
+        }
@@ -0,0 +1,200 @@
+"""
+Телеметрия вызовов LLM для recommender service.
+
+Раньше call_openai_async только печатал usage.total_tokens. Теперь каждый
+вызов записывается с эндпоинтом (generate, generate-description,
+chat/message...), моделью, токенами запроса и ответа, задержкой, числом
+повторов и исходом (ok / error / timeout / cancelled). Для каждой пары
+(эндпоинт, модель) ведутся гистограммы задержки и накопительные счетчики,
+стоимость считается по прайсу моделей (USD за 1M токенов). Последние
+минуты дополнительно хранятся поштучно - для скользящей сводки в /health.
+
+Эндпоинт берется из контекстной переменной llm_endpoint: эндпоинт ставит ее
+в начале обработки, и она наследуется всеми задачами, которые он создает.
+"""
+import bisect
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+# Эндпоинт, от имени которого выполняется вызов LLM
+llm_endpoint: ContextVar[str] = ContextVar("llm_endpoint", default="other")
+
+# Границы корзин гистограммы задержки, секунды
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0, 90.0)
+
+# Цены OpenRouter, USD за 1M токенов (запрос, ответ); LLM_PRICES_JSON переопределяет
+DEFAULT_PRICES = {
+    "openai/gpt-4o-mini": (0.15, 0.60),
+    "openai/gpt-4-turbo": (10.0, 30.0),
+    "anthropic/claude-3.5-sonnet": (3.0, 15.0),
+    "google/gemini-pro-1.5": (1.25, 5.0),
+    "google/gemini-flash-1.5-8b": (0.0375, 0.15),
+    "meta-llama/llama-3-8b-instruct": (0.03, 0.06),
+}
+
+OUTCOMES = ("ok", "error", "timeout", "cancelled")
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами (перцентили - по верхней границе корзины)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - больше всех границ
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "avg_seconds": round(self.sum / self.count, 3) if self.count else None,
+            "max_seconds": round(self.max, 3),
+            "p50_seconds": self.percentile(50),
+            "p90_seconds": self.percentile(90),
+            "p99_seconds": self.percentile(99),
+            "buckets_le": buckets,
+        }
+
+
+class CallStats:
+    """Накопительная статистика вызовов одной модели из одного эндпоинта"""
+
+    def __init__(self):
+        self.outcomes = {outcome: 0 for outcome in OUTCOMES}
+        self.cache_hits = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.latency = LatencyHistogram()
+        self.first_token = LatencyHistogram()  # Только потоковые вызовы
+
+    def to_dict(self) -> dict:
+        data = {
+            "calls": sum(self.outcomes.values()),
+            **self.outcomes,
+            "cache_hits": self.cache_hits,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "latency": self.latency.to_dict(),
+        }
+        if self.first_token.count:
+            data["first_token"] = self.first_token.to_dict()
+        return data
+
+
+class LLMTelemetry:
+    """Телеметрия вызовов LLM: накопительная по (эндпоинт, модель) и скользящая за window_seconds"""
+
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None, window_seconds: float = 300.0):
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self.window_seconds = window_seconds
+        self.started_at = time.time()
+        self._stats: Dict[Tuple[str, str], CallStats] = {}
+        self._endpoint_events: Dict[str, Dict[str, int]] = {}  # fallbacks, deadline_exceeded
+        self._recent = deque()  # (время, эндпоинт, модель, исход, задержка, токены, стоимость)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def _call_stats(self, model: str) -> Tuple[str, CallStats]:
+        endpoint = llm_endpoint.get()
+        stats = self._stats.get((endpoint, model))
+        if stats is None:
+            stats = self._stats[(endpoint, model)] = CallStats()
+        return endpoint, stats
+
+    def record_call(self, model: str, latency: float, outcome: str = "ok", prompt_tokens: int = 0,
+                    completion_tokens: int = 0, retries: int = 0, first_token_latency: Optional[float] = None):
+        """Вызов модели, дошедший до провайдера (ответ из кэша - record_cache_hit)"""
+        endpoint, stats = self._call_stats(model)
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        stats.outcomes[outcome] += 1
+        stats.retries += retries
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        stats.cost_usd += cost
+        stats.latency.observe(latency)
+        if first_token_latency is not None:
+            stats.first_token.observe(first_token_latency)
+        now = time.time()
+        self._recent.append((now, endpoint, model, outcome, latency, prompt_tokens + completion_tokens, cost))
+        self._trim(now)
+
+    def record_cache_hit(self, model: str):
+        self._call_stats(model)[1].cache_hits += 1
+
+    def record_endpoint_event(self, event: str):
+        """
+        Событие эндпоинта: fallbacks (ответила не первая модель), deadline_exceeded,
+        coalesced (ответ взят из одинакового одновременного запроса другого вызова)
+        """
+        events = self._endpoint_events.setdefault(llm_endpoint.get(), {})
+        events[event] = events.get(event, 0) + 1
+
+    def _trim(self, now: float):
+        while self._recent and self._recent[0][0] < now - self.window_seconds:
+            self._recent.popleft()
+
+    def metrics(self) -> dict:
+        """Накопительные метрики с момента запуска"""
+        by_endpoint = {}
+        for (endpoint, model), stats in sorted(self._stats.items()):
+            by_endpoint.setdefault(endpoint, {"models": {}, **self._endpoint_events.get(endpoint, {})})
+            by_endpoint[endpoint]["models"][model] = stats.to_dict()
+        return {
+            "since": self.started_at,
+            "prices_usd_per_1m_tokens": {model: list(price) for model, price in self.prices.items()},
+            "endpoints": by_endpoint,
+        }
+
+    def summary(self) -> dict:
+        """Скользящая сводка за последние window_seconds: какой эндпоинт дает задержку и расход"""
+        self._trim(time.time())
+        by_endpoint = {}
+        for _, endpoint, model, outcome, latency, tokens, cost in self._recent:
+            entry = by_endpoint.setdefault(endpoint, {"calls": 0, "errors": 0, "tokens": 0, "cost_usd": 0.0, "latencies": []})
+            entry["calls"] += 1
+            entry["errors"] += outcome != "ok"
+            entry["tokens"] += tokens
+            entry["cost_usd"] += cost
+            entry["latencies"].append(latency)
+        for entry in by_endpoint.values():
+            latencies = sorted(entry.pop("latencies"))
+            entry["p50_seconds"] = round(latencies[len(latencies) // 2], 3)
+            entry["p95_seconds"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+        return {
+            "window_seconds": self.window_seconds,
+            "calls": len(self._recent),
+            "cost_usd": round(sum(event[6] for event in self._recent), 6),
+            "endpoints": by_endpoint,
+        }
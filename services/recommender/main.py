@@ -1,16 +1,21 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, field_validator
-from typing import List, Optional
+from typing import Callable, List, Optional
 import httpx
 import os
 import sys
-from openai import OpenAI
+import openai
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
 import json
 import re
 from dotenv import load_dotenv
 import asyncio
+import time
 from pathlib import Path
+from datetime import datetime
 
 # Настройка кодировки для Windows - ДОЛЖНО БЫТЬ ПЕРВЫМ!
 if sys.platform == "win32":
@@ -45,11 +50,42 @@ for config_path in config_paths:
 if not config_loaded:
     print("[Config] WARNING: config.env не найден, используем переменные окружения системы")
 
+# Соседние модули сервиса (llm_cache и др.) - доступны и при импорте из монолитного режима
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from llm_cache import LLMResponseCache
+from prompt_cache import PromptCache
+from catalog_snapshot import CatalogSnapshot
+from title_matcher import TitleMatcher
+from catalog_search import estimate_tokens, select_context_records
+from prompt_budget import TokenCounter, fit_history, summarize_history
+from chat_sessions import ChatSession, ChatSessionStore
+from markdown_stream import MarkdownStreamCleaner
+from llm_limiter import LLMConcurrencyLimiter, LLMOverloadedError
+from llm_hedging import HedgePolicy, ModelLatencyTracker, hedged_call
+from single_flight import SingleFlight
+from llm_telemetry import DEFAULT_PRICES, LLMTelemetry, llm_endpoint
+from llm_router import ModelHealth, ModelRouter, Route, llm_deadline, remaining_time
+from co_purchase import CoPurchaseIndex
+import description_jobs
+from description_jobs import DescriptionJob, DescriptionJobStore
+
+# Адрес OpenAI-совместимого API: OpenRouter или локальная заглушка services/llm-mock
+# (например, http://127.0.0.1:8013/api/v1) для офлайн-тестов и бенчмарков
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+LLM_REQUIRES_KEY = "openrouter.ai" in OPENROUTER_BASE_URL
+
+def get_llm_api_key() -> Optional[str]:
+    """Ключ OpenRouter; заглушке LLM (OPENROUTER_BASE_URL не на openrouter.ai) ключ не нужен"""
+    return os.getenv("OPENROUTER_API_KEY") or (None if LLM_REQUIRES_KEY else "offline")
+
 # Проверяем наличие API ключа при старте
-api_key = os.getenv("OPENROUTER_API_KEY")
+api_key = get_llm_api_key()
 if not api_key:
     raise ValueError('Необходимо установить переменную окружения OPENROUTER_API_KEY')
-print(f"[Config] OK: OPENROUTER_API_KEY найден: {api_key[:20]}...")
+if os.getenv("OPENROUTER_API_KEY"):
+    print(f"[Config] OK: OPENROUTER_API_KEY найден: {api_key[:20]}...")
+else:
+    print(f"[Config] OPENROUTER_API_KEY не задан, используется LLM без ключа: {OPENROUTER_BASE_URL}")
 
 # --- Приложение FastAPI ---
 app = FastAPI(
@@ -74,6 +110,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Адреса смежных сервисов
+CATALOG_SERVICE_URL = os.getenv("CATALOG_SERVICE_URL", "http://127.0.0.1:8000")
+PROMPTS_MANAGER_SERVICE_URL = os.getenv("PROMPTS_MANAGER_SERVICE_URL", "http://127.0.0.1:8007")
+
+# Транспорты для межсервисных вызовов по префиксу URL (httpx mounts).
+# Пусто в обычном режиме; монолитный режим (services/monolith) подставляет сюда
+# in-process ASGI-транспорты, чтобы вызовы catalog/prompts-manager шли без сокетов.
+service_transport_mounts = {}
+
+def service_client(timeout: float = 10.0) -> httpx.AsyncClient:
+    """HTTP-клиент для обращения к смежным микросервисам"""
+    return httpx.AsyncClient(timeout=timeout, mounts=service_transport_mounts)
+
 # Доступные модели LLM
 AVAILABLE_MODELS = {
     "gemini-pro": "google/gemini-pro-1.5",
@@ -83,57 +132,318 @@ AVAILABLE_MODELS = {
     "llama-3": "meta-llama/llama-3-8b-instruct"
 }
 
-# Вспомогательная функция для вызова синхронного OpenAI клиента в async контексте
-async def call_openai_async(messages, model="openai/gpt-4o-mini", temperature=0.8, max_tokens=300):
-    """Вызывает OpenAI API в отдельном потоке, чтобы не блокировать event loop"""
-    def _sync_call():
-        """Синхронная функция для выполнения в executor"""
-        client = None
-        http_client = None
+# Уровни качества моделей (порядок внутри уровня - порядок предпочтения по умолчанию)
+MODEL_TIERS = {
+    "openai/gpt-4-turbo": "quality",
+    "anthropic/claude-3.5-sonnet": "quality",
+    "google/gemini-pro-1.5": "quality",
+    "openai/gpt-4o-mini": "fast",
+    "google/gemini-flash-1.5-8b": "fast",
+    "meta-llama/llama-3-8b-instruct": "fast",
+}
+
+def requested_model(model_key: Optional[str]) -> Optional[str]:
+    """Модель, явно выбранная клиентом ("gpt-4", "claude-3"...); "auto" и неизвестные - выбор роутера"""
+    return AVAILABLE_MODELS.get(model_key) if model_key else None
+
+# Кэш ответов LLM: одинаковые (model, messages, temperature, max_tokens) не уходят в OpenRouter повторно
+# LLM_CACHE_MAX_ENTRIES=0 отключает кэш, LLM_CACHE_PATH включает сохранение на диск
+llm_cache = LLMResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+    persist_path=os.getenv("LLM_CACHE_PATH") or None
+)
+
+# Ограничение одновременных запросов к LLM: остальные ждут в очереди, при перегрузке - 429/503
+llm_limiter = LLMConcurrencyLimiter(
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", "8")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+)
+
+# Объединение одинаковых одновременных запросов: к LLM (ключ - model+messages+параметры)
+# и к смежным сервисам (ключ - URL); остальные вызовы ждут результат первого
+llm_flight = SingleFlight("llm")
+upstream_flight = SingleFlight("upstream")
+
+# Задержки ответов моделей (только реальные вызовы, без кэша) - основа для хеджирования
+model_latency = ModelLatencyTracker()
+
+# Телеметрия вызовов LLM по эндпоинтам и моделям: токены, задержки, стоимость, повторы.
+# LLM_PRICES_JSON - цены моделей, USD за 1M токенов: {"openai/gpt-4o-mini": [0.15, 0.6]}
+llm_telemetry = LLMTelemetry(
+    prices={**DEFAULT_PRICES, **json.loads(os.getenv("LLM_PRICES_JSON") or "{}")},
+    window_seconds=float(os.getenv("LLM_TELEMETRY_WINDOW_SECONDS", "300"))
+)
+
+# Повторы запроса к провайдеру при сетевых ошибках, 429 и 5xx (с экспоненциальной паузой)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_RETRY_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+# Хеджирование по эндпоинтам: если модель не ответила за свой перцентиль задержки,
+# параллельно запускается следующая; дедлайн ограничивает время всего запроса к LLM
+HEDGE_POLICIES = {
+    "description": HedgePolicy.from_env("DESCRIPTION", percentile=90.0, min_delay=3.0, default_delay=15.0, deadline=60.0),
+}
+
+# Выбор модели по типу запроса: маршрут (уровень качества, дедлайн) + задержки и ошибки моделей.
+# Маршрут переопределяется переменными LLM_ROUTE_{ТИП}_MODELS / _TIER / _DEADLINE_SECONDS
+llm_router = ModelRouter(
+    model_latency,
+    routes={
+        "chat": Route.from_env("chat", MODEL_TIERS, tier="quality", deadline=60.0),
+        "recommendations": Route.from_env("recommendations", MODEL_TIERS, tier="quality", deadline=60.0),
+        "simple": Route.from_env("simple", MODEL_TIERS, tier="fast", deadline=30.0),
+        "explain": Route.from_env("explain", MODEL_TIERS, tier="fast", deadline=15.0),
+        "description": Route.from_env(
+            "description", MODEL_TIERS,
+            models=["openai/gpt-4o-mini", "openai/gpt-4-turbo", "google/gemini-pro-1.5"],
+            deadline=HEDGE_POLICIES["description"].deadline
+        ),
+    },
+    tiers=MODEL_TIERS,
+    health=ModelHealth(
+        eject_after=int(os.getenv("LLM_ROUTER_EJECT_AFTER_FAILURES", "3")),
+        cooldown_seconds=float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30"))
+    ),
+    percentile=float(os.getenv("LLM_ROUTER_PERCENTILE", "90")),
+    timeout_multiplier=float(os.getenv("LLM_TIMEOUT_P99_MULTIPLIER", "2")),
+    min_timeout=float(os.getenv("LLM_MIN_TIMEOUT_SECONDS", "10")),
+    max_timeout=float(os.getenv("LLM_MAX_TIMEOUT_SECONDS", "90"))
+)
+# Сколько моделей маршрута пробовать по очереди, если предыдущая ответила ошибкой
+LLM_ROUTE_MAX_ATTEMPTS = int(os.getenv("LLM_ROUTE_MAX_ATTEMPTS", "2"))
+
+# Долгоживущий асинхронный клиент OpenRouter (пул соединений переиспользуется между запросами)
+llm_client: Optional[AsyncOpenAI] = None
+
+def get_llm_client() -> AsyncOpenAI:
+    """Возвращает общий асинхронный клиент OpenRouter (создается при первом обращении)"""
+    global llm_client
+    if llm_client is None:
+        api_key = get_llm_api_key()
+        if not api_key:
+            raise ValueError("OPENROUTER_API_KEY не установлен в переменных окружения")
+        llm_client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=OPENROUTER_BASE_URL,
+            timeout=llm_router.max_timeout,  # Для каждого вызова - адаптивный таймаут llm_router.timeout()
+            max_retries=0  # Повторы выполняет request_llm (LLM_MAX_RETRIES) - с учетом в телеметрии
+        )
+    return llm_client
+
+# Вызов LLM (нативный async-клиент, без потоков executor)
+async def call_openai_async(messages, model="openai/gpt-4o-mini", temperature=0.8, max_tokens=300, use_cache=True):
+    """
+    Вызывает OpenAI API через асинхронный клиент, не блокируя event loop.
+    Повторные запросы с теми же параметрами отдаются из llm_cache (use_cache=False - в обход кэша).
+    Одновременных запросов не больше llm_limiter.max_concurrent; при перегрузке - LLMOverloadedError (429/503).
+    Одинаковые одновременные вызовы объединяются (llm_flight): в OpenRouter уходит один запрос.
+    """
+    if not use_cache:
+        # В обход кэша - всегда отдельный запрос (например, перегенерация: нужен другой ответ)
+        if llm_cache.enabled:
+            llm_cache.record_bypass()
+        return await request_llm(messages, model, temperature, max_tokens)
+    
+    cache_key = LLMResponseCache.make_key(model, messages, temperature, max_tokens)
+    if llm_cache.enabled:
+        cached_response = llm_cache.get(cache_key)
+        if cached_response is not None:
+            print(f"[LLM] Ответ модели {model} взят из кэша")
+            llm_telemetry.record_cache_hit(model)
+            return ChatCompletion.model_validate(cached_response)
+    
+    # Общий запрос не наследует дедлайн и эндпоинт первого вызывающего: каждый ждет его
+    # до своего дедлайна, а объединенный вызов учитывается в телеметрии своего эндпоинта
+    if llm_flight.running(cache_key):
+        llm_telemetry.record_endpoint_event("coalesced")
+    endpoint = llm_endpoint.get()
+    
+    async def shared_request():
+        # Сам вызов LLM учитывается у эндпоинта, который его начал
+        llm_endpoint.set(endpoint)
+        return await request_llm(messages, model, temperature, max_tokens, cache_key if llm_cache.enabled else None)
+    
+    return await llm_flight.do(cache_key, shared_request, label=model, timeout=remaining_time())
+
+async def request_llm(messages, model, temperature, max_tokens, cache_key=None):
+    """Один запрос к OpenRouter; непустой ответ сохраняется в llm_cache под cache_key"""
+    client = get_llm_client()
+    async with llm_limiter.slot():
+        print(f"[LLM] Вызов модели {model} с {len(messages)} сообщениями...")
+        started = time.monotonic()
+        retries = 0
+        while True:
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=llm_router.timeout(model, remaining_time())
+                )
+                break
+            except LLM_RETRY_ERRORS as e:
+                remaining = remaining_time()
+                if retries < LLM_MAX_RETRIES and (remaining is None or remaining > 1):
+                    retries += 1
+                    print(f"[LLM] Повтор {retries} вызова модели {model} после ошибки {type(e).__name__}")
+                    await asyncio.sleep(0.5 * 2 ** (retries - 1))
+                    continue
+                print(f"[LLM] Ошибка вызова модели {model}: {type(e).__name__}: {str(e)}")
+                outcome = "timeout" if isinstance(e, openai.APITimeoutError) else "error"
+                llm_telemetry.record_call(model, time.monotonic() - started, outcome, retries=retries)
+                llm_router.health.record(model, ok=False)
+                raise
+            except asyncio.CancelledError:
+                # Проигравший хеджированный запрос или отключившийся клиент
+                llm_telemetry.record_call(model, time.monotonic() - started, "cancelled", retries=retries)
+                raise
+            except Exception as e:
+                print(f"[LLM] Ошибка вызова модели {model}: {type(e).__name__}: {str(e)}")
+                llm_telemetry.record_call(model, time.monotonic() - started, "error", retries=retries)
+                llm_router.health.record(model, ok=False)
+                raise
+        latency = time.monotonic() - started
+        model_latency.record(model, latency)
+        llm_router.health.record(model, ok=True)
+    usage = response.usage
+    llm_telemetry.record_call(
+        model, latency,
+        prompt_tokens=usage.prompt_tokens if usage else 0,
+        completion_tokens=usage.completion_tokens if usage else 0,
+        retries=retries
+    )
+    print(f"[LLM] Ответ получен за {latency:.2f} с, использовано токенов: {usage.total_tokens if usage else 'N/A'}")
+    
+    # Кэшируем только непустые ответы
+    if cache_key and response.choices and response.choices[0].message.content:
+        llm_cache.set(cache_key, response.model_dump(mode="json"))
+    return response
+
+async def stream_openai_async(messages, model="openai/gpt-4o-mini", temperature=0.8, max_tokens=300, use_cache=True):
+    """
+    Потоковый вызов LLM: асинхронный генератор фрагментов текста ответа.
+    Ответ из llm_cache отдается одним фрагментом; полный ответ после стрима сохраняется в кэш.
+    """
+    cache_key = None
+    if llm_cache.enabled:
+        if use_cache:
+            cache_key = LLMResponseCache.make_key(model, messages, temperature, max_tokens)
+            cached_response = llm_cache.get(cache_key)
+            if cached_response is not None:
+                print(f"[LLM] Ответ модели {model} взят из кэша")
+                llm_telemetry.record_cache_hit(model)
+                yield ChatCompletion.model_validate(cached_response).choices[0].message.content
+                return
+        else:
+            llm_cache.record_bypass()
+    
+    client = get_llm_client()
+    parts = []
+    # Провайдер не сообщает usage в стриме - токены оцениваются по тексту
+    token_counter = TokenCounter(model)
+    first_token_latency = None
+    outcome = "error"
+    # Место в llm_limiter занято на все время стрима
+    async with llm_limiter.slot():
+        print(f"[LLM] Потоковый вызов модели {model} с {len(messages)} сообщениями...")
+        started = time.monotonic()
         try:
-            # Получаем API ключ
-            api_key = os.getenv("OPENROUTER_API_KEY")
-            if not api_key:
-                raise ValueError("OPENROUTER_API_KEY не установлен в переменных окружения")
-            
-            print(f"[LLM] Вызов модели {model} с {len(messages)} сообщениями...")
-            
-            # Создаем новый HTTP клиент и OpenAI клиент для каждого запроса
-            http_client = httpx.Client(timeout=90.0)  # 90 секунд таймаут
-            client = OpenAI(
-                api_key=api_key,
-                base_url="https://openrouter.ai/api/v1",
-                http_client=http_client,
-                max_retries=1
-            )
-            response = client.chat.completions.create(
+            stream = await client.chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                stream=True,
+                timeout=llm_router.timeout(model, remaining_time())
             )
-            print(f"[LLM] Ответ получен, использовано токенов: {response.usage.total_tokens if hasattr(response, 'usage') else 'N/A'}")
-            return response
-        except Exception as e:
-            print(f"[LLM] Ошибка в _sync_call: {type(e).__name__}: {str(e)}")
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token_latency is None:
+                            first_token_latency = time.monotonic() - started
+                        parts.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Клиент отключился или ошибка - закрываем соединение с OpenRouter
+                await stream.close()
+            outcome = "ok"
+            llm_router.health.record(model, ok=True)
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        except openai.APITimeoutError:
+            outcome = "timeout"
+            llm_router.health.record(model, ok=False)
+            raise
+        except Exception:
+            llm_router.health.record(model, ok=False)
             raise
         finally:
-            # Закрываем HTTP клиент после использования
-            if http_client:
-                try:
-                    http_client.close()
-                except:
-                    pass
+            llm_telemetry.record_call(
+                model, time.monotonic() - started, outcome,
+                prompt_tokens=token_counter.count_messages(messages),
+                completion_tokens=token_counter.count("".join(parts)),
+                first_token_latency=first_token_latency
+            )
     
+    content = "".join(parts)
+    print(f"[LLM] Потоковый ответ получен, {len(content)} символов")
+    if cache_key and content:
+        llm_cache.set(cache_key, {
+            "id": f"stream-{cache_key[:16]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}
+            }]
+        })
+
+async def call_routed_llm(request_type: str, messages, preferred: Optional[str] = None,
+                          temperature=0.7, max_tokens=300, use_cache=True):
+    """
+    Вызов LLM с выбором модели роутером (llm_router) в пределах дедлайна маршрута.
+    Если модель ответила ошибкой, пробуется следующая (до LLM_ROUTE_MAX_ATTEMPTS моделей).
+    Возвращает (ответ, модель). Не уложились в дедлайн - HTTPException 504.
+    """
+    route = llm_router.routes[request_type]
+    deadline = time.monotonic() + route.deadline
+    deadline_token = llm_deadline.set(deadline)
     try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        # Если нет running loop, создаем новый (для тестов)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    # Используем ThreadPoolExecutor для неблокирующего выполнения
-    return await loop.run_in_executor(None, _sync_call)
+        candidates = llm_router.candidates(request_type, preferred, route.deadline)
+        last_error = None
+        for attempt, model in enumerate(candidates[:LLM_ROUTE_MAX_ATTEMPTS]):
+            if deadline - time.monotonic() <= 0:
+                break
+            try:
+                response = await call_openai_async(messages, model, temperature, max_tokens, use_cache)
+            except LLMOverloadedError:
+                # Перегружен сам сервис (llm_limiter), а не модель - другая модель не поможет
+                raise
+            except asyncio.TimeoutError:
+                # Дедлайн истек в ожидании общего запроса (llm_flight)
+                break
+            except openai.APIError as e:
+                print(f"[Router] Модель {model} не ответила ({type(e).__name__}), пробуем следующую")
+                last_error = e
+                continue
+            if attempt:
+                llm_telemetry.record_endpoint_event("fallbacks")
+            return response, model
+        if last_error is None or deadline - time.monotonic() <= 0:
+            llm_telemetry.record_endpoint_event("deadline_exceeded")
+            raise HTTPException(
+                status_code=504,
+                detail=f"AI-сервис не ответил за {route.deadline:.0f} секунд. Попробуйте позже."
+            )
+        raise last_error
+    finally:
+        llm_deadline.reset(deadline_token)
 
 # Модели данных
 class RecommendationRequest(BaseModel):
@@ -141,13 +451,28 @@ class RecommendationRequest(BaseModel):
     current_books: Optional[List[int]] = None
     genre_preferences: Optional[List[str]] = None
     max_recommendations: Optional[int] = 5
-    model: Optional[str] = "gpt-4"  # По умолчанию используем GPT-4
+    model: Optional[str] = "auto"  # Ключ AVAILABLE_MODELS; "auto" - модель выбирает llm_router
 
 class RecommendationResponse(BaseModel):
     recommendations: List[dict]
     reasoning: str
     confidence_score: float
 
+class SimilarRecommendationRequest(BaseModel):
+    current_books: List[int]  # ID пластинок, на которые должны быть похожи рекомендации
+    max_recommendations: Optional[int] = 5
+    explain: Optional[bool] = False  # True - сформулировать reasoning через LLM
+    model: Optional[str] = "auto"
+
+class AlsoBoughtRequest(BaseModel):
+    current_books: List[int]  # ID пластинок (например, из только что оформленного заказа)
+    max_recommendations: Optional[int] = 5
+
+class CoPurchaseOrder(BaseModel):
+    order_id: Optional[str] = None  # Повторная отправка заказа с тем же order_id не учитывается
+    product_ids: List[str]
+    created_at: Optional[str] = None  # ISO-время заказа (по умолчанию - момент получения)
+
 class Product(BaseModel):
     id: int
     name: str
@@ -162,6 +487,15 @@ class DescriptionGenerationResponse(BaseModel):
     success: bool
     message: str
 
+class DescriptionJobRequest(BaseModel):
+    """Задание массовой генерации: явный список ID или фильтр по каталогу"""
+    product_ids: Optional[List[int]] = None
+    artist: Optional[str] = None                    # Подстрока имени исполнителя
+    name_contains: Optional[str] = None             # Подстрока названия
+    max_description_length: Optional[int] = None    # Только пластинки с описанием короче N символов
+    limit: Optional[int] = None
+    no_cache: bool = False
+
 class SimplePromptRequest(BaseModel):
     prompt: str
 
@@ -172,9 +506,11 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str  # Текущее сообщение пользователя
-    history: Optional[List[ChatMessage]] = []  # История диалога
+    session_id: Optional[str] = None  # Серверная сессия чата: история хранится на сервере
+    history: Optional[List[ChatMessage]] = []  # История диалога (для клиентов без session_id)
     current_product_id: Optional[int] = None  # ID текущей пластинки (если на странице детализации)
-    model: Optional[str] = "gpt-4"  # Модель LLM
+    model: Optional[str] = "auto"  # Модель LLM; "auto" - выбирает llm_router
+    no_cache: Optional[bool] = False  # True - не использовать кэш ответов LLM
     
     @field_validator('message')
     @classmethod
@@ -211,13 +547,31 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str  # Ответ консультанта
     success: bool
+    session_id: Optional[str] = None  # Сессия, в которую записан диалог (передавать в следующем запросе)
+
+# Кэш промптов: инвалидируется лентой изменений prompts-manager, TTL - страховка
+prompt_cache = PromptCache(ttl_seconds=float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "300")))
+PROMPT_FEED_POLL_TIMEOUT = float(os.getenv("PROMPT_FEED_POLL_TIMEOUT", "25"))
 
 # Функция для получения промпта из prompts-manager (Headless AI - шаг 2)
 async def get_prompt_from_manager(prompt_id: str) -> str:
-    """Получает промпт из микросервиса prompts-manager по ID"""
+    """
+    Получает промпт из микросервиса prompts-manager по ID.
+    Промпт берется из prompt_cache; если prompts-manager недоступен,
+    используется последняя известная версия промпта.
+    """
+    cached_prompt = prompt_cache.get(prompt_id)
+    if cached_prompt is not None:
+        return cached_prompt
+    
+    url = f"{PROMPTS_MANAGER_SERVICE_URL}/api/v1/prompts/{prompt_id}"
+    return await upstream_flight.do(url, lambda: fetch_prompt_from_manager(prompt_id, url))
+
+async def fetch_prompt_from_manager(prompt_id: str, url: str) -> str:
+    """Запрос промпта у prompts-manager (ошибки - HTTPException, при недоступности - сохраненная версия)"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"http://127.0.0.1:8007/api/v1/prompts/{prompt_id}")
+        async with service_client(timeout=10.0) as client:
+            response = await client.get(url)
             response.raise_for_status()
             response_data = response.json()
             
@@ -226,6 +580,7 @@ async def get_prompt_from_manager(prompt_id: str) -> str:
             if not prompt_content:
                 raise ValueError(f"Промпт '{prompt_id}' пустой или не содержит поле 'template'")
             
+            prompt_cache.set(prompt_id, prompt_content, response_data.get("version"))
             return prompt_content
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -238,6 +593,10 @@ async def get_prompt_from_manager(prompt_id: str) -> str:
             detail=f"Ошибка при получении промпта '{prompt_id}' из prompts-manager: {str(e)}"
         )
     except httpx.RequestError as e:
+        stale_prompt = prompt_cache.get_stale(prompt_id)
+        if stale_prompt is not None:
+            print(f"[Prompts] WARNING: prompts-manager недоступен, используем сохраненную версию '{prompt_id}'")
+            return stale_prompt
         raise HTTPException(
             status_code=503,
             detail=f"Не удалось подключиться к prompts-manager на порту 8007: {str(e)}. Убедитесь, что сервис запущен."
@@ -248,33 +607,175 @@ async def get_prompt_from_manager(prompt_id: str) -> str:
             detail=f"Ошибка при получении промпта '{prompt_id}': {str(e)}"
         )
 
-# Функция для получения списка пластинок из каталога (шаг 3)
-async def get_books_from_catalog() -> List[Product]:
-    """Получает список всех виниловых пластинок из микросервиса каталога"""
+async def watch_prompt_changes():
+    """Фоновая задача: long-poll ленты изменений prompts-manager и инвалидация prompt_cache"""
+    retry_delay = 1.0
+    while True:
+        try:
+            async with service_client(timeout=PROMPT_FEED_POLL_TIMEOUT + 10) as client:
+                response = await client.get(
+                    f"{PROMPTS_MANAGER_SERVICE_URL}/api/v1/changes",
+                    params={
+                        "since": prompt_cache.feed_seq,
+                        "epoch": prompt_cache.feed_epoch or "",
+                        "timeout": PROMPT_FEED_POLL_TIMEOUT
+                    }
+                )
+                response.raise_for_status()
+                prompt_cache.apply_changes(response.json())
+            if not prompt_cache.feed_connected:
+                print("[Prompts] Подписка на изменения промптов активна")
+            prompt_cache.feed_connected = True
+            retry_delay = 1.0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Лента недоступна - кэш работает только по TTL
+            if prompt_cache.feed_connected:
+                print(f"[Prompts] WARNING: Лента изменений промптов недоступна: {e}")
+            prompt_cache.feed_connected = False
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 30.0)
+
+prompt_feed_task = None
+
+# Снимок каталога: обновляется фоновой задачей условными запросами (If-None-Match),
+# поэтому запросы рекомендаций и чата не ждут загрузки всего каталога
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "10"))
+catalog_snapshot: Optional[CatalogSnapshot] = None
+
+async def refresh_catalog_snapshot() -> CatalogSnapshot:
+    """Перепроверка каталога; одновременные перепроверки (запросы и watch_catalog) объединяются"""
+    url = f"{CATALOG_SERVICE_URL}/api/v1/products"
+    return await upstream_flight.do(url, lambda: load_catalog_snapshot(url))
+
+async def load_catalog_snapshot(url: str) -> CatalogSnapshot:
+    """Условный запрос каталога: при 304 текущий снимок остается, при 200 строится новый"""
+    global catalog_snapshot
+    headers = {}
+    if catalog_snapshot is not None and catalog_snapshot.etag:
+        headers["If-None-Match"] = catalog_snapshot.etag
+    
+    async with service_client(timeout=10.0) as client:
+        response = await client.get(url, headers=headers)
+    
+    if response.status_code == 304 and catalog_snapshot is not None:
+        catalog_snapshot.checked_at = time.monotonic()
+        return catalog_snapshot
+    
+    response.raise_for_status()
+    response_data = response.json()
+    
+    # Преобразуем данные в наши модели
+    records = []
+    for record in response_data.get("products", []):
+        records.append(Product(
+            id=record["id"],
+            name=record["name"],
+            artist=record.get("artist") or record.get("author", ""),
+            description=record["description"],
+            price=record["price"],
+            cover_url=record.get("cover_url")
+        ))
+    
+    catalog_snapshot = CatalogSnapshot(
+        records,
+        version=response_data.get("version"),
+        etag=response.headers.get("ETag")
+    )
+    print(f"[Catalog] Загружен снимок каталога: {len(records)} пластинок (версия {catalog_snapshot.version})")
+    return catalog_snapshot
+
+async def get_catalog_snapshot() -> CatalogSnapshot:
+    """
+    Возвращает текущий снимок каталога.
+    Если снимка нет или фоновое обновление давно не срабатывало - перепроверяет каталог;
+    при недоступности каталога используется последний загруженный снимок.
+    """
+    snapshot = catalog_snapshot
+    if snapshot is not None and snapshot.age() < CATALOG_REFRESH_SECONDS * 3:
+        return snapshot
+    
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get("http://127.0.0.1:8000/api/v1/products")
-            response.raise_for_status()
-            response_data = response.json()
-            
-            # Извлекаем массив продуктов из ответа
-            records_data = response_data.get("products", [])
-            
-            # Преобразуем данные в наши модели
-            records = []
-            for record in records_data:
-                records.append(Product(
-                    id=record["id"],
-                    name=record["name"],
-                    artist=record.get("artist") or record.get("author", ""),
-                    description=record["description"],
-                    price=record["price"],
-                    cover_url=record.get("cover_url")
-                ))
-            return records
+        return await refresh_catalog_snapshot()
     except Exception as e:
+        if catalog_snapshot is not None:
+            print(f"[Catalog] WARNING: Каталог недоступен, используем снимок версии {catalog_snapshot.version}: {e}")
+            return catalog_snapshot
         raise HTTPException(status_code=500, detail=f"Ошибка при получении каталога: {str(e)}")
 
+async def fetch_catalog_product(product_id: int, timeout: float = 10.0) -> Optional[dict]:
+    """Пластинка из catalog API (None, если не найдена); одновременные запросы одной пластинки объединяются"""
+    url = f"{CATALOG_SERVICE_URL}/api/v1/products/{product_id}"
+    
+    async def fetch() -> Optional[dict]:
+        async with service_client(timeout=timeout) as client:
+            response = await client.get(url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    
+    return await upstream_flight.do(url, fetch)
+
+async def watch_catalog():
+    """Фоновая задача: периодическая условная перепроверка каталога"""
+    catalog_available = True
+    while True:
+        try:
+            await refresh_catalog_snapshot()
+            catalog_available = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if catalog_available:
+                print(f"[Catalog] WARNING: Не удалось обновить снимок каталога: {e}")
+            catalog_available = False
+        await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+
+catalog_watch_task = None
+
+# Контекст каталога для LLM: только релевантные запросу пластинки в пределах бюджета токенов
+CATALOG_CONTEXT_TOKENS = int(os.getenv("CATALOG_CONTEXT_TOKENS", "2000"))
+CATALOG_CONTEXT_MAX_RECORDS = int(os.getenv("CATALOG_CONTEXT_MAX_RECORDS", "25"))
+
+def build_catalog_context(
+    catalog: CatalogSnapshot,
+    query: str,
+    description_chars: int = 200,
+    pinned: List[Product] = (),
+    token_budget: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens
+) -> str:
+    """Строки каталога для системного промпта: поиск BM25 по запросу + бюджет токенов"""
+    lines = select_context_records(
+        catalog.search_index,
+        query,
+        lambda book: f"ID: {book.id} | Название: {book.name} | Исполнитель: {book.artist} | Описание: {book.description[:description_chars]}... | Цена: {book.price}₽",
+        token_budget=CATALOG_CONTEXT_TOKENS if token_budget is None else token_budget,
+        max_records=CATALOG_CONTEXT_MAX_RECORDS,
+        pinned=pinned,
+        count_tokens=count_tokens
+    )
+    print(f"[Catalog] В контекст LLM отобрано {len(lines)} из {len(catalog.products)} пластинок")
+    return "\n".join(lines)
+
+# Функция для получения списка пластинок из каталога (шаг 3)
+async def get_books_from_catalog() -> List[Product]:
+    """Получает список всех виниловых пластинок из снимка каталога"""
+    return (await get_catalog_snapshot()).products
+
+# Регулярные выражения очистки Markdown (компилируются один раз)
+MD_BOLD = re.compile(r'\*\*([^*]+)\*\*')
+MD_ITALIC = re.compile(r'(?<!\*)\*([^*]+?)\*(?!\*)')
+MD_HEADING = re.compile(r'#{1,6}\s+')
+MD_BULLET = re.compile(r'^[\s]*[-*+]\s+', re.MULTILINE)
+MD_NUMBERED = re.compile(r'^\d+\.\s+', re.MULTILINE)
+MD_FANCY_QUOTES = re.compile(r'[""\u201C\u201D\u201E\u201F\u2033\u2036]')
+MD_ASTERISKS = re.compile(r'\*+')
+MD_MANY_NEWLINES = re.compile(r'\n{3,}')
+MD_MANY_SPACES = re.compile(r' +')
+
 # Сложный системный промпт - наша интеллектуальная собственность (шаг 4)
 def clean_markdown(text: str) -> str:
     """Очищает текст от Markdown символов для красивого отображения"""
@@ -282,217 +783,149 @@ def clean_markdown(text: str) -> str:
         return ""
     
     # Убираем все оставшиеся Markdown жирный текст **text** -> text (обрабатываем вложенные случаи)
-    while re.search(r'\*\*([^*]+)\*\*', text):
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    replaced = 1
+    while replaced:
+        text, replaced = MD_BOLD.subn(r'\1', text)
     
     # Убираем одиночные звездочки *text* -> text (но не внутри **text**)
-    text = re.sub(r'(?<!\*)\*([^*]+?)\*(?!\*)', r'\1', text)
+    text = MD_ITALIC.sub(r'\1', text)
     
     # Убираем заголовки ### (в начале строки и в середине текста)
-    text = re.sub(r'#{1,6}\s+', '', text)
+    text = MD_HEADING.sub('', text)
     
     # Убираем markdown списки - * + (в начале строки)
-    text = re.sub(r'^[\s]*[-*+]\s+', '', text, flags=re.MULTILINE)
+    text = MD_BULLET.sub('', text)
     
     # Убираем нумерованные списки типа "1. ", "2. " и т.д.
-    text = re.sub(r'^\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = MD_NUMBERED.sub('', text)
     
     # Убираем специальные кавычки, заменяем на обычные
-    text = re.sub(r'[""\u201C\u201D\u201E\u201F\u2033\u2036]', '"', text)
+    text = MD_FANCY_QUOTES.sub('"', text)
     
     # Убираем оставшиеся одиночные звездочки (которые не были частью **)
-    text = re.sub(r'\*+', '', text)
-    
-    # Убираем лишние пробелы в начале и конце строк
-    lines = []
-    for line in text.split('\n'):
-        cleaned_line = line.strip()
-        if cleaned_line:  # Пропускаем пустые строки для сжатия
-            lines.append(cleaned_line)
+    text = MD_ASTERISKS.sub('', text)
     
-    # Объединяем строки с правильными переносами
-    text = '\n'.join(lines)
+    # Убираем лишние пробелы в начале и конце строк, пропускаем пустые строки для сжатия
+    text = '\n'.join(line.strip() for line in text.split('\n') if line.strip())
     
     # Убираем множественные переносы строк (более 2 подряд заменяем на 2)
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = MD_MANY_NEWLINES.sub('\n\n', text)
     
     # Убираем множественные пробелы (более 1 подряд)
-    text = re.sub(r' +', ' ', text)
+    text = MD_MANY_SPACES.sub(' ', text)
     
     return text.strip()
 
-def extract_recommendations_from_text(text: str, records: List[Product]) -> List[dict]:
+# Причина рекомендации в строке после упоминания пластинки: "... - причина", "... Причина: ..."
+REASON_AFTER_DASH = re.compile(r'[^\n]*?[-–]\s*([^\n]+?)(?:\n|Оценка|совпадение|$)', re.IGNORECASE)
+REASON_LABELED = re.compile(r'[^\n]*?[Пп]ричина[:\s]+([^\n]+?)(?:\n|Оценка|совпадение|$)', re.IGNORECASE)
+REASON_EXPANSION = re.compile(r'[^\n]*?[Рр]асширение[^\n]*?([^\n]+?)(?:\n|Оценка|совпадение|$)', re.IGNORECASE)
+# Запасной вариант: текст после тире в ближайших 400 символах
+REASON_NEARBY = re.compile(r'[-–]\s*([^.\n]+(?:\n[^\d*\n][^.\n]*)?)(?:\n|Оценка|совпадение|$)', re.IGNORECASE)
+SCORE_PATTERNS = [
+    re.compile(r'(?:соответствие|совпадение|match|score|оценка)[:\s]+([0-9.]+)', re.IGNORECASE),
+    re.compile(r'([0-9.]+)\s*(?:из\s*1|%|балл)', re.IGNORECASE),
+]
+DEFAULT_REASON = "Подходит под ваши предпочтения"
+REASON_CONTEXT_CHARS = 400
+SCORE_CONTEXT_BEFORE = 100
+SCORE_CONTEXT_AFTER = 500
+
+def parse_match_score(context: str) -> Optional[float]:
+    """Оценка совпадения из текста рядом с упоминанием пластинки (нормализуется к 0..1)"""
+    for pattern in SCORE_PATTERNS:
+        for score_match in pattern.finditer(context):
+            try:
+                match_score = float(score_match.group(1))
+            except ValueError:
+                break  # Как и раньше, смотрим только первое совпадение каждого шаблона
+            if match_score > 10.0:
+                match_score = match_score / 100.0  # Указан в процентах
+            elif match_score > 1.0:
+                match_score = match_score / 10.0  # Указан по шкале до 10
+            return min(match_score, 1.0)
+    return None
+
+def parse_reason(segment: str) -> str:
+    """Причина рекомендации из текста после упоминания пластинки"""
+    for pattern in (REASON_AFTER_DASH, REASON_LABELED, REASON_EXPANSION):
+        reason_match = pattern.match(segment)
+        if reason_match:
+            reason = clean_markdown(reason_match.group(1).strip())
+            if reason and len(reason) > 10:  # Минимальная длина причины
+                return reason
+    
+    # Если не нашли специфическую причину, ищем текст после тире рядом с упоминанием
+    reason_match = REASON_NEARBY.search(segment[:REASON_CONTEXT_CHARS])
+    if reason_match:
+        reason = clean_markdown(reason_match.group(1).strip())
+        if reason:
+            return reason
+    return DEFAULT_REASON
+
+def extract_recommendations_from_text(text: str, records: List[Product], catalog: Optional[CatalogSnapshot] = None) -> List[dict]:
     """
     Извлекает рекомендации из текстового ответа LLM, ища упоминания ID или названий пластинок.
-    Возвращает список рекомендаций с информацией из каталога.
+    Возвращает список рекомендаций с информацией из каталога (в порядке упоминания).
+    
+    Все упоминания находятся за один проход автоматом названий (TitleMatcher); причина и оценка
+    ищутся в фрагменте текста от упоминания пластинки до упоминания следующей.
+    Если передан снимок каталога, используется его готовый автомат.
     """
-    recommendations = []
+    matcher = catalog.title_matcher if catalog is not None else TitleMatcher(records)
+    mentions = matcher.find_mentions(text)
     
-    # Создаем словарь пластинок по ID и по названию для быстрого поиска
-    records_dict = {record.id: record for record in records}
-    records_by_name = {}
-    for record in records:
-        # Нормализуем название для поиска (убираем кавычки, приводим к нижнему регистру)
-        normalized_name = re.sub(r'[""\u201C\u201D\u201E\u201F\u2033\u2036]', '', record.name).strip().lower()
-        records_by_name[normalized_name] = record
-        # Также добавляем варианты без некоторых слов
-        name_parts = [part for part in normalized_name.split() if len(part) > 2]
-        if len(name_parts) > 1:
-            records_by_name[' '.join(name_parts)] = record
-    
-    found_records = {}  # record_id -> record object
-    
-    # Для обратной совместимости используем старые имена переменных внутри функции
-    books = records
-    books_dict = records_dict
-    books_by_name = records_by_name
-    found_books = found_records
-    
-    # Метод 1: Поиск по ID в тексте
-    id_patterns = [
-        r'ID[:\s]+(\d+)',
-        r'\(ID[:\s]+(\d+)\)',
-        r'ID\s*=\s*(\d+)',
-        r'пластинка\s+(\d+)',
-        r'#(\d+)',
-    ]
+    # Упоминания по ID надежнее: если они есть, названия используются только для поиска причин
+    if any(mention.kind == "id" for mention in mentions):
+        selected_ids = {mention.record.id for mention in mentions if mention.kind == "id"}
+    else:
+        selected_ids = {mention.record.id for mention in mentions}
     
-    for pattern in id_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
-            try:
-                book_id = int(match)
-                if book_id in books_dict:
-                    found_books[book_id] = books_dict[book_id]
-            except ValueError:
-                continue
+    # Фрагмент каждого упоминания - до следующего упоминания (не длиннее SCORE_CONTEXT_AFTER).
+    # Каждый символ текста попадает не более чем в один фрагмент - разбор линейный
+    mentions_by_record = {}
+    for index, mention in enumerate(mentions):
+        if mention.record.id not in selected_ids:
+            continue
+        previous_end = mentions[index - 1].end if index > 0 else 0
+        next_start = mentions[index + 1].start if index + 1 < len(mentions) else len(text)
+        segment_end = min(next_start, mention.end + SCORE_CONTEXT_AFTER)
+        # Оценка ищется с начала строки упоминания (не захватываем оценку предыдущей пластинки)
+        line_start = text.rfind('\n', previous_end, mention.start) + 1
+        score_start = max(previous_end, line_start, mention.start - SCORE_CONTEXT_BEFORE)
+        mentions_by_record.setdefault(mention.record.id, []).append((mention, segment_end, score_start))
     
-    # Метод 2: Поиск по названиям пластинок (если не нашли по ID)
-    if not found_books:
-        # Ищем паттерны типа: "Название пластинки" - Исполнитель или **"Название"** - Исполнитель
-        title_patterns = [
-            r'[""\u201C\u201D\u201E\u201F\u2033\u2036]([^""\u201C\u201D\u201E\u201F\u2033\u2036]+)[""\u201C\u201D\u201E\u201F\u2033\u2036]',  # "Название"
-            r'\*\*[""\u201C\u201D\u201E\u201F\u2033\u2036]([^""\u201C\u201D\u201E\u201F\u2033\u2036]+)[""\u201C\u201D\u201E\u201F\u2033\u2036]\*\*',  # **"Название"**
-            r'\*\*([^*]+?)\*\*',  # **Название**
-        ]
-        
-        found_titles = []
-        for pattern in title_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
-                # Убираем кавычки и нормализуем
-                book_title = re.sub(r'[""\u201C\u201D\u201E\u201F\u2033\u2036]', '', match).strip()
-                if book_title and len(book_title) > 2:
-                    found_titles.append(book_title)
+    recommendations = []
+    for record_mentions in mentions_by_record.values():
+        book = record_mentions[0][0].record
+        # Причина и оценка - из первого упоминания, где они есть
+        reason = DEFAULT_REASON
+        match_score = None
+        for mention, segment_end, score_start in record_mentions:
+            if reason == DEFAULT_REASON:
+                reason = parse_reason(text[mention.end:segment_end])
+            if match_score is None:
+                match_score = parse_match_score(text[score_start:segment_end])
         
-        # Ищем пластинки по найденным названиям
-        for book_title in found_titles:
-            normalized_title = book_title.lower().strip()
-            
-            # Ищем точное совпадение
-            if normalized_title in books_by_name:
-                book = books_by_name[normalized_title]
-                found_books[book.id] = book
-                continue
-            
-            # Ищем частичное совпадение (содержит ключевые слова)
-            best_match = None
-            best_match_score = 0
-            
-            for norm_name, book in books_by_name.items():
-                # Проверяем, содержит ли название ключевые слова из найденного текста
-                title_words = [w for w in normalized_title.split() if len(w) > 2]
-                book_words = [w for w in norm_name.split() if len(w) > 2]
-                
-                if title_words and book_words:
-                    # Если более 50% слов совпадает
-                    common_words = set(title_words) & set(book_words)
-                    match_score = len(common_words) / max(len(title_words), len(book_words))
-                    if match_score > best_match_score and match_score >= 0.4:  # Минимум 40% совпадения
-                        best_match = book
-                        best_match_score = match_score
-            
-            if best_match:
-                found_books[best_match.id] = best_match
-    
-    # Если найдены пластинки, создаем рекомендации
-    if found_books:
-        for book_id, book in found_books.items():
-            # Ищем причину рекомендации в тексте
-            # Паттерны для поиска причины после упоминания пластинки
-            reason_patterns = [
-                rf'[""\u201C\u201D\u201E\u201F\u2033\u2036]?{re.escape(book.name)}[""\u201C\u201D\u201E\u201F\u2033\u2036]?[^\n]*?[-–]\s*([^\n]+?)(?:\n|Оценка|совпадение|$)',
-                rf'\*\*{re.escape(book.name)}\*\*[^\n]*?[-–]\s*([^\n]+?)(?:\n|Оценка|совпадение|$)',
-                rf'{re.escape(book.name)}[^\n]*?[Пп]ричина[:\s]+([^\n]+?)(?:\n|Оценка|совпадение|$)',
-                rf'{re.escape(book.name)}[^\n]*?[Рр]асширение[^\n]*?([^\n]+?)(?:\n|Оценка|совпадение|$)',
-            ]
-            
-            reason = "Подходит под ваши предпочтения"
-            for pattern in reason_patterns:
-                reason_match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-                if reason_match:
-                    reason = clean_markdown(reason_match.group(1).strip())
-                    if reason and len(reason) > 10:  # Минимальная длина причины
-                        break
-            
-            # Если не нашли специфическую причину, ищем общее описание рядом с названием
-            if reason == "Подходит под ваши предпочтения":
-                # Ищем блок текста после упоминания пластинки (до следующего упоминания пластинки или раздела)
-                book_pos = text.lower().find(book.name.lower())
-                if book_pos != -1:
-                    # Берем текст после упоминания пластинки (до 400 символов или до следующей пластинки)
-                    context_start = book_pos + len(book.name)
-                    context_end = min(context_start + 400, len(text))
-                    
-                    # Ищем причину в этом контексте
-                    context = text[context_start:context_end]
-                    # Ищем текст после дефиса или тире, до следующего упоминания оценки или совпадения
-                    reason_match = re.search(r'[-–]\s*([^.\n]+(?:\n[^\d*\n][^.\n]*)?)(?:\n|Оценка|совпадение|$)', context, re.IGNORECASE)
-                    if reason_match:
-                        reason = clean_markdown(reason_match.group(1).strip())
-            
-            # Ищем score совпадения
-            match_score = None
-            # Ищем оценку рядом с упоминанием пластинки
-            book_context = text[max(0, text.lower().find(book.name.lower()) - 100):text.lower().find(book.name.lower()) + 500]
-            score_patterns = [
-                r'(?:соответствие|совпадение|match|score|оценка)[:\s]+([0-9.]+)',
-                r'([0-9.]+)\s*(?:из\s*1|%|балл)',
-            ]
-            for pattern in score_patterns:
-                score_matches = re.findall(pattern, book_context, re.IGNORECASE)
-                if score_matches:
-                    try:
-                        match_score = float(score_matches[0])
-                        if match_score > 1.0:
-                            match_score = match_score / 10.0  # Нормализуем если указан как процент
-                        if match_score > 1.0:
-                            match_score = match_score / 100.0  # Если всё ещё > 1, значит это процент
-                        break
-                    except:
-                        pass
-            
-            recommendations.append({
-                "id": book.id,
-                "name": book.name,
-                "artist": book.artist,
-                "reason": reason[:300] if len(reason) > 300 else reason,  # Ограничиваем длину
-                "match_score": match_score if match_score else 0.7  # Дефолтный score
-            })
+        recommendations.append({
+            "id": book.id,
+            "name": book.name,
+            "artist": book.artist,
+            "reason": reason[:300] if len(reason) > 300 else reason,  # Ограничиваем длину
+            "match_score": match_score if match_score else 0.7  # Дефолтный score
+        })
     
     return recommendations
 
-async def create_system_prompt(books: List[Product], request: RecommendationRequest) -> str:
+async def create_system_prompt(catalog: CatalogSnapshot, request: RecommendationRequest) -> str:
     """Создает сложный системный промпт для LLM, получая базовый промпт из prompts-manager (Headless AI)"""
     
     # Шаг 1: Получаем базовый промпт из prompts-manager
     base_prompt = await get_prompt_from_manager("recommendation_prompt")
     
-    # Шаг 2: Дополняем промпт динамическими данными
-    books_list = "\n".join([
-        f"ID: {book.id} | Название: {book.name} | Исполнитель: {book.artist} | Описание: {book.description[:200]}... | Цена: {book.price}₽"
-        for book in books
-    ])
+    # Шаг 2: Дополняем промпт динамическими данными (пластинки, релевантные предпочтениям)
+    query = " ".join([request.user_preferences or ""] + list(request.genre_preferences or []))
+    books_list = build_catalog_context(catalog, query)
     
     # Формируем дополнение с каталогом и предпочтениями
     dynamic_content = f"""
@@ -520,13 +953,17 @@ async def generate_recommendations(request: dict):
     Поддерживает два формата запроса:
     1. Простой промпт: {"prompt": "текст запроса"}
     2. Полный запрос: {"user_preferences": "...", "model": "...", ...}
+    В обоих форматах можно передать "no_cache": true, чтобы не использовать кэш ответов LLM.
     """
+    llm_endpoint.set("generate")
     try:
         # Проверяем тип запроса: простой промпт или полный RecommendationRequest
-        is_simple_prompt = "prompt" in request and len(request) == 1
+        is_simple_prompt = "prompt" in request and not (set(request) - {"prompt", "no_cache"})
+        use_cache = not request.get("no_cache", False)
         
-        # Шаг 3: Получаем список пластинок из каталога
-        books = await get_books_from_catalog()
+        # Шаг 3: Получаем список пластинок из снимка каталога
+        catalog = await get_catalog_snapshot()
+        books = catalog.products
         print(f"Получено {len(books)} пластинок из каталога")
         
         if not books:
@@ -537,11 +974,8 @@ async def generate_recommendations(request: dict):
             prompt = request["prompt"]
             print(f"Обработка простого промпта: {prompt[:50]}...")
             
-            # Формируем системный промпт с каталогом пластинок
-            books_list = "\n".join([
-                f"ID: {book.id} | Название: {book.name} | Исполнитель: {book.artist} | Описание: {book.description[:200]}... | Цена: {book.price}₽"
-                for book in books
-            ])
+            # Формируем системный промпт с релевантной частью каталога
+            books_list = build_catalog_context(catalog, prompt)
             
             system_prompt = f"""Ты - эксперт по виниловым пластинкам. У тебя есть доступ к каталогу пластинок:
 
@@ -549,18 +983,17 @@ async def generate_recommendations(request: dict):
 
 Твоя задача - помочь пользователю на основе его запроса."""
             
-            # Вызываем LLM
-            model_name = "openai/gpt-4o-mini"  # Используем быструю модель по умолчанию
-            
+            # Вызываем LLM (быстрая модель: маршрут "simple")
             try:
-                response = await call_openai_async(
+                response, model_name = await call_routed_llm(
+                    "simple",
                     messages=[
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": prompt}
                     ],
-                    model=model_name,
                     temperature=0.7,
-                    max_tokens=2000
+                    max_tokens=2000,
+                    use_cache=use_cache
                 )
                 
                 # Проверяем, что ответ корректный
@@ -580,6 +1013,9 @@ async def generate_recommendations(request: dict):
                 
                 return {"response": llm_response}
                 
+            except HTTPException:
+                # В т.ч. 429/503 от llm_limiter
+                raise
             except httpx.HTTPStatusError as e:
                 print(f"[ОШИБКА] HTTPStatusError при обращении к OpenRouter: {str(e)}")
                 raise HTTPException(
@@ -608,27 +1044,26 @@ async def generate_recommendations(request: dict):
             current_books=request.get("current_books"),
             genre_preferences=request.get("genre_preferences"),
             max_recommendations=request.get("max_recommendations", 5),
-            model=request.get("model", "gpt-4")
+            model=request.get("model", "auto")
         )
         
         # Шаг 4: Создаем сложный системный промпт (Headless AI - получаем из prompts-manager)
-        system_prompt = await create_system_prompt(books, rec_request)
+        system_prompt = await create_system_prompt(catalog, rec_request)
         
         # Шаг 5: Вызываем LLM и получаем ответ
         try:
-            # Получаем полное имя модели
-            model_name = AVAILABLE_MODELS.get(rec_request.model, AVAILABLE_MODELS["gpt-4"])
-            
-            # Используем async обертку для неблокирующего вызова
+            # Модель выбирает llm_router; модель, указанная клиентом, - в приоритете
             try:
-                response = await call_openai_async(
+                response, model_name = await call_routed_llm(
+                    "recommendations",
+                    preferred=requested_model(rec_request.model),
                     messages=[
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": "Сгенерируй персонализированные рекомендации виниловых пластинок на основе предоставленной информации."}
                     ],
-                    model=model_name,
                     temperature=0.7,
-                    max_tokens=1500
+                    max_tokens=1500,
+                    use_cache=use_cache
                 )
                 
                 # Проверяем, что ответ корректный
@@ -671,7 +1106,7 @@ async def generate_recommendations(request: dict):
                 else:
                     print(f"[ПАРСИНГ] JSON блок не найден в ответе, пытаемся извлечь рекомендации из текста")
                     # Пытаемся извлечь рекомендации из текста
-                    extracted_recs = extract_recommendations_from_text(llm_response, books)
+                    extracted_recs = extract_recommendations_from_text(llm_response, books, catalog)
                     if extracted_recs:
                         recommendations = extracted_recs
                         print(f"[ПАРСИНГ] Извлечено {len(recommendations)} рекомендаций из текста")
@@ -688,7 +1123,7 @@ async def generate_recommendations(request: dict):
             except json.JSONDecodeError as e:
                 print(f"[ПАРСИНГ] Ошибка парсинга JSON: {str(e)}, пытаемся извлечь из текста")
                 # Пытаемся извлечь рекомендации из текста как fallback
-                extracted_recs = extract_recommendations_from_text(llm_response, books)
+                extracted_recs = extract_recommendations_from_text(llm_response, books, catalog)
                 if extracted_recs:
                     recommendations = extracted_recs
                     print(f"[ПАРСИНГ] Извлечено {len(recommendations)} рекомендаций из текста (fallback)")
@@ -702,7 +1137,7 @@ async def generate_recommendations(request: dict):
                 print(f"[ПАРСИНГ] Общая ошибка парсинга: {str(parse_error)}")
                 # Пытаемся извлечь рекомендации из текста как fallback
                 try:
-                    extracted_recs = extract_recommendations_from_text(llm_response, books)
+                    extracted_recs = extract_recommendations_from_text(llm_response, books, catalog)
                     if extracted_recs:
                         recommendations = extracted_recs
                         print(f"[ПАРСИНГ] Извлечено {len(recommendations)} рекомендаций из текста (fallback после ошибки)")
@@ -726,7 +1161,8 @@ async def generate_recommendations(request: dict):
                 if not recommendations:
                     extracted_recs = extract_recommendations_from_text(
                         parsed_response.get("reasoning", reasoning), 
-                        books
+                        books,
+                        catalog
                     )
                     if extracted_recs:
                         recommendations = extracted_recs
@@ -745,7 +1181,7 @@ async def generate_recommendations(request: dict):
                     # Если есть только id, дополняем данными из каталога
                     if "id" in rec:
                         book_id = rec.get("id")
-                        book = next((b for b in books if b.id == book_id), None)
+                        book = catalog.by_id.get(book_id) if isinstance(book_id, int) else None
                         if book:
                             validated_recommendations.append({
                                 "id": book.id,
@@ -795,45 +1231,152 @@ async def generate_recommendations(request: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервиса: {str(e)}")
 
-# Эндпоинт для AI-генерации описания пластинки (Оркестратор)
-@app.post("/api/v1/recommendations/generate-description/{product_id}", response_model=DescriptionGenerationResponse, tags=["AI Description"])
-async def generate_book_description(product_id: int):
+# Быстрые рекомендации без LLM (сходство пластинок)
+@app.post("/api/v1/recommendations/similar", response_model=RecommendationResponse, tags=["Recommendations"])
+async def similar_recommendations(request: SimilarRecommendationRequest):
     """
-    Оркестратор для AI-генерации описания пластинки
+    Рекомендации "похожие на эти пластинки" без обращения к LLM.
     
-    Шаги оркестрации:
-    1. GET-запрос к catalog API для получения данных о пластинке
-    2. Формирование промпта для LLM на основе данных пластинки
-    3. Вызов внешней системы (LLM) для генерации описания
-    4. PUT-запрос к catalog API для обновления description
-    5. Возврат сгенерированного описания клиенту
+    Сходство считается по исполнителю, описанию и ценовому диапазону
+    (TF-IDF векторы, одно умножение матрицы), ответ за миллисекунды.
+    explain=true - дополнительно попросить LLM сформулировать reasoning;
+    при ошибке LLM используется шаблонное объяснение.
     """
-    try:
-        # Шаг 1: GET-запрос к catalog API для получения данных о пластинке
-        print(f"[Шаг 1] Получаем данные о пластинке с ID={product_id} из catalog API...")
+    llm_endpoint.set("similar")
+    catalog = await get_catalog_snapshot()
+    source_ids = [book_id for book_id in request.current_books if book_id in catalog.by_id]
+    if not source_ids:
+        raise HTTPException(status_code=404, detail="Ни одна из пластинок current_books не найдена в каталоге")
+    
+    max_recommendations = max(1, min(request.max_recommendations or 5, 20))
+    similar = catalog.similarity_index.similar(source_ids, k=max_recommendations)
+    
+    source_books = [catalog.by_id[book_id] for book_id in source_ids]
+    source_artists = {book.artist for book in source_books}
+    source_names = ", ".join(f'"{book.name}"' for book in source_books[:3])
+    
+    recommendations = []
+    for book, score in similar:
+        if book.artist in source_artists:
+            reason = f"Еще одна пластинка {book.artist}"
+        else:
+            reason = f"Похожа по стилю и настроению на {source_names}"
+        recommendations.append({
+            "id": book.id,
+            "name": book.name,
+            "artist": book.artist,
+            "reason": reason,
+            "match_score": round(min(max(score, 0.0), 1.0), 3)
+        })
+    
+    reasoning = f"Подобраны пластинки, похожие на {source_names} по исполнителю, описанию и ценовому диапазону."
+    confidence_score = (
+        round(sum(rec["match_score"] for rec in recommendations) / len(recommendations), 3)
+        if recommendations else 0.0
+    )
+    
+    if request.explain and recommendations:
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                catalog_response = await client.get(f"http://127.0.0.1:8000/api/v1/products/{product_id}")
-                
-                if catalog_response.status_code == 404:
-                    raise HTTPException(
-                        status_code=404, 
-                        detail=f"Пластинка с ID {product_id} не найдена в каталоге. Убедитесь, что товар существует в catalog API (порт 8000), а не только в localStorage админ-панели."
-                    )
-                
-                catalog_response.raise_for_status()
-                book_data = catalog_response.json()
-        except httpx.TimeoutException:
-            raise HTTPException(
-                status_code=504,
-                detail="Таймаут при получении данных из catalog API. Убедитесь, что catalog service запущен на порту 8000."
+            recommendations_list = "\n".join(
+                f"- {rec['name']} ({rec['artist']})" for rec in recommendations
             )
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=503,
-                detail=f"Не удалось подключиться к catalog API на порту 8000: {str(e)}. Убедитесь, что сервис запущен."
+            response, _ = await call_routed_llm(
+                "explain",
+                messages=[
+                    {"role": "system", "content": "Ты - консультант магазина виниловых пластинок. Кратко (2-3 предложения) объясни покупателю, почему ему подойдут рекомендованные пластинки."},
+                    {"role": "user", "content": f"Покупателю нравятся: {source_names}.\nРекомендации:\n{recommendations_list}"}
+                ],
+                preferred=requested_model(request.model),
+                temperature=0.7,
+                max_tokens=300
             )
-        
+            if response.choices and response.choices[0].message.content:
+                reasoning = clean_markdown(response.choices[0].message.content)
+        except Exception as e:
+            print(f"[Similar] WARNING: LLM не сформулировал reasoning, используем шаблон: {e}")
+    
+    return RecommendationResponse(
+        recommendations=recommendations,
+        reasoning=reasoning,
+        confidence_score=confidence_score
+    )
+
+# Совместные покупки: заказы приходят из orders service сразу после создания,
+# top-N соседей каждой пластинки поддерживается инкрементально
+co_purchases = CoPurchaseIndex(
+    half_life_days=float(os.getenv("CO_PURCHASE_HALF_LIFE_DAYS", "30")),
+    top_n=int(os.getenv("CO_PURCHASE_TOP_N", "20")),
+    persist_path=os.getenv("CO_PURCHASE_PATH") or None
+)
+
+@app.post("/api/v1/co-purchases/orders", tags=["Recommendations"])
+async def record_co_purchase_order(order: CoPurchaseOrder):
+    """Учитывает созданный заказ в счетчиках совместных покупок"""
+    timestamp = None
+    if order.created_at:
+        try:
+            timestamp = datetime.fromisoformat(order.created_at).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=422, detail="created_at должен быть в формате ISO 8601")
+    recorded = co_purchases.record_order(order.product_ids, timestamp=timestamp, order_id=order.order_id)
+    return {"recorded": recorded, "co_purchases": co_purchases.stats()}
+
+@app.post("/api/v1/recommendations/also-bought", response_model=RecommendationResponse, tags=["Recommendations"])
+async def also_bought_recommendations(request: AlsoBoughtRequest):
+    """
+    "С этими пластинками также покупают" - готовые списки по истории заказов, без LLM.
+    
+    Пустой список, если по этим пластинкам еще нет совместных покупок
+    (вызывающая сторона может обратиться к /generate).
+    """
+    catalog = await get_catalog_snapshot()
+    max_recommendations = max(1, min(request.max_recommendations or 5, 20))
+    # Берем с запасом: снятые с продажи пластинки пропускаются
+    related = co_purchases.related_to_basket(request.current_books, limit=max_recommendations * 2)
+    
+    source_names = ", ".join(
+        f'"{catalog.by_id[book_id].name}"' for book_id in request.current_books[:3] if book_id in catalog.by_id
+    ) or "эти пластинки"
+    recommendations = []
+    for book_id, weight, share in related:
+        book = catalog.by_id.get(book_id)
+        if book is None:
+            continue
+        recommendations.append({
+            "id": book.id,
+            "name": book.name,
+            "artist": book.artist,
+            "reason": f"Покупатели, выбравшие {source_names}, часто берут и эту пластинку",
+            "match_score": round(min(share, 1.0), 3),
+            "co_purchases": round(weight, 2)
+        })
+        if len(recommendations) >= max_recommendations:
+            break
+    
+    confidence_score = (
+        round(sum(rec["match_score"] for rec in recommendations) / len(recommendations), 3)
+        if recommendations else 0.0
+    )
+    return RecommendationResponse(
+        recommendations=recommendations,
+        reasoning=f"Пластинки, которые чаще всего покупают вместе с {source_names}." if recommendations
+        else "По этим пластинкам еще нет совместных покупок.",
+        confidence_score=confidence_score
+    )
+
+# Эндпоинт для AI-генерации описания пластинки (Оркестратор)
+async def generate_description_text(
+    product_id: int,
+    book_data: dict,
+    base_description_prompt: Optional[str] = None,
+    no_cache: bool = False
+) -> str:
+    """
+    Шаги 2-3 оркестратора описаний: промпт по данным пластинки и генерация через LLM с проверками.
+    Используется эндпоинтом generate-description и заданиями массовой генерации (base_description_prompt
+    передается заранее загруженным, чтобы не запрашивать prompts-manager на каждую пластинку).
+    """
+    try:
         # Извлекаем данные о пластинке с проверкой различных возможных полей
         book_name = (
             book_data.get('name') or 
@@ -873,8 +1416,9 @@ async def generate_book_description(product_id: int):
         # Шаг 2: Формирование промпта для LLM на основе данных пластинки (Headless AI - получаем из prompts-manager)
         print(f"[Шаг 2] Получаем базовый промпт из prompts-manager и формируем промпт для LLM для пластинки '{book_name}'...")
         
-        # Получаем базовый промпт из prompts-manager
-        base_description_prompt = await get_prompt_from_manager("description_prompt")
+        # Получаем базовый промпт из prompts-manager (задания передают его заранее загруженным)
+        if base_description_prompt is None:
+            base_description_prompt = await get_prompt_from_manager("description_prompt")
         
         # Определяем специфичные категории пластинок (для дополнительной логики)
         # Проверка на конкретных исполнителей для специальной обработки
@@ -1045,7 +1589,7 @@ ID: {product_id}
         print(f"[Шаг 3] Отправляем запрос к LLM для генерации описания...")
         
         # Проверяем наличие API ключа перед вызовом
-        api_key = os.getenv("OPENROUTER_API_KEY")
+        api_key = get_llm_api_key()
         if not api_key:
             raise HTTPException(
                 status_code=500,
@@ -1066,43 +1610,45 @@ ID: {product_id}
                     {"role": "user", "content": user_prompt}
             ]
             
-            # Пробуем сначала более умную модель для точности, затем fallback
-            llm_response = None
-            models_to_try = [
-                ("openai/gpt-4o-mini", "gpt-4o-mini"),  # Начинаем с надежной модели
-                ("openai/gpt-4-turbo", "gpt-4-turbo"),  # Более умная модель для точности
-                ("google/gemini-pro-1.5", "gemini-pro"),  # Затем пробуем Gemini Pro
-            ]
+            # Модели в порядке, выбранном llm_router (маршрут "description"); следующая запускается
+            # параллельно, если текущая отвечает дольше обычного (HEDGE_POLICIES["description"]),
+            # берется первый валидный ответ
+            hedge_policy = HEDGE_POLICIES["description"]
+            models_to_try = llm_router.candidates("description", remaining=hedge_policy.deadline)
+            llm_started = time.monotonic()
+            # Таймауты отдельных вызовов не выходят за дедлайн эндпоинта
+            deadline_token = llm_deadline.set(llm_started + hedge_policy.deadline)
             
-            for model_id, model_name in models_to_try:
-                try:
-                    print(f"[Шаг 3] Пробуем модель {model_name} ({model_id})...")
-                    # Используем более низкую температуру для точности и следования инструкциям
-                    llm_response = await asyncio.wait_for(
-                        call_openai_async(
-                            messages=messages,
-                            model=model_id,
-                            temperature=0.7,  # Увеличиваем температуру для более творческих и впечатляющих описаний
-                            max_tokens=1000  # Значительно увеличиваем лимит для развернутых описаний (500-800 символов)
-                        ),
-                        timeout=90.0
-                    )
-                    print(f"[Шаг 3] Модель {model_name} успешно ответила!")
-                    break  # Успешно получили ответ, выходим из цикла
-                except asyncio.TimeoutError:
-                    print(f"[Шаг 3] Модель {model_name} таймаут, пробуем следующую...")
-                    continue
-                except Exception as e:
-                    error_msg = str(e)
-                    if "404" in error_msg or "not found" in error_msg.lower() or "no endpoints" in error_msg.lower():
-                        print(f"[Шаг 3] Модель {model_name} недоступна (404), пробуем следующую...")
-                        continue
-                    else:
-                        print(f"[Шаг 3] Ошибка модели {model_name}: {error_msg}, пробуем следующую...")
-                        continue
+            def has_content(response) -> bool:
+                return bool(response and response.choices and response.choices[0].message.content
+                            and response.choices[0].message.content.strip())
             
-            if llm_response is None:
-                raise Exception("Не удалось получить ответ ни от одной модели. Все модели недоступны или завершились ошибкой.")
+            try:
+                llm_response, model_used = await hedged_call(
+                    models_to_try,
+                    lambda model_id: call_openai_async(
+                        messages=messages,
+                        model=model_id,
+                        temperature=0.7,  # Увеличиваем температуру для более творческих и впечатляющих описаний
+                        max_tokens=1000,  # Значительно увеличиваем лимит для развернутых описаний (500-800 символов)
+                        use_cache=not no_cache
+                    ),
+                    policy=hedge_policy,
+                    tracker=model_latency,
+                    is_valid=has_content,
+                    label="Шаг 3"
+                )
+            except asyncio.TimeoutError:
+                llm_telemetry.record_endpoint_event("deadline_exceeded")
+                raise HTTPException(
+                    status_code=504,
+                    detail=f"AI-сервис не успел сгенерировать описание за {hedge_policy.deadline:.0f} секунд. Попробуйте позже."
+                )
+            finally:
+                llm_deadline.reset(deadline_token)
+            if model_used != models_to_try[0]:
+                llm_telemetry.record_endpoint_event("fallbacks")
+            print(f"[Шаг 3] Описание получено от модели {model_used} за {time.monotonic() - llm_started:.1f} с")
             
             # ОТЛАДКА: Логируем сырой ответ от LLM
             if hasattr(llm_response, 'choices') and llm_response.choices:
@@ -1204,11 +1750,19 @@ ID: {product_id}
                         ]
                         
                         try:
-                            retry_response = await call_openai_async(
-                                messages=retry_messages,
-                                model="openai/gpt-4o-mini",
-                                temperature=0.2,  # Еще более низкая температура для точности
-                                max_tokens=300
+                            # Регенерация укладывается в оставшийся бюджет эндпоинта
+                            retry_budget = hedge_policy.deadline - (time.monotonic() - llm_started)
+                            if retry_budget <= 1:
+                                raise asyncio.TimeoutError("бюджет времени исчерпан")
+                            retry_response = await asyncio.wait_for(
+                                call_openai_async(
+                                    messages=retry_messages,
+                                    model=model_used,
+                                    temperature=0.2,  # Еще более низкая температура для точности
+                                    max_tokens=300,
+                                    use_cache=not no_cache
+                                ),
+                                timeout=retry_budget
                             )
                             if retry_response and hasattr(retry_response, 'choices') and retry_response.choices:
                                 retry_description = retry_response.choices[0].message.content.strip()
@@ -1265,6 +1819,8 @@ ID: {product_id}
             
             print(f"[Шаг 3] Описание (первые 100 символов): {generated_description[:100]}...")
             
+        except HTTPException:
+            raise
         except asyncio.TimeoutError:
             raise HTTPException(
                 status_code=504,
@@ -1291,18 +1847,68 @@ ID: {product_id}
                     detail=f"Ошибка при генерации описания через AI: {error_msg}"
                 )
         
+        return generated_description
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[ОШИБКА] Ошибка генерации описания для пластинки ID={product_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Внутренняя ошибка при генерации описания: {str(e)}"
+        )
+
+@app.post("/api/v1/recommendations/generate-description/{product_id}", response_model=DescriptionGenerationResponse, tags=["AI Description"])
+async def generate_book_description(product_id: int, no_cache: bool = False):
+    """
+    Оркестратор для AI-генерации описания пластинки
+    
+    Шаги оркестрации:
+    1. GET-запрос к catalog API для получения данных о пластинке
+    2. Формирование промпта для LLM на основе данных пластинки
+    3. Вызов внешней системы (LLM) для генерации описания
+    4. PUT-запрос к catalog API для обновления description
+    5. Возврат сгенерированного описания клиенту
+    
+    ?no_cache=true - сгенерировать новое описание в обход кэша ответов LLM.
+    """
+    llm_endpoint.set("generate-description")
+    try:
+        # Шаг 1: GET-запрос к catalog API для получения данных о пластинке
+        print(f"[Шаг 1] Получаем данные о пластинке с ID={product_id} из catalog API...")
+        try:
+            book_data = await fetch_catalog_product(product_id, timeout=15.0)
+            if book_data is None:
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"Пластинка с ID {product_id} не найдена в каталоге. Убедитесь, что товар существует в catalog API (порт 8000), а не только в localStorage админ-панели."
+                )
+        except httpx.TimeoutException:
+            raise HTTPException(
+                status_code=504,
+                detail="Таймаут при получении данных из catalog API. Убедитесь, что catalog service запущен на порту 8000."
+            )
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Не удалось подключиться к catalog API на порту 8000: {str(e)}. Убедитесь, что сервис запущен."
+            )
+        
+        # Шаги 2-3: промпт и генерация описания через LLM
+        generated_description = await generate_description_text(product_id, book_data, no_cache=no_cache)
+        
         # Шаг 4: PUT-запрос к catalog API для обновления description
         print(f"[Шаг 4] Обновляем описание пластинки в catalog API...")
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with service_client(timeout=10.0) as client:
                 # Используем PUT с админ эндпоинтом, передаем только description для обновления
                 update_payload = {
                     "description": generated_description
                 }
                 
-                print(f"[Шаг 4] Отправка PUT запроса на http://127.0.0.1:8000/api/v1/admin/products/{product_id}")
+                print(f"[Шаг 4] Отправка PUT запроса на {CATALOG_SERVICE_URL}/api/v1/admin/products/{product_id}")
                 put_response = await client.put(
-                    f"http://127.0.0.1:8000/api/v1/admin/products/{product_id}",
+                    f"{CATALOG_SERVICE_URL}/api/v1/admin/products/{product_id}",
                     json=update_payload
                 )
                 
@@ -1341,44 +1947,231 @@ ID: {product_id}
             detail=f"Внутренняя ошибка при генерации описания: {str(e)}"
         )
 
-# Эндпоинт для чата с консультантом
-@app.post("/api/v1/chat/message", response_model=ChatResponse, tags=["Chat"])
-async def chat_message(request: ChatRequest):
+# Массовая генерация описаний: одно фоновое задание вместо запроса на каждую пластинку
+DESCRIPTION_JOB_CONCURRENCY = int(os.getenv("DESCRIPTION_JOB_CONCURRENCY", "4"))
+DESCRIPTION_JOB_BATCH_SIZE = int(os.getenv("DESCRIPTION_JOB_BATCH_SIZE", "50"))
+DESCRIPTION_JOB_MAX_RETRIES = 3  # Повторы пластинки при перегрузке llm_limiter (429/503)
+description_job_store = DescriptionJobStore(keep_finished=int(os.getenv("DESCRIPTION_JOBS_KEEP", "20")))
+
+def select_job_products(catalog: CatalogSnapshot, request: DescriptionJobRequest) -> List[int]:
+    """ID пластинок для задания: явный список или фильтр по снимку каталога"""
+    if request.product_ids:
+        product_ids = list(dict.fromkeys(request.product_ids))
+    else:
+        artist = (request.artist or "").strip().lower()
+        name_part = (request.name_contains or "").strip().lower()
+        product_ids = [
+            product.id for product in catalog.products
+            if (not artist or artist in product.artist.lower())
+            and (not name_part or name_part in product.name.lower())
+            and (request.max_description_length is None
+                 or len((product.description or "").strip()) < request.max_description_length)
+        ]
+    if request.limit is not None:
+        product_ids = product_ids[:max(0, request.limit)]
+    return product_ids
+
+async def save_description_batch(job: DescriptionJob, batch: dict):
+    """Записывает пачку описаний в каталог одним PATCH-запросом"""
+    updates = [{"id": product_id, "description": description} for product_id, description in batch.items()]
+    try:
+        async with service_client(timeout=30.0) as client:
+            response = await client.patch(f"{CATALOG_SERVICE_URL}/api/v1/admin/products", json={"updates": updates})
+            response.raise_for_status()
+            result = response.json()
+    except Exception as e:
+        print(f"[Описания {job.id}] Ошибка пакетной записи {len(batch)} описаний: {e}")
+        for product_id in batch:
+            job.mark(product_id, description_jobs.ITEM_FAILED, f"Не удалось сохранить в каталог: {e}")
+        return
+    for product_id in result.get("updated", []):
+        job.mark(product_id, description_jobs.ITEM_SAVED)
+    for product_id in result.get("not_found", []):
+        job.mark(product_id, description_jobs.ITEM_FAILED, "Пластинка удалена из каталога")
+    print(f"[Описания {job.id}] Сохранено {len(result.get('updated', []))} описаний, версия каталога {result.get('version')}")
+
+async def generate_job_item(job: DescriptionJob, product_id: int, book_data: dict, base_prompt: str) -> Optional[str]:
+    """Генерирует описание одной пластинки задания; при перегрузке LLM ждет Retry-After и повторяет"""
+    for attempt in range(DESCRIPTION_JOB_MAX_RETRIES + 1):
+        try:
+            return await generate_description_text(product_id, book_data, base_prompt, no_cache=job.no_cache)
+        except LLMOverloadedError as e:
+            if attempt == DESCRIPTION_JOB_MAX_RETRIES:
+                job.mark(product_id, description_jobs.ITEM_FAILED, e.detail)
+                return None
+            llm_telemetry.record_endpoint_event("overload_retries")
+            await asyncio.sleep(float(e.headers.get("Retry-After", "1")))
+        except HTTPException as e:
+            job.mark(product_id, description_jobs.ITEM_FAILED, e.detail)
+            return None
+
+async def run_description_job(job: DescriptionJob, catalog: CatalogSnapshot):
     """
-    Отправка сообщения AI-консультанту и получение ответа.
-    
-    Принимает сообщение пользователя и историю диалога, возвращает ответ консультанта.
+    Выполняет задание: промпт и каталог загружаются один раз на задание, описания генерируются
+    DESCRIPTION_JOB_CONCURRENCY воркерами и пишутся в каталог пачками по DESCRIPTION_JOB_BATCH_SIZE.
     """
+    job.start()
+    print(f"[Описания {job.id}] Старт задания: {len(job.items)} пластинок")
+    unsaved = {}  # product_id -> описание, ожидающее записи
+    write_lock = asyncio.Lock()
+
+    async def flush():
+        async with write_lock:
+            batch = dict(unsaved)
+            if batch:
+                await save_description_batch(job, batch)
+                # Убираем только после записи: прерванная отменой пачка допишется при завершении
+                for product_id in batch:
+                    unsaved.pop(product_id, None)
+
+    async def worker(product_ids):
+        for product_id in product_ids:
+            product = catalog.by_id.get(product_id)
+            if product is None:
+                job.mark(product_id, description_jobs.ITEM_FAILED, "Пластинка не найдена в каталоге")
+                continue
+            job.mark(product_id, description_jobs.ITEM_RUNNING)
+            description = await generate_job_item(job, product_id, product.model_dump(), base_prompt)
+            if description is None:
+                continue
+            job.mark(product_id, description_jobs.ITEM_GENERATED)
+            unsaved[product_id] = description
+            if len(unsaved) >= DESCRIPTION_JOB_BATCH_SIZE:
+                await flush()
+
     try:
-        # Проверка сообщения (дополнительная валидация на случай, если валидатор не сработал)
-        if not request.message or not request.message.strip():
-            raise HTTPException(
-                status_code=422,
-                detail="Сообщение не может быть пустым"
-            )
-        
-        # Шаг 1: Получаем промпт консультанта из prompts-manager
-        base_prompt = await get_prompt_from_manager("chat_consultant_prompt")
-        
-        # Шаг 2: Получаем каталог пластинок
-        books = await get_books_from_catalog()
-        print(f"Получено {len(books)} пластинок из каталога для чата")
-        
-        # Шаг 3: Формируем компактный список пластинок для контекста
-        books_list = "\n".join([
-            f"ID: {book.id} | Название: {book.name} | Исполнитель: {book.artist} | Описание: {book.description[:150]}... | Цена: {book.price}₽"
-            for book in books
-        ])
-        
-        # Шаг 4: Получаем информацию о текущей пластинке (если указана)
-        current_product_info = ""
-        if request.current_product_id:
-            try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    product_response = await client.get(f"http://127.0.0.1:8000/api/v1/products/{request.current_product_id}")
-                    if product_response.status_code == 200:
-                        product_data = product_response.json()
-                        current_product_info = f"""
+        base_prompt = await get_prompt_from_manager("description_prompt")
+        # Общий итератор: каждый воркер берет следующую необработанную пластинку
+        pending_ids = iter(job.product_ids)
+        workers = max(1, min(DESCRIPTION_JOB_CONCURRENCY, len(job.items)))
+        await asyncio.gather(*[worker(pending_ids) for _ in range(workers)])
+        await flush()
+        job.finish(description_jobs.JOB_COMPLETED)
+    except asyncio.CancelledError:
+        # Уже сгенерированные описания не теряем
+        await flush()
+        job.finish(description_jobs.JOB_CANCELLED)
+        raise
+    except Exception as e:
+        await flush()
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"[Описания {job.id}] Задание прервано: {error}")
+        job.finish(description_jobs.JOB_FAILED, error)
+    finally:
+        progress = job.progress()
+        print(f"[Описания {job.id}] Задание {job.status}: сохранено {progress['saved']}, ошибок {progress['failed']}")
+
+@app.post("/api/v1/recommendations/description-jobs", status_code=202, tags=["AI Description"])
+async def create_description_job(request: DescriptionJobRequest):
+    """
+    Создает фоновое задание генерации описаний для набора пластинок
+    (product_ids или фильтр artist / name_contains / max_description_length).
+    Прогресс - GET /api/v1/recommendations/description-jobs/{job_id}.
+    """
+    catalog = await get_catalog_snapshot()
+    product_ids = select_job_products(catalog, request)
+    if not product_ids:
+        raise HTTPException(status_code=400, detail="Нет пластинок, подходящих под условия задания")
+
+    job = description_job_store.add(DescriptionJob(product_ids, no_cache=request.no_cache))
+    llm_endpoint.set("description-jobs")  # Наследуется задачей задания
+    job.task = asyncio.create_task(run_description_job(job, catalog))
+    return job.to_dict()
+
+@app.get("/api/v1/recommendations/description-jobs", tags=["AI Description"])
+async def list_description_jobs():
+    """Список заданий генерации описаний (без статусов отдельных пластинок)"""
+    return {"jobs": [job.to_dict() for job in description_job_store.list()]}
+
+@app.get("/api/v1/recommendations/description-jobs/{job_id}", tags=["AI Description"])
+async def get_description_job(job_id: str, items: bool = True, item_status: Optional[str] = None,
+                              offset: int = 0, limit: int = 100):
+    """Прогресс задания и статусы пластинок (постранично, можно отфильтровать по item_status)"""
+    job = description_job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+    if item_status is not None and item_status not in description_jobs.ITEM_STATUSES:
+        raise HTTPException(status_code=422, detail=f"item_status должен быть одним из: {', '.join(description_jobs.ITEM_STATUSES)}")
+    return job.to_dict(include_items=items, item_status=item_status, offset=max(0, offset), limit=max(0, min(limit, 1000)))
+
+@app.delete("/api/v1/recommendations/description-jobs/{job_id}", tags=["AI Description"])
+async def cancel_description_job(job_id: str):
+    """Отменяет задание; уже сгенерированные описания сохраняются в каталог"""
+    job = description_job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+    if not job.finished and job.task is not None:
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
+    return job.to_dict()
+
+# Бюджет контекста чата (токены запроса без ответа): каталог не больше CATALOG_CONTEXT_TOKENS,
+# история - сколько поместится (не больше CHAT_MAX_HISTORY_MESSAGES), старые реплики - в сводку
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "6000"))
+CHAT_HISTORY_SUMMARY_TOKENS = int(os.getenv("CHAT_HISTORY_SUMMARY_TOKENS", "300"))
+CHAT_MAX_HISTORY_MESSAGES = int(os.getenv("CHAT_MAX_HISTORY_MESSAGES", "50"))
+
+# Серверные сессии чата: клиент присылает session_id и новое сообщение, а не всю историю
+chat_sessions = ChatSessionStore(
+    max_sessions=int(os.getenv("CHAT_SESSIONS_MAX", "10000")),
+    ttl_seconds=float(os.getenv("CHAT_SESSION_TTL_SECONDS", "86400")),
+    max_messages=CHAT_MAX_HISTORY_MESSAGES,
+    persist_path=os.getenv("CHAT_SESSIONS_PATH") or None
+)
+
+def resolve_chat_session(request: ChatRequest) -> ChatSession:
+    """
+    Сессия для запроса чата. Запрос без session_id (или с неизвестным session_id и историей)
+    начинает новую сессию с историей из запроса - клиент получит новый session_id в ответе.
+    Неизвестный или истекший session_id без истории - 409: клиент повторяет запрос с локальной историей.
+    """
+    session = chat_sessions.resume(request.session_id, [
+        {"role": msg.role, "content": msg.content} for msg in (request.history or [])
+    ])
+    if session is None:
+        print(f"[Chat] Сессия {request.session_id} не найдена, запрашиваем историю у клиента")
+        raise HTTPException(
+            status_code=409,
+            detail="Сессия чата не найдена или истекла: повторите запрос с историей диалога"
+        )
+    if request.session_id and session.id != request.session_id:
+        print(f"[Chat] Сессия {request.session_id} не найдена, начинаем новую с историей клиента")
+    return session
+
+# Сборка сообщений для LLM: промпт консультанта, релевантная часть каталога, история диалога
+async def build_chat_messages(request: ChatRequest, session_history: List[dict]) -> List[dict]:
+    """Формирует список сообщений для LLM по запросу чата (общий для обычного и потокового чата)"""
+    # Шаг 1: Получаем промпт консультанта из prompts-manager
+    base_prompt = await get_prompt_from_manager("chat_consultant_prompt")
+    
+    # Шаг 2: Получаем каталог пластинок (из снимка каталога)
+    catalog = await get_catalog_snapshot()
+    books = catalog.products
+    print(f"Получено {len(books)} пластинок из каталога для чата")
+    
+    # Токены считаем для модели, которой вероятнее всего уйдет запрос
+    model_name = llm_router.candidates("chat", requested_model(request.model))[0]
+    counter = TokenCounter(model_name)
+    history = [
+        {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+        for msg in session_history[-CHAT_MAX_HISTORY_MESSAGES:]
+    ]
+    
+    # Шаг 3: Получаем информацию о текущей пластинке (если указана)
+    current_product_info = ""
+    if request.current_product_id:
+        try:
+            current_product = catalog.by_id.get(request.current_product_id)
+            if current_product is not None:
+                product_data = current_product.model_dump()
+            else:
+                # Пластинки еще нет в снимке (только что добавлена) - запрашиваем у каталога
+                product_data = await fetch_catalog_product(request.current_product_id)
+            if product_data:
+                current_product_info = f"""
 ## ТЕКУЩАЯ ПЛАСТИНКА НА СТРАНИЦЕ ПОЛЬЗОВАТЕЛЯ
 ID: {product_data.get('id')}
 Название: {product_data.get('name')}
@@ -1388,43 +2181,92 @@ ID: {product_data.get('id')}
 
 Пользователь сейчас просматривает эту пластинку. Учитывай это в контексте диалога.
 """
-            except Exception as e:
-                print(f"Не удалось получить информацию о текущей пластинке: {e}")
-        
-        # Шаг 5: Формируем системный промпт с контекстом
-        system_prompt = f"""{base_prompt}
+        except Exception as e:
+            print(f"Не удалось получить информацию о текущей пластинке: {e}")
+    
+    # Шаг 4: Бюджет контекста заполняется по приоритету: системный промпт, текущее сообщение
+    # и текущая пластинка - всегда; затем каталог; затем свежая история; старое - в сводку
+    def compose_system_prompt(books_list: str, history_summary: str = "") -> str:
+        summary_section = f"""
+
+## РАНЕЕ В ДИАЛОГЕ (кратко)
+{history_summary}""" if history_summary else ""
+        return f"""{base_prompt}
 
 ## КАТАЛОГ ДОСТУПНЫХ ВИНИЛОВЫХ ПЛАСТИНОК
 {books_list}
-{current_product_info}
+{current_product_info}{summary_section}
 
 ВАЖНО: Используй только информацию из каталога выше. Не выдумывай пластинки, которых нет в списке.
 Когда упоминаешь пластинку, всегда указывай её ID (например: "Пластинка #5" или "ID 5")."""
+    
+    user_message = {"role": "user", "content": request.message}
+    remaining = CHAT_CONTEXT_TOKENS - counter.count_messages([
+        {"role": "system", "content": compose_system_prompt("")},
+        user_message
+    ])
+    
+    # Пластинки, релевантные сообщению и последним репликам пользователя
+    recent_user_messages = [msg["content"] for msg in history[-4:] if msg["role"] == "user"]
+    books_list = build_catalog_context(
+        catalog,
+        " ".join(recent_user_messages + [request.message]),
+        description_chars=150,
+        token_budget=max(0, min(CATALOG_CONTEXT_TOKENS, remaining)),
+        count_tokens=counter.count
+    )
+    remaining -= counter.count(books_list)
+    
+    # Свежая история целиком, пока помещается; не поместившееся - в сводку
+    kept_history, older_history = fit_history(history, max(0, remaining), counter.count_message)
+    history_summary = ""
+    if older_history:
+        kept_history, older_history = fit_history(history, max(0, remaining - CHAT_HISTORY_SUMMARY_TOKENS), counter.count_message)
+        history_summary = summarize_history(older_history, CHAT_HISTORY_SUMMARY_TOKENS, counter.count)
+    
+    # Шаг 5: Формируем список сообщений для LLM
+    messages = [{"role": "system", "content": compose_system_prompt(books_list, history_summary)}]
+    messages.extend(kept_history)
+    messages.append(user_message)
+    
+    print(
+        f"[Prompt] {model_name}: {counter.count_messages(messages)} из {CHAT_CONTEXT_TOKENS} токенов, "
+        f"история {len(kept_history)} из {len(history)} сообщений"
+        + (f", сводка {len(older_history)} старых" if older_history else "")
+    )
+    return messages
+
+# Эндпоинт для чата с консультантом
+@app.post("/api/v1/chat/message", response_model=ChatResponse, tags=["Chat"])
+async def chat_message(request: ChatRequest):
+    """
+    Отправка сообщения AI-консультанту и получение ответа.
+    
+    Принимает сообщение пользователя и session_id (или историю диалога), возвращает ответ
+    консультанта и session_id, в которую записан диалог.
+    """
+    llm_endpoint.set("chat/message")
+    try:
+        # Проверка сообщения (дополнительная валидация на случай, если валидатор не сработал)
+        if not request.message or not request.message.strip():
+            raise HTTPException(
+                status_code=422,
+                detail="Сообщение не может быть пустым"
+            )
         
-        # Шаг 6: Формируем историю диалога для LLM
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Добавляем историю диалога (последние 10 сообщений для контекста)
-        history_to_use = request.history[-10:] if request.history else []
-        for msg in history_to_use:
-            # Поддерживаем как dict, так и ChatMessage объекты
-            if isinstance(msg, dict):
-                messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
-            else:
-                messages.append({"role": msg.role, "content": msg.content})
-        
-        # Добавляем текущее сообщение пользователя
-        messages.append({"role": "user", "content": request.message})
-        
-        # Шаг 7: Вызываем LLM
-        model_name = AVAILABLE_MODELS.get(request.model, AVAILABLE_MODELS["gpt-4"])
+        # Шаги 1-6: промпт консультанта, каталог, история диалога (из серверной сессии)
+        session = resolve_chat_session(request)
+        messages = await build_chat_messages(request, session.messages)
         
+        # Шаг 7: Вызываем LLM (модель выбирает llm_router, выбранная клиентом - в приоритете)
         try:
-            response = await call_openai_async(
+            response, model_name = await call_routed_llm(
+                "chat",
                 messages=messages,
-                model=model_name,
+                preferred=requested_model(request.model),
                 temperature=0.7,
-                max_tokens=1500  # Достаточно для развернутого ответа
+                max_tokens=1500,  # Достаточно для развернутого ответа
+                use_cache=not request.no_cache
             )
             
             if not response or not hasattr(response, 'choices') or not response.choices:
@@ -1444,11 +2286,20 @@ ID: {product_data.get('id')}
             # Очищаем markdown из ответа для красивого отображения
             consultant_response = clean_markdown(consultant_response)
             
+            chat_sessions.append(
+                session,
+                {"role": "user", "content": request.message},
+                {"role": "assistant", "content": consultant_response}
+            )
             return ChatResponse(
                 response=consultant_response,
-                success=True
+                success=True,
+                session_id=session.id
             )
             
+        except HTTPException:
+            # В т.ч. 429/503 от llm_limiter
+            raise
         except httpx.HTTPStatusError as e:
             print(f"[ОШИБКА] HTTPStatusError при обращении к OpenRouter: {str(e)}")
             raise HTTPException(
@@ -1476,6 +2327,104 @@ ID: {product_data.get('id')}
             detail=f"Внутренняя ошибка при обработке сообщения: {str(e)}"
         )
 
+def sse_event(event: str, data: dict) -> str:
+    """Форматирует событие Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Потоковый чат с консультантом (SSE)
+@app.post("/api/v1/chat/message/stream", tags=["Chat"])
+async def chat_message_stream(request: ChatRequest):
+    """
+    Потоковый вариант /api/v1/chat/message (Server-Sent Events).
+    
+    События:
+    - delta: {"text": "..."} - очередной очищенный от Markdown фрагмент ответа
+    - message: {"response": "...", "success": true, "session_id": "..."} - итоговый ответ целиком
+    - error: {"detail": "..."} - ошибка при генерации ответа
+    """
+    llm_endpoint.set("chat/message/stream")
+    if not request.message or not request.message.strip():
+        raise HTTPException(
+            status_code=422,
+            detail="Сообщение не может быть пустым"
+        )
+    
+    # Ошибки подготовки (промпт, каталог) возвращаются обычным HTTP-ответом до начала стрима
+    session = resolve_chat_session(request)
+    messages = await build_chat_messages(request, session.messages)
+    # Стрим нельзя переключить на другую модель на середине - модель выбирается заранее
+    route = llm_router.routes["chat"]
+    model_name = llm_router.candidates("chat", requested_model(request.model), route.deadline)[0]
+    
+    async def event_stream():
+        cleaner = MarkdownStreamCleaner()
+        parts = []
+        llm_deadline.set(time.monotonic() + route.deadline)
+        try:
+            async for delta in stream_openai_async(
+                messages=messages,
+                model=model_name,
+                temperature=0.7,
+                max_tokens=1500,
+                use_cache=not request.no_cache
+            ):
+                parts.append(delta)
+                text = cleaner.feed(delta)
+                if text:
+                    yield sse_event("delta", {"text": text})
+            
+            tail = cleaner.flush()
+            if tail:
+                yield sse_event("delta", {"text": tail})
+            
+            consultant_response = clean_markdown("".join(parts).strip())
+            if not consultant_response:
+                yield sse_event("error", {"detail": "AI-консультант вернул пустой ответ"})
+                return
+            chat_sessions.append(
+                session,
+                {"role": "user", "content": request.message},
+                {"role": "assistant", "content": consultant_response}
+            )
+            yield sse_event("message", {"response": consultant_response, "success": True, "session_id": session.id})
+        except HTTPException as e:
+            # Перегрузка (llm_limiter): клиент может повторить запрос позже
+            yield sse_event("error", {"detail": e.detail, "status_code": e.status_code})
+        except Exception as llm_error:
+            print(f"[ОШИБКА] Ошибка потокового ответа LLM: {str(llm_error)}")
+            yield sse_event("error", {"detail": f"Ошибка при генерации ответа: {str(llm_error)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Отключаем буферизацию в nginx
+        }
+    )
+
+# Эндпоинты сессий чата
+@app.get("/api/v1/chat/sessions/{session_id}", tags=["Chat"])
+async def get_chat_session(session_id: str):
+    """История диалога серверной сессии"""
+    session = chat_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Сессия чата не найдена или истекла")
+    return session.to_dict()
+
+@app.delete("/api/v1/chat/sessions/{session_id}", tags=["Chat"])
+async def delete_chat_session(session_id: str):
+    """Удаляет сессию (кнопка «Очистить чат»)"""
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Сессия чата не найдена или истекла")
+    return {"message": "Сессия чата удалена"}
+
+# Телеметрия LLM: накопительные метрики по эндпоинтам и моделям
+@app.get("/api/v1/llm/metrics", tags=["LLM Telemetry"])
+async def get_llm_metrics():
+    """Вызовы, исходы, повторы, токены, стоимость и гистограммы задержки по (эндпоинт, модель)"""
+    return llm_telemetry.metrics()
+
 # Эндпоинт для получения доступных моделей
 @app.get("/api/v1/models", tags=["Models"])
 async def get_available_models():
@@ -1485,6 +2434,123 @@ async def get_available_models():
         "default_model": "gpt-4"
     }
 
+# Эндпоинты кэша ответов LLM
+@app.get("/api/v1/llm-cache/stats", tags=["LLM Cache"])
+async def get_llm_cache_stats():
+    """Статистика кэша ответов LLM (размер, попадания, hit rate)"""
+    return llm_cache.stats()
+
+@app.delete("/api/v1/llm-cache", tags=["LLM Cache"])
+async def clear_llm_cache():
+    """Очищает кэш ответов LLM"""
+    llm_cache.clear()
+    return {"message": "Кэш ответов LLM очищен"}
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    """Закрывает пул соединений клиента OpenRouter"""
+    if llm_client is not None:
+        await llm_client.close()
+
+@app.on_event("shutdown")
+async def cancel_description_jobs():
+    """Останавливает незавершенные задания генерации описаний (сгенерированное успевает сохраниться)"""
+    tasks = [job.task for job in description_job_store.running() if job.task is not None]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.on_event("startup")
+async def start_catalog_watch():
+    """Запускает фоновое обновление снимка каталога"""
+    global catalog_watch_task
+    catalog_watch_task = asyncio.create_task(watch_catalog())
+
+@app.on_event("shutdown")
+async def stop_catalog_watch():
+    if catalog_watch_task is not None:
+        catalog_watch_task.cancel()
+        try:
+            await catalog_watch_task
+        except asyncio.CancelledError:
+            pass
+
+@app.on_event("startup")
+async def start_prompt_feed():
+    """Запускает подписку на изменения промптов"""
+    global prompt_feed_task
+    prompt_feed_task = asyncio.create_task(watch_prompt_changes())
+
+@app.on_event("shutdown")
+async def stop_prompt_feed():
+    if prompt_feed_task is not None:
+        prompt_feed_task.cancel()
+        try:
+            await prompt_feed_task
+        except asyncio.CancelledError:
+            pass
+
+@app.on_event("startup")
+async def load_chat_sessions():
+    """Подгружает сохраненные сессии чата (если задан CHAT_SESSIONS_PATH)"""
+    try:
+        loaded = chat_sessions.load()
+        if loaded:
+            print(f"[Chat] Загружено {loaded} сессий из {chat_sessions.persist_path}")
+    except Exception as e:
+        print(f"[Chat] WARNING: Не удалось загрузить сессии: {e}")
+
+@app.on_event("shutdown")
+async def save_chat_sessions():
+    """Сохраняет сессии чата на диск (если задан CHAT_SESSIONS_PATH)"""
+    try:
+        saved = chat_sessions.save()
+        if saved:
+            print(f"[Chat] Сохранено {saved} сессий в {chat_sessions.persist_path}")
+    except Exception as e:
+        print(f"[Chat] WARNING: Не удалось сохранить сессии: {e}")
+
+@app.on_event("startup")
+async def load_co_purchases():
+    """Подгружает счетчики совместных покупок (если задан CO_PURCHASE_PATH)"""
+    try:
+        loaded = co_purchases.load()
+        if loaded:
+            print(f"[CoPurchase] Загружены счетчики {loaded} пластинок из {co_purchases.persist_path}")
+    except Exception as e:
+        print(f"[CoPurchase] WARNING: Не удалось загрузить счетчики: {e}")
+
+@app.on_event("shutdown")
+async def save_co_purchases():
+    """Сохраняет счетчики совместных покупок на диск (если задан CO_PURCHASE_PATH)"""
+    try:
+        saved = co_purchases.save()
+        if saved:
+            print(f"[CoPurchase] Сохранены счетчики {saved} пластинок в {co_purchases.persist_path}")
+    except Exception as e:
+        print(f"[CoPurchase] WARNING: Не удалось сохранить счетчики: {e}")
+
+@app.on_event("startup")
+async def load_llm_cache():
+    """Подгружает сохраненный кэш ответов LLM (если задан LLM_CACHE_PATH)"""
+    try:
+        loaded = llm_cache.load()
+        if loaded:
+            print(f"[LLM Cache] Загружено {loaded} записей из {llm_cache.persist_path}")
+    except Exception as e:
+        print(f"[LLM Cache] WARNING: Не удалось загрузить кэш: {e}")
+
+@app.on_event("shutdown")
+async def save_llm_cache():
+    """Сохраняет кэш ответов LLM на диск (если задан LLM_CACHE_PATH)"""
+    try:
+        saved = llm_cache.save()
+        if saved:
+            print(f"[LLM Cache] Сохранено {saved} записей в {llm_cache.persist_path}")
+    except Exception as e:
+        print(f"[LLM Cache] WARNING: Не удалось сохранить кэш: {e}")
+
 # Эндпоинт для проверки здоровья сервиса
 @app.get("/health", tags=["Health Check"])
 async def health_check():
@@ -1493,7 +2559,21 @@ async def health_check():
         "status": "healthy",
         "service": "recommender",
         "version": "1.0.0",
-        "available_models": list(AVAILABLE_MODELS.keys())
+        "available_models": list(AVAILABLE_MODELS.keys()),
+        "llm_base_url": OPENROUTER_BASE_URL,
+        "llm_cache": llm_cache.stats(),
+        "llm_limiter": llm_limiter.stats(),
+        "llm_telemetry": llm_telemetry.summary(),
+        "llm_router": llm_router.stats(),
+        "single_flight": {"llm": llm_flight.stats(), "upstream": upstream_flight.stats()},
+        "chat_sessions": chat_sessions.stats(),
+        "co_purchases": co_purchases.stats(),
+        "llm_hedging": {
+            "policies": {endpoint: policy.stats() for endpoint, policy in HEDGE_POLICIES.items()},
+            "model_latency": model_latency.stats(),
+        },
+        "prompt_cache": prompt_cache.stats(),
+        "catalog_snapshot": catalog_snapshot.stats() if catalog_snapshot else None
     }
 
 # Эндпоинт для получения информации о сервисе
@@ -0,0 +1,78 @@
+"""
+Потоковая очистка Markdown для стриминга ответов чата (SSE).
+
+clean_markdown в main.py работает с готовым текстом. Здесь те же правила
+применяются построчно к тексту, который приходит от LLM по кусочкам:
+завершенные строки очищаются целиком, а из текущей строки отдается только
+"устойчивая" часть - хвост, который еще может оказаться разметкой
+(#, *, маркер списка, пробелы), придерживается до следующего фрагмента.
+"""
+import re
+
+ASTERISKS = re.compile(r'\*+')
+HEADINGS = re.compile(r'#{1,6}\s+')
+BULLET_PREFIX = re.compile(r'^\s*[-+]\s+')
+NUMBERED_PREFIX = re.compile(r'^\d+\.\s+')
+FANCY_QUOTES = re.compile(r'[""“”„‟″‶]')
+MULTIPLE_SPACES = re.compile(r' +')
+# Хвост строки, который может измениться после следующего фрагмента
+UNSTABLE_TAIL = re.compile(r'[\s#*+\-\d.]+$')
+
+
+def clean_markdown_line(line: str) -> str:
+    """Очищает одну строку по тем же правилам, что и clean_markdown"""
+    line = ASTERISKS.sub('', line)
+    line = HEADINGS.sub('', line)
+    line = BULLET_PREFIX.sub('', line)
+    line = NUMBERED_PREFIX.sub('', line.lstrip())
+    line = FANCY_QUOTES.sub('"', line)
+    line = MULTIPLE_SPACES.sub(' ', line)
+    return line.strip()
+
+
+class MarkdownStreamCleaner:
+    """
+    Инкрементальная очистка Markdown.
+
+        cleaner = MarkdownStreamCleaner()
+        for delta in llm_stream:
+            send(cleaner.feed(delta))
+        send(cleaner.flush())
+    """
+
+    def __init__(self):
+        self._line = ""           # Текущая (незавершенная) строка
+        self._line_emitted = 0    # Сколько очищенных символов текущей строки уже отдано
+        self._emitted_any = False
+
+    def _emit_line_part(self, cleaned: str) -> str:
+        if len(cleaned) <= self._line_emitted:
+            return ""
+        part = cleaned[self._line_emitted:]
+        if self._line_emitted == 0 and self._emitted_any:
+            # Первый текст новой непустой строки - отделяем от предыдущей
+            part = "\n" + part
+        self._line_emitted = len(cleaned)
+        self._emitted_any = True
+        return part
+
+    def feed(self, delta: str) -> str:
+        """Принимает очередной фрагмент ответа LLM, возвращает очищенный текст для отправки"""
+        output = []
+        self._line += delta
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            output.append(self._emit_line_part(clean_markdown_line(line)))
+            self._line_emitted = 0
+
+        stable = UNSTABLE_TAIL.sub('', self._line)
+        if stable:
+            output.append(self._emit_line_part(clean_markdown_line(stable)))
+        return "".join(output)
+
+    def flush(self) -> str:
+        """Отдает остаток после завершения ответа"""
+        output = self._emit_line_part(clean_markdown_line(self._line))
+        self._line = ""
+        self._line_emitted = 0
+        return output
@@ -0,0 +1,120 @@
+"""
+Сборка промпта чата в пределах бюджета токенов.
+
+Раньше в промпт попадали последние 10 сообщений истории целиком, без учета
+их длины. Теперь контекст заполняется по приоритету: системный промпт и
+текущее сообщение (всегда), текущая пластинка, найденные пластинки каталога,
+затем свежая история. Не поместившиеся старые реплики сворачиваются в
+короткую сводку. Стоимость и задержка запроса не растут с длиной диалога.
+
+Токены считаются по модели: для моделей OpenAI - через tiktoken (если
+установлен), для остальных - оценкой по числу символов.
+"""
+import functools
+from typing import Callable, List, Tuple
+
+from title_matcher import ID_MENTION
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Символов на токен для оценки без токенизатора (кириллица токенизируется хуже латиницы)
+CHARS_PER_TOKEN_BY_PROVIDER = {
+    "openai/": 3.0,
+    "anthropic/": 2.8,
+    "google/": 3.5,
+    "meta-llama/": 2.7,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.0
+
+# Служебные токены на каждое сообщение (роль, разделители) и на ответ
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+# Сводка старых реплик: сколько символов реплики пользователя оставлять
+SUMMARY_USER_CHARS = 120
+
+
+@functools.lru_cache(maxsize=16)
+def _tiktoken_encoding(model: str):
+    if tiktoken is None or not model.startswith("openai/"):
+        return None
+    try:
+        return tiktoken.encoding_for_model(model.split("/", 1)[1])
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenCounter:
+    """Подсчет токенов для конкретной модели"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self._encoding = _tiktoken_encoding(model)
+        self._chars_per_token = next(
+            (ratio for prefix, ratio in CHARS_PER_TOKEN_BY_PROVIDER.items() if model.startswith(prefix)),
+            DEFAULT_CHARS_PER_TOKEN
+        )
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return int(len(text) / self._chars_per_token) + 1
+
+    def count_message(self, message: dict) -> int:
+        return self.count(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return sum(self.count_message(message) for message in messages) + REPLY_OVERHEAD_TOKENS
+
+
+def fit_history(history: List[dict], budget: int, count_message: Callable[[dict], int]) -> Tuple[List[dict], List[dict]]:
+    """
+    Берет с конца истории столько сообщений, сколько помещается в budget.
+    Возвращает (оставленные сообщения, более старые - для сводки).
+    """
+    used = 0
+    start = len(history)
+    while start > 0:
+        tokens = count_message(history[start - 1])
+        if used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+    return history[start:], history[:start]
+
+
+def summarize_history(messages: List[dict], budget: int, count: Callable[[str], int]) -> str:
+    """
+    Сводка старых реплик без вызова LLM (детерминированная - не мешает кэшу ответов):
+    о чем спрашивал пользователь и какие пластинки (ID) предлагал консультант.
+    Если сводка не помещается в budget, отбрасываются самые старые пункты.
+    """
+    lines = []
+    for message in messages:
+        content = " ".join((message.get("content") or "").split())
+        if not content:
+            continue
+        if message.get("role") == "user":
+            if len(content) > SUMMARY_USER_CHARS:
+                content = content[:SUMMARY_USER_CHARS].rstrip() + "..."
+            lines.append(f"- Пользователь: {content}")
+        else:
+            record_ids = list(dict.fromkeys(match.group(1) for match in ID_MENTION.finditer(content)))
+            if record_ids:
+                lines.append(f"- Консультант предложил пластинки: {', '.join('ID ' + record_id for record_id in record_ids)}")
+
+    # Оставляем самые свежие пункты, которые помещаются в бюджет
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        tokens = count(line) + 1
+        if used + tokens > budget:
+            break
+        kept.append(line)
+        used += tokens
+    return "\n".join(reversed(kept))
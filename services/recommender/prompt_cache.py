@@ -0,0 +1,84 @@
+"""
+Кэш промптов из prompts-manager для recommender service.
+
+Промпты меняются редко, поэтому recommender держит их в памяти и не ходит
+в prompts-manager на каждый запрос к LLM. Записи инвалидируются лентой
+изменений prompts-manager (GET /api/v1/changes, long-poll). TTL - страховка
+на случай, если лента недоступна: по его истечении промпт перезапрашивается,
+а если prompts-manager не отвечает, используется последняя известная версия.
+"""
+import time
+from typing import Optional
+
+
+class PromptCache:
+    """Кэш шаблонов промптов с TTL и состоянием подписки на ленту изменений"""
+
+    def __init__(self, ttl_seconds: float = 300.0):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}  # prompt_id -> {"template", "version", "fetched_at"}
+        # Позиция в ленте изменений prompts-manager
+        self.feed_epoch = None
+        self.feed_seq = 0
+        self.feed_connected = False
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.invalidations = 0
+
+    def get(self, prompt_id: str) -> Optional[str]:
+        """Возвращает свежий шаблон или None (нет в кэше / истек TTL)"""
+        entry = self._entries.get(prompt_id)
+        if entry is None or time.monotonic() - entry["fetched_at"] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["template"]
+
+    def get_stale(self, prompt_id: str) -> Optional[str]:
+        """Последняя известная версия шаблона (когда prompts-manager недоступен)"""
+        entry = self._entries.get(prompt_id)
+        if entry is None:
+            return None
+        self.stale_served += 1
+        return entry["template"]
+
+    def set(self, prompt_id: str, template: str, version: Optional[int] = None) -> None:
+        self._entries[prompt_id] = {
+            "template": template,
+            "version": version,
+            "fetched_at": time.monotonic()
+        }
+
+    def invalidate(self, prompt_id: Optional[str] = None) -> None:
+        """Удаляет промпт из кэша (None - весь кэш)"""
+        if prompt_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(prompt_id, None)
+        self.invalidations += 1
+
+    def apply_changes(self, feed: dict) -> None:
+        """Применяет ответ ленты изменений prompts-manager"""
+        if feed.get("reset") or feed.get("epoch") != self.feed_epoch:
+            if self.feed_epoch is not None or self._entries:
+                self.invalidate()
+        else:
+            for change in feed.get("changes", []):
+                entry = self._entries.get(change["prompt_id"])
+                if entry is None or entry["version"] != change.get("version"):
+                    self.invalidate(change["prompt_id"])
+        self.feed_epoch = feed.get("epoch")
+        self.feed_seq = feed.get("seq", 0)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_served": self.stale_served,
+            "invalidations": self.invalidations,
+            "feed_connected": self.feed_connected,
+            "feed_seq": self.feed_seq,
+        }
@@ -0,0 +1,111 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight) для recommender service.
+
+Когда много пользователей одновременно открывают одну пластинку или задают
+один и тот же вопрос, сервис отправлял одинаковые запросы к LLM, каталогу и
+prompts-manager параллельно - каждый свой. Теперь первый запрос с данным
+ключом выполняется, а остальные ждут его результат (или ошибку).
+
+Результат не сохраняется после завершения запроса - для этого есть кэши
+(llm_cache, prompt_cache, снимок каталога). Отмена одного ожидающего (клиент
+отключился, хеджированный запрос проиграл) не отменяет запрос для остальных;
+запрос отменяется, только когда не осталось ни одного ожидающего.
+
+Общий запрос выполняется в чистом контексте (contextvars): иначе он
+унаследовал бы дедлайн (llm_deadline) и эндпоинт телеметрии (llm_endpoint)
+того, кто пришел первым, и они достались бы всем остальным. Все, что нужно
+запросу, передается в factory явно, а дедлайн каждый ожидающий соблюдает
+сам (timeout в do).
+"""
+import asyncio
+import contextvars
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Сколько ключей с наибольшим числом объединенных запросов показывать в статистике
+TOP_KEYS = 10
+
+
+class Flight:
+    """Выполняющийся запрос и его ожидающие"""
+
+    def __init__(self, task: asyncio.Task, label: str):
+        self.task = task
+        self.label = label
+        self.waiters = 0
+        self.peak_waiters = 0
+        self.started_at = time.monotonic()
+
+
+class SingleFlight:
+    """Группа запросов, объединяемых по ключу"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, Flight] = {}
+        self.executed = 0   # Реально выполненных запросов
+        self.coalesced = 0  # Запросов, дождавшихся чужого результата
+        self.peak_waiters = 0
+        self.coalesced_by_label = Counter()
+
+    def running(self, key: str) -> bool:
+        """Выполняется ли запрос с этим ключом (вызов do с ним присоединится к запросу)"""
+        flight = self._flights.get(key)
+        return flight is not None and not flight.task.done()
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]], label: Optional[str] = None,
+                 timeout: Optional[float] = None) -> T:
+        """
+        Выполняет factory() или присоединяется к уже выполняющемуся запросу с тем же ключом.
+        label - читаемое имя ключа для статистики (ключ может быть хешем).
+        timeout - сколько ждать этому вызывающему (asyncio.TimeoutError); запрос продолжается для остальных.
+        """
+        flight = self._flights.get(key)
+        if flight is None or flight.task.done():
+            # Задача копирует текущий контекст - создаем ее в пустом
+            task = contextvars.Context().run(asyncio.ensure_future, factory())
+            flight = Flight(task, label or key)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task, key=key, flight=flight: self._forget(key, flight))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+            self.coalesced_by_label[flight.label] += 1
+
+        flight.waiters += 1
+        flight.peak_waiters = max(flight.peak_waiters, flight.waiters)
+        self.peak_waiters = max(self.peak_waiters, flight.waiters)
+        try:
+            # shield: отмена одного ожидающего не отменяет общий запрос
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        total = self.executed + self.coalesced
+        now = time.monotonic()
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 3) if total else 0.0,
+            "peak_waiters": self.peak_waiters,
+            "in_flight": [
+                {
+                    "key": flight.label,
+                    "waiters": flight.waiters,
+                    "peak_waiters": flight.peak_waiters,
+                    "age_seconds": round(now - flight.started_at, 2),
+                }
+                for flight in self._flights.values()
+            ],
+            "top_coalesced": dict(self.coalesced_by_label.most_common(TOP_KEYS)),
+        }
@@ -0,0 +1,189 @@
+"""
+Поиск упоминаний пластинок каталога в ответе LLM за один проход.
+
+Названия пластинок (нормализованные, как в CatalogSnapshot.by_name) собираются
+в автомат Ахо-Корасик: названия находятся линейным проходом автомата, без
+сравнения каждого найденного фрагмента со всем каталогом. Как и раньше,
+названием считается только текст в кавычках или выделенный жирным ("Кино",
+**Кино**): многие названия - обычные слова ("Это всё", "Разлука"), и в
+остальном тексте ответа они не означают рекомендацию. Упоминания по ID ищутся
+одним заранее скомпилированным выражением, а названия в кавычках, не
+совпавшие точно, сопоставляются по словам через обратный индекс.
+
+Автомат строится один раз на версию каталога (см. CatalogSnapshot.title_matcher).
+"""
+import re
+from typing import Dict, List, NamedTuple, Set
+
+# Кавычки, которые убираются из названий при нормализации
+QUOTE_CHARS = '"\u201C\u201D\u201E\u201F\u2033\u2036'
+QUOTES = re.compile(f'[{QUOTE_CHARS}]')
+
+# Упоминания по ID: "ID: 5", "(ID 5)", "ID=5", "пластинка 5", "#5"
+ID_MENTION = re.compile(r'(?<!\w)(?:ID(?:[:\s]+|\s*=\s*)|пластинка\s+|#)(\d+)', re.IGNORECASE)
+
+# Названия в кавычках или выделенные жирным: "Название", **"Название"**, **Название**
+QUOTED_TITLE = re.compile(rf'[{QUOTE_CHARS}]([^{QUOTE_CHARS}\n]+)[{QUOTE_CHARS}]|\*\*([^*\n]+?)\*\*')
+
+# Нечеткое совпадение: доля общих слов (длиннее 2 символов), как раньше в extract_recommendations_from_text
+MIN_WORD_OVERLAP = 0.4
+# Слова, встречающиеся в названиях чаще, не порождают кандидатов ("the", "live", "best"...)
+MAX_WORD_POSTINGS = 200
+MIN_TITLE_LENGTH = 3
+
+
+def normalize_title(title: str) -> str:
+    """Нормализует название для поиска (убираем кавычки, приводим к нижнему регистру)"""
+    return QUOTES.sub('', title).strip().lower()
+
+
+class Mention(NamedTuple):
+    start: int   # Позиции в исходном тексте
+    end: int
+    record: object
+    kind: str    # "id" | "title" | "fuzzy"
+
+
+def title_variants(name: str) -> Set[str]:
+    """Варианты названия для автомата: полное и без артикля в начале"""
+    normalized = normalize_title(name)
+    variants = {normalized}
+    for article in ("the ", "a "):
+        if normalized.startswith(article):
+            variants.add(normalized[len(article):])
+    return {variant for variant in variants if len(variant) >= MIN_TITLE_LENGTH}
+
+
+def significant_words(title: str) -> List[str]:
+    return [word for word in title.split() if len(word) > 2]
+
+
+class TitleMatcher:
+    """Автомат Ахо-Корасик по названиям пластинок + индексы для ID и нечеткого поиска"""
+
+    def __init__(self, records: list):
+        self.by_id = {record.id: record for record in records}
+
+        # Бор: переходы, суффиксные ссылки, выходы (длина названия, пластинка)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[list] = [[]]
+        for record in records:
+            for variant in title_variants(record.name):
+                self._add(variant, record)
+        self._build_links()
+
+        # Обратный индекс слово -> пластинки для нечеткого поиска
+        self._records_by_word: Dict[str, list] = {}
+        self._words_by_id: Dict[int, Set[str]] = {}
+        for record in records:
+            words = significant_words(normalize_title(record.name))
+            self._words_by_id[record.id] = set(words)
+            for word in set(words):
+                self._records_by_word.setdefault(word, []).append(record)
+
+    def _add(self, pattern: str, record):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(pattern), record))
+
+    def _build_links(self):
+        queue = list(self._goto[0].values())
+        for state in queue:  # Обход в ширину (список растет по ходу цикла)
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def _scan_titles(self, text: str, offset: int = 0) -> List[Mention]:
+        """
+        Точные упоминания названий во фрагменте text, начинающемся с позиции offset
+        (регистр и кавычки не важны, границы слов обязательны)
+        """
+        # Нормализуем текст так же, как названия, запоминая исходные позиции символов
+        chars = []
+        positions = []
+        for position, char in enumerate(text):
+            if QUOTES.match(char):
+                continue
+            chars.append(char.lower())
+            positions.append(position)
+
+        candidates = []
+        state = 0
+        for i, char in enumerate(chars):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, record in self._out[state]:
+                start = i - length + 1
+                if start > 0 and chars[start].isalnum() and chars[start - 1].isalnum():
+                    continue
+                if i + 1 < len(chars) and chars[i].isalnum() and chars[i + 1].isalnum():
+                    continue
+                candidates.append((start, i + 1, record))
+
+        # Перекрывающиеся совпадения: выигрывает самое левое, затем самое длинное
+        mentions = []
+        covered_until = 0
+        for start, end, record in sorted(candidates, key=lambda c: (c[0], c[0] - c[1])):
+            if start < covered_until:
+                continue
+            mentions.append(Mention(offset + positions[start], offset + positions[end - 1] + 1, record, "title"))
+            covered_until = end
+        return mentions
+
+    def _match_fuzzy(self, title: str):
+        """Пластинка с наибольшей долей общих слов (не меньше MIN_WORD_OVERLAP)"""
+        title_words = set(significant_words(normalize_title(title)))
+        if not title_words:
+            return None
+        best_record, best_score = None, 0.0
+        candidates = {}
+        for word in title_words:
+            postings = self._records_by_word.get(word, ())
+            if len(postings) <= MAX_WORD_POSTINGS:
+                candidates.update((record.id, record) for record in postings)
+        for record_id, record in candidates.items():
+            record_words = self._words_by_id[record_id]
+            score = len(title_words & record_words) / max(len(title_words), len(record_words))
+            if score > best_score and score >= MIN_WORD_OVERLAP:
+                best_record, best_score = record, score
+        return best_record
+
+    def find_mentions(self, text: str) -> List[Mention]:
+        """Все упоминания пластинок в тексте (по ID, названию, нечетко по словам), по позиции"""
+        mentions = []
+        for match in ID_MENTION.finditer(text):
+            record = self.by_id.get(int(match.group(1)))
+            if record is not None:
+                mentions.append(Mention(match.start(), match.end(), record, "id"))
+
+        # Названия - только в кавычках или жирным; не найденные точно (LLM немного изменила
+        # название) сопоставляются по словам
+        for match in QUOTED_TITLE.finditer(text):
+            title_mentions = self._scan_titles(match.group(0), match.start())
+            if title_mentions:
+                mentions.extend(title_mentions)
+                continue
+            title = QUOTES.sub('', match.group(1) or match.group(2)).strip()
+            if len(title) < MIN_TITLE_LENGTH:
+                continue
+            record = self._match_fuzzy(title)
+            if record is not None:
+                mentions.append(Mention(match.start(), match.end(), record, "fuzzy"))
+
+        mentions.sort(key=lambda mention: mention.start)
+        return mentions
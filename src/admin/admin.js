@@ -212,9 +212,9 @@ productsTable.addEventListener('click', (event) => {
         target.disabled = true;
         target.textContent = 'Генерация...';
         
-        // Делаем POST запрос к оркестратору
+        // Делаем POST запрос к оркестратору (no_cache - новое описание, а не ответ из кэша LLM)
         const recommenderUrl = window.API_CONFIG?.recommender || 'http://localhost:8004';
-        fetch(`${recommenderUrl}/api/v1/recommendations/generate-description/${productId}`, {
+        fetch(`${recommenderUrl}/api/v1/recommendations/generate-description/${productId}?no_cache=true`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -802,7 +802,7 @@ async function generateDescription() {
         const timeoutId = setTimeout(() => controller.abort(), 100000); // 100 секунд
         
         const recommenderUrl = window.API_CONFIG?.recommender || 'http://localhost:8004';
-        const response = await fetch(`${recommenderUrl}/api/v1/recommendations/generate-description/${editingId}`, {
+        const response = await fetch(`${recommenderUrl}/api/v1/recommendations/generate-description/${editingId}?no_cache=true`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -888,7 +888,7 @@ async function generateDescriptionForProduct(productId) {
         const timeoutId = setTimeout(() => controller.abort(), 100000); // 100 секунд
         
         const recommenderUrl = window.API_CONFIG?.recommender || 'http://localhost:8004';
-        const response = await fetch(`${recommenderUrl}/api/v1/recommendations/generate-description/${productId}`, {
+        const response = await fetch(`${recommenderUrl}/api/v1/recommendations/generate-description/${productId}?no_cache=true`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -34,6 +34,7 @@ async function loadRecordDetails(recordId) {
         }
         
         const recordData = await response.json();
+        recordProductView(recordId);
         
         // Очищаем содержимое main элемента (включая индикатор загрузки)
         const mainElement = document.querySelector('main.page-content');
@@ -54,6 +55,16 @@ async function loadRecordDetails(recordId) {
     }
 }
 
+// Учет просмотра карточки в популярности пластинок (ошибки не мешают странице)
+function recordProductView(recordId) {
+    fetch(`${PRODUCTS_ENDPOINT}/events`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ event: 'view', product_ids: [String(recordId)] }),
+        keepalive: true
+    }).catch(error => console.warn('Не удалось учесть просмотр пластинки:', error));
+}
+
 // Создание детальной карточки виниловой пластинки
 function createBookDetailCard(recordData, urlBookId = null) {
     // Извлекаем данные из ответа API
@@ -304,8 +304,55 @@ function saveCartWithQuantity(cartWithQuantity) {
     updateCartCount();
 }
 
+// ID серверной корзины (Cart Service хранит состав и итоги, пересчитывая только изменения)
+const SERVER_CART_ID_KEY = 'serverCartId';
+
+function getServerCartId() {
+    let cartId = localStorage.getItem(SERVER_CART_ID_KEY);
+    if (!cartId) {
+        cartId = (window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(16).slice(2)}`).replace(/-/g, '');
+        localStorage.setItem(SERVER_CART_ID_KEY, cartId);
+    }
+    return cartId;
+}
+
+// Синхронизирует серверную корзину с localStorage и возвращает ее итоги (null - сервис недоступен)
+async function syncServerCart(cartWithQuantity) {
+    try {
+        const items = Object.entries(cartWithQuantity).map(([id, quantity]) => ({
+            vinyl_id: Number(id),
+            quantity: quantity
+        }));
+        const response = await fetch(`${window.API_CONFIG.cart}/api/v1/carts/${getServerCartId()}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ items })
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        return {
+            items: data.items.map(item => ({
+                ...item,
+                image_url: item.image_url || '',
+                author: item.artist, // Для обратной совместимости
+                total_price: item.line_total
+            })),
+            total: data.total
+        };
+    } catch (error) {
+        console.warn('Серверная корзина недоступна, используем расчет по списку товаров:', error.message);
+        return null;
+    }
+}
+
 // Функция для очистки корзины
 function clearCart() {
+    const serverCartId = localStorage.getItem(SERVER_CART_ID_KEY);
+    if (serverCartId && window.API_CONFIG?.cart) {
+        fetch(`${window.API_CONFIG.cart}/api/v1/carts/${serverCartId}`, { method: 'DELETE' }).catch(() => {});
+    }
     localStorage.removeItem('cart');
     localStorage.removeItem('cartWithQuantity');
     updateCartCount();
@@ -337,6 +384,11 @@ async function calculateCartTotal() {
         return { items: [], total: 0 };
     }
 
+    const serverCart = await syncServerCart(cartWithQuantity);
+    if (serverCart && serverCart.items.length === productIds.length) {
+        return serverCart;
+    }
+
     try {
         console.log('Отправка запроса к Cart Service...');
         const response = await fetch(`${window.API_CONFIG.cart}/api/v1/cart/calculate`, {
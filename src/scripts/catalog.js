@@ -43,7 +43,8 @@ document.addEventListener('DOMContentLoaded', async function() {
 // Загрузка виниловых пластинок с API
 async function loadVinylRecords() {
     try {
-        const response = await fetch(PRODUCTS_ENDPOINT);
+        // Сервер отдает пластинки по убыванию популярности (заказы и просмотры за последние недели)
+        const response = await fetch(`${PRODUCTS_ENDPOINT}?sort=popular`);
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
@@ -54,8 +55,9 @@ async function loadVinylRecords() {
         window.vinylRecords = vinylRecords;
         
         // Добавляем недостающие поля для совместимости
-        vinylRecords = vinylRecords.map(record => ({
+        vinylRecords = vinylRecords.map((record, index) => ({
             ...record,
+            popularityRank: index, // Позиция в рейтинге популярности от сервера
             title: record.name,
             artist: record.artist || record.author || 'Неизвестный исполнитель',
             author: record.artist || record.author || 'Неизвестный исполнитель', // Для обратной совместимости
@@ -606,7 +608,7 @@ function getFilteredBooks() {
             break;
         case 'popular':
         default:
-            filteredRecords.sort((a, b) => b.rating - a.rating);
+            filteredRecords.sort((a, b) => a.popularityRank - b.popularityRank);
             break;
     }
     
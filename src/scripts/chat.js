@@ -1,6 +1,10 @@
 // Модуль для работы с AI-консультантом (чат-бот)
 const CHAT_STORAGE_KEY = 'vinyl_shop_chat_history';
+// ID серверной сессии чата: история хранится на сервере, клиент шлет только новое сообщение
+const CHAT_SESSION_KEY = 'vinyl_shop_chat_session';
 const CHAT_API_URL = (window.API_CONFIG?.recommender || 'http://localhost:8004') + '/api/v1/chat/message';
+// Потоковый вариант (Server-Sent Events): ответ появляется по мере генерации
+const CHAT_STREAM_API_URL = CHAT_API_URL + '/stream';
 
 // Инициализация чата при загрузке страницы
 document.addEventListener('DOMContentLoaded', function() {
@@ -133,26 +137,22 @@ function initializeChat() {
         showTypingIndicator();
         
         try {
-            // Получаем историю диалога
-            const history = getChatHistory();
-            
             // Получаем ID текущей пластинки (если на странице детализации)
             const urlParams = new URLSearchParams(window.location.search);
             const currentProductId = urlParams.get('id') ? parseInt(urlParams.get('id')) : null;
             
-            // Отправляем запрос к API
-            const response = await fetch(CHAT_API_URL, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    message: message,
-                    history: history,
-                    current_product_id: currentProductId,
-                    model: 'gpt-4'
-                })
-            });
+            // С сессией история уже на сервере; без нее (первое сообщение) отправляем локальную историю.
+            // Если сервер не знает сессию (истекла, сервис перезапущен) - 409, повторяем один раз с историей
+            const sessionId = localStorage.getItem(CHAT_SESSION_KEY);
+            let response = await postChatMessage(message, currentProductId, sessionId);
+            if (response && response.status === 409 && sessionId) {
+                localStorage.removeItem(CHAT_SESSION_KEY);
+                response = await postChatMessage(message, currentProductId, null);
+            }
+            if (!response) {
+                // Ответ уже прочитан из потока
+                return;
+            }
             
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({ detail: 'Ошибка сервера' }));
@@ -166,6 +166,7 @@ function initializeChat() {
             
             // Добавляем ответ консультанта в чат
             if (data.success && data.response) {
+                saveChatSession(data.session_id);
                 addMessageToChat('assistant', data.response);
             } else {
                 throw new Error('Неверный формат ответа от сервера');
@@ -178,6 +179,128 @@ function initializeChat() {
         }
     }
     
+    // Запрос к консультанту: сначала потоковый эндпоинт, при его отсутствии - обычный.
+    // Возвращает null, если ответ уже прочитан из потока, иначе - Response обычного запроса (или ошибки)
+    async function postChatMessage(message, currentProductId, sessionId) {
+        const requestBody = JSON.stringify({
+            message: message,
+            session_id: sessionId,
+            // Текущее сообщение уже добавлено в локальную историю - передается отдельно в message
+            history: sessionId ? [] : getChatHistory().slice(0, -1),
+            current_product_id: currentProductId,
+            model: 'auto'
+        });
+        
+        const streamResponse = await fetch(CHAT_STREAM_API_URL, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+            },
+            body: requestBody
+        }).catch(() => null);
+        
+        const isEventStream = streamResponse && streamResponse.ok && streamResponse.body &&
+            (streamResponse.headers.get('Content-Type') || '').includes('text/event-stream');
+        if (isEventStream) {
+            await readChatStream(streamResponse);
+            return null;
+        }
+        if (streamResponse && !streamResponse.ok && streamResponse.status !== 404 && streamResponse.status !== 405) {
+            return streamResponse;
+        }
+        
+        // Сервис без потокового эндпоинта - обычный запрос
+        return fetch(CHAT_API_URL, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: requestBody
+        });
+    }
+    
+    // Чтение потокового ответа (SSE): события delta - фрагменты текста, message - итоговый ответ
+    async function readChatStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        let streamedText = '';
+        let messageContent = null;
+        let finished = false;
+        
+        // Пузырь ответа создается при первом фрагменте (до этого показывается индикатор печати)
+        function ensureMessageElement() {
+            if (messageContent) {
+                return;
+            }
+            hideTypingIndicator();
+            const messageDiv = document.createElement('div');
+            messageDiv.className = 'chat-message chat-message-assistant';
+            messageContent = document.createElement('div');
+            messageContent.className = 'chat-message-content';
+            messageDiv.appendChild(messageContent);
+            chatMessages.appendChild(messageDiv);
+        }
+        
+        function handleEvent(eventName, data) {
+            if (eventName === 'delta') {
+                ensureMessageElement();
+                streamedText += data.text || '';
+                messageContent.innerHTML = formatMessageContent(streamedText);
+                scrollToBottom();
+            } else if (eventName === 'message') {
+                ensureMessageElement();
+                messageContent.innerHTML = formatMessageContent(data.response);
+                saveChatSession(data.session_id);
+                saveMessageToHistory('assistant', data.response);
+                scrollToBottom();
+                finished = true;
+            } else if (eventName === 'error') {
+                if (messageContent) {
+                    messageContent.parentElement.remove();
+                }
+                throw new Error(data.detail || 'Ошибка при генерации ответа');
+            }
+        }
+        
+        while (!finished) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            // События разделены пустой строкой
+            let separatorIndex;
+            while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, separatorIndex);
+                buffer = buffer.slice(separatorIndex + 2);
+                
+                let eventName = 'message';
+                const dataLines = [];
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                }
+                if (dataLines.length) {
+                    handleEvent(eventName, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+        
+        if (!finished) {
+            if (!streamedText) {
+                throw new Error('Соединение прервано до получения ответа');
+            }
+            // Поток оборвался после части ответа - сохраняем то, что успели получить
+            saveMessageToHistory('assistant', streamedText);
+        }
+    }
+    
     // Добавление сообщения в чат
     function addMessageToChat(role, content) {
         const messageDiv = document.createElement('div');
@@ -238,8 +361,21 @@ function initializeChat() {
         }
     }
     
+    // Сохранение ID серверной сессии (сервер может выдать новую, если старая истекла)
+    function saveChatSession(sessionId) {
+        if (sessionId) {
+            localStorage.setItem(CHAT_SESSION_KEY, sessionId);
+        }
+    }
+    
     // Очистка истории
     function clearChatHistory() {
+        const sessionId = localStorage.getItem(CHAT_SESSION_KEY);
+        if (sessionId) {
+            fetch(`${CHAT_API_URL.replace(/\/message$/, '/sessions')}/${encodeURIComponent(sessionId)}`, { method: 'DELETE' })
+                .catch(() => {});
+        }
+        localStorage.removeItem(CHAT_SESSION_KEY);
         localStorage.removeItem(CHAT_STORAGE_KEY);
         chatMessages.innerHTML = '';
         // Показываем приветственное сообщение (без сохранения в историю)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для серверных корзин (services/cart/cart_store.py)
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию cart в путь
+cart_path = Path(__file__).parent.parent / "services" / "cart"
+sys.path.insert(0, str(cart_path))
+
+from cart_store import Cart, CartLine, CartStore
+
+
+def line(product_id, price):
+    return CartLine(product_id, f"Пластинка {product_id}", "Исполнитель", price)
+
+
+def test_totals_follow_quantity_changes():
+    store = CartStore()
+    cart = store.create()
+
+    store.update(cart, [(line("1", 29.99), 2), (line("2", 0.1), 3)])
+    assert (cart.total_cents, cart.item_count) == (6028, 5)
+
+    store.update(cart, [(cart.lines["1"], 1)])
+    store.update(cart, [(cart.lines["2"], 0)])
+    assert cart.to_dict()["total"] == 29.99
+    assert cart.item_count == 1
+    assert list(cart.lines) == ["1"]
+
+
+def test_unchanged_quantity_is_not_an_update():
+    store = CartStore()
+    cart = store.create()
+    store.update(cart, [(line("1", 10), 1)])
+    version = cart.version
+
+    assert not store.update(cart, [(cart.lines["1"], 1)])
+    assert cart.version == version
+
+
+def test_concurrent_adds_are_not_lost():
+    store = CartStore()
+    cart = store.create()
+
+    def add_items():
+        for _ in range(200):
+            store.add(cart, line("1", 10), 1)
+
+    threads = [threading.Thread(target=add_items) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cart.quantity("1") == 800
+    assert (cart.total_cents, cart.item_count) == (800000, 800)
+
+
+def test_expired_and_evicted_carts(monkeypatch):
+    store = CartStore(max_carts=2, ttl_seconds=60)
+    first = store.create("a")
+    store.create("b")
+    store.create("c")
+
+    assert store.get("a") is None
+    assert store.stats()["evictions"] == 1
+
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.get("b") is None
+    assert store.stats()["expired"] == 1
+    assert first.cart_id == "a"
+
+
+def test_write_behind_flushes_dirty_carts_and_loads_them_back():
+    saved = {}
+
+    def writer(carts, deleted):
+        for cart in carts:
+            saved[cart["cart_id"]] = cart
+        for cart_id in deleted:
+            saved.pop(cart_id, None)
+
+    store = CartStore(max_carts=1, writer=writer, loader=saved.get)
+    cart = store.create("a")
+    store.update(cart, [(line("1", 5.5), 2)])
+    store.create("b")  # Вытесняет "a" до записи - изменения не теряются
+
+    assert store.flush() == 1
+    assert saved["a"]["total"] == 11.0
+    assert store.flush() == 0
+
+    restored = store.get("a")
+    assert (restored.total_cents, restored.quantity("1")) == (1100, 2)
+
+    store.delete("a")
+    store.flush()
+    assert "a" not in saved
+
+
+def test_failed_flush_is_retried():
+    calls = []
+
+    def writer(carts, deleted):
+        calls.append(len(carts))
+        if len(calls) == 1:
+            raise RuntimeError("db is down")
+
+    store = CartStore(writer=writer)
+    cart = store.create("a")
+    store.update(cart, [(line("1", 1), 1)])
+
+    with pytest.raises(RuntimeError):
+        store.flush()
+    assert store.flush() == 1
+
+
+def test_cart_roundtrip():
+    cart = Cart("a")
+    cart.set_quantity(line("7", 31.99), 3)
+
+    restored = Cart.from_dict(cart.to_dict())
+
+    assert restored.to_dict() == cart.to_dict()
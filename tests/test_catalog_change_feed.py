@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для ленты изменений каталога (services/catalog/change_feed.py)
+"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+# Добавляем директорию catalog в путь
+catalog_path = Path(__file__).parent.parent / "services" / "catalog"
+sys.path.insert(0, str(catalog_path))
+
+from change_feed import CatalogChangeFeed
+
+
+def test_changes_after_since():
+    feed = CatalogChangeFeed("e1")
+    feed.publish(2, [("create", 5, {"id": 5, "price": 10.0})])
+    feed.publish(3, [("update", 1, {"id": 1, "price": 20.0}), ("delete", 2, None)])
+
+    snapshot = feed.snapshot(1, "e1")
+
+    assert not snapshot["reset"]
+    assert snapshot["seq"] == 3
+    assert [(c["seq"], c["op"], c["product_id"], c["version"]) for c in snapshot["changes"]] == [
+        (2, "update", 1, 3),
+        (3, "delete", 2, 3),
+    ]
+
+
+def test_limit_reports_more():
+    feed = CatalogChangeFeed("e1")
+    feed.publish(2, [("update", product_id, {"id": product_id}) for product_id in range(5)])
+
+    first = feed.snapshot(0, "e1", limit=2)
+    rest = feed.snapshot(first["seq"], "e1", limit=10)
+
+    assert first["has_more"] and first["seq"] == 2
+    assert not rest["has_more"]
+    assert [c["product_id"] for c in rest["changes"]] == [2, 3, 4]
+
+
+def test_reset_on_other_epoch_or_lost_changes():
+    feed = CatalogChangeFeed("e1", max_changes=2)
+    for version in range(2, 6):
+        feed.publish(version, [("update", 1, {"id": 1})])
+
+    assert feed.snapshot(3, "e1")["changes"][0]["seq"] == 4
+    assert feed.snapshot(1, "e1")["reset"]
+    assert feed.snapshot(4, "e0")["reset"]
+    assert feed.snapshot(10, "e1")["reset"]
+
+
+def test_wait_wakes_on_publish_from_thread():
+    feed = CatalogChangeFeed("e1")
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.create_task(feed.wait(0, timeout=5))
+        await asyncio.sleep(0.01)
+        started = loop.time()
+        threading.Thread(target=feed.publish, args=(2, [("delete", 1, None)])).start()
+        await waiter
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) < 1
+    assert feed.seq == 1
+
+
+def test_feed_is_refused_with_several_workers(monkeypatch):
+    import importlib.util
+    from fastapi.testclient import TestClient
+
+    spec = importlib.util.spec_from_file_location("catalog_main_change_feed", catalog_path / "main.py")
+    catalog_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(catalog_main)
+    client = TestClient(catalog_main.app)
+    assert client.get("/api/v1/changes", params={"timeout": 0}).status_code == 200
+
+    # У каждого воркера своя лента: реплика не должна по ней следить за каталогом
+    monkeypatch.setattr(catalog_main, "CATALOG_PROCESSES", 2)
+    assert client.get("/api/v1/changes", params={"timeout": 0}).status_code == 409
+    listing = client.get("/api/v1/products").json()
+    assert listing["epoch"] is None and listing["seq"] is None
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для поиска по каталогу recommender (services/recommender/catalog_search.py)
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from catalog_search import BM25Index, select_context_records, estimate_tokens
+
+RECORDS = [
+    SimpleNamespace(id=1, name="Abbey Road", artist="The Beatles", description="Последний записанный альбом группы"),
+    SimpleNamespace(id=2, name="The Dark Side of the Moon", artist="Pink Floyd", description="Психоделический рок, концептуальный альбом"),
+    SimpleNamespace(id=3, name="Группа крови", artist="Кино", description="Советский рок, альбом 1988 года"),
+    SimpleNamespace(id=4, name="Kind of Blue", artist="Miles Davis", description="Джазовая классика"),
+]
+
+
+def format_line(record):
+    return f"ID: {record.id} | {record.name} | {record.artist}"
+
+
+class TestBM25Index:
+    """Тесты для BM25Index"""
+
+    def test_search_by_artist(self):
+        index = BM25Index(RECORDS)
+        assert index.search("pink floyd", k=1)[0].id == 2
+
+    def test_search_by_word_stem(self):
+        """Разные формы слова совпадают по основе"""
+        index = BM25Index(RECORDS)
+        assert index.search("советская музыка", k=1)[0].id == 3
+        assert index.search("джазовый", k=1)[0].id == 4
+
+    def test_no_matches(self):
+        assert BM25Index(RECORDS).search("xyzzy") == []
+
+
+class TestSelectContextRecords:
+    """Тесты для отбора контекста под бюджет токенов"""
+
+    def test_relevant_records_first_and_pinned_on_top(self):
+        index = BM25Index(RECORDS)
+        lines = select_context_records(index, "джаз", format_line, token_budget=1000, max_records=3, pinned=[RECORDS[0]])
+        assert lines[0].startswith("ID: 1 ")
+        assert lines[1].startswith("ID: 4 ")
+        assert len(lines) == 3
+
+    def test_token_budget(self):
+        index = BM25Index(RECORDS)
+        budget = estimate_tokens(format_line(RECORDS[1])) + 1
+        lines = select_context_records(index, "pink floyd", format_line, token_budget=budget, max_records=10)
+        assert lines == [format_line(RECORDS[1])]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для снимка каталога recommender (services/recommender/catalog_snapshot.py)
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from catalog_snapshot import CatalogSnapshot, build_name_index, normalize_title
+
+
+def make_record(record_id, name):
+    return SimpleNamespace(id=record_id, name=name)
+
+
+class TestCatalogSnapshot:
+    """Тесты для CatalogSnapshot"""
+
+    def test_indexes(self):
+        """Снимок строит индексы по ID и по нормализованному названию"""
+        records = [make_record(1, "Abbey Road"), make_record(2, "«Группа крови»")]
+        snapshot = CatalogSnapshot(records, version=3, etag='"abc-3"')
+        assert snapshot.by_id[1].name == "Abbey Road"
+        assert snapshot.by_name["abbey road"].id == 1
+        assert snapshot.stats()["products"] == 2
+        assert snapshot.stats()["version"] == 3
+
+    def test_normalize_title(self):
+        """Кавычки убираются, регистр приводится к нижнему"""
+        assert normalize_title('"Dark Side Of The Moon"') == "dark side of the moon"
+        assert normalize_title("“Кино”") == "кино"
+
+    def test_name_index_without_short_words(self):
+        """В индекс добавляется вариант названия без коротких слов"""
+        index = build_name_index([make_record(5, "Dark Side of the Moon")])
+        assert index["dark side of the moon"].id == 5
+        assert index["dark side the moon"].id == 5
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для снимков каталога (services/catalog/catalog_store.py)
+"""
+
+import sys
+import threading
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel, ConfigDict
+
+# Добавляем директорию catalog в путь
+catalog_path = Path(__file__).parent.parent / "services" / "catalog"
+sys.path.insert(0, str(catalog_path))
+
+from catalog_store import CatalogStore
+
+
+class Record(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    name: str
+    price: float
+    cover_url: Optional[str] = None
+
+
+def make_store(**kwargs):
+    return CatalogStore([Record(id=1, name="A", price=10.0), Record(id=2, name="B", price=20.0)], **kwargs)
+
+
+def test_reader_keeps_its_snapshot():
+    store = make_store()
+    before = store.current()
+
+    with store.update() as draft:
+        draft.put(draft.get(1).model_copy(update={"price": 15.0}))
+        draft.delete(2)
+
+    assert before.version == 1
+    assert [p.price for p in before.products] == [10.0, 20.0]
+    after = store.current()
+    assert after.version == 2
+    assert after.get("1").price == 15.0
+    assert after.get(2) is None
+
+
+def test_failed_update_is_discarded():
+    store = make_store()
+
+    with pytest.raises(RuntimeError):
+        with store.update() as draft:
+            draft.delete(1)
+            raise RuntimeError("validation failed")
+
+    assert store.current().version == 1
+    assert len(store.current()) == 2
+
+
+def test_update_without_changes_keeps_version():
+    store = make_store()
+
+    with store.update() as draft:
+        assert draft.get("missing") is None
+
+    assert store.current().version == 1
+    assert store.publishes == 0
+
+
+def test_changes_are_published_with_version():
+    published = []
+
+    def on_publish(version, changes):
+        published.append((version, [(op, product_id) for op, product_id, _ in changes]))
+        return 7
+
+    store = make_store(on_publish=on_publish)
+    with store.update() as draft:
+        draft.put(Record(id=draft.next_id(), name="C", price=5.0))
+        draft.delete(1)
+
+    assert published == [(2, [("create", 3), ("delete", 1)])]
+    assert store.current().seq == 7
+    assert [p.id for p in store.current().products] == [2, 3]
+
+
+def test_concurrent_writers_do_not_lose_updates():
+    store = make_store()
+
+    def bump_price():
+        for _ in range(200):
+            with store.update() as draft:
+                product = draft.get(1)
+                draft.put(product.model_copy(update={"price": product.price + 1}))
+
+    threads = [threading.Thread(target=bump_price) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.current().get(1).price == 810.0
+    assert store.current().version == 801
+
+
+def test_fingerprint_follows_content_not_process():
+    store, other = make_store(), make_store()
+    assert store.current().fingerprint() == other.current().fingerprint()
+
+    with store.update() as draft:
+        draft.put(draft.get(1).model_copy(update={"price": 15.0}))
+    changed = store.current().fingerprint()
+    assert changed != other.current().fingerprint()
+
+    with other.update() as draft:
+        draft.put(draft.get(1).model_copy(update={"price": 15.0}))
+    assert other.current().fingerprint() == changed
+
+
+def test_etag_matches_across_catalog_processes():
+    import importlib.util
+    from fastapi.testclient import TestClient
+
+    clients = []
+    for name in ("catalog_main_etag_a", "catalog_main_etag_b"):
+        spec = importlib.util.spec_from_file_location(name, catalog_path / "main.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        clients.append(TestClient(module.app))
+    first, second = clients
+
+    # Другой процесс (воркер, перезапуск) с тем же каталогом отвечает 304 на ETag первого
+    etag = first.get("/api/v1/products").headers["ETag"]
+    assert second.get("/api/v1/products", headers={"If-None-Match": etag}).status_code == 304
+
+    first.put("/api/v1/admin/products/1", json={"price": 1.0})
+    assert first.get("/api/v1/products").headers["ETag"] != etag
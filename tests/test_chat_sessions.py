@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для серверных сессий чата (services/recommender/chat_sessions.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from chat_sessions import ChatSessionStore
+
+
+def message(role, content):
+    return {"role": role, "content": content}
+
+
+def test_append_keeps_last_messages():
+    store = ChatSessionStore(max_messages=4)
+    session = store.create([message("user", "старое")])
+
+    for i in range(3):
+        store.append(session, message("user", f"вопрос {i}"), message("assistant", f"ответ {i}"))
+
+    assert len(session.messages) == 4
+    assert session.messages[0]["content"] == "вопрос 1"
+    assert store.get(session.id) is session
+
+
+def test_expired_session_is_dropped():
+    store = ChatSessionStore(ttl_seconds=60)
+    session = store.create()
+    session.updated_at = time.time() - 61
+
+    assert store.get(session.id) is None
+    assert store.stats()["expired"] == 1
+
+
+def test_least_recently_used_session_is_evicted():
+    store = ChatSessionStore(max_sessions=2)
+    first = store.create()
+    second = store.create()
+    store.get(first.id)  # first становится самой свежей
+    store.create()
+
+    assert store.get(first.id) is first
+    assert store.get(second.id) is None
+    assert store.stats()["evictions"] == 1
+
+
+def test_sessions_survive_save_and_load(tmp_path):
+    path = tmp_path / "sessions.json"
+    store = ChatSessionStore(persist_path=str(path))
+    session = store.create([message("user", "Посоветуй джаз")])
+    expired = store.create()
+    expired.updated_at = time.time() - store.ttl_seconds - 1
+
+    assert store.save() == 1
+
+    restored = ChatSessionStore(persist_path=str(path))
+    assert restored.load() == 1
+    assert restored.get(session.id).messages == [message("user", "Посоветуй джаз")]
+
+
+def test_unknown_session_without_history_is_not_resumed():
+    store = ChatSessionStore(ttl_seconds=60)
+    session = store.create([message("user", "Посоветуй джаз")])
+    session.updated_at = time.time() - 61
+
+    # Истекшая сессия без истории - клиент должен повторить запрос с локальной историей
+    assert store.resume(session.id) is None
+    assert store.stats()["created"] == 1
+
+    restored = store.resume(session.id, [message("user", "Посоветуй джаз")])
+    assert restored.id != session.id
+    assert restored.messages == [message("user", "Посоветуй джаз")]
+    assert store.resume(restored.id) is restored
+    assert store.resume(None).messages == []
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для счетчиков совместных покупок (services/recommender/co_purchase.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from co_purchase import CoPurchaseIndex
+
+DAY = 86400
+
+
+def test_related_items_ranked_by_co_purchases():
+    index = CoPurchaseIndex()
+    index.record_order(["1", "2"])
+    index.record_order(["1", "2", "3"])
+    index.record_order(["1", "3"])
+    index.record_order(["1", "2"])
+
+    related = index.related(1)
+
+    assert [product_id for product_id, _, _ in related] == [2, 3]
+    assert related[0][1] == pytest.approx(3.0, rel=1e-3)
+    assert related[0][2] == pytest.approx(0.75, rel=1e-3)
+
+
+def test_old_orders_decay():
+    index = CoPurchaseIndex(half_life_days=10)
+    now = time.time()
+    for _ in range(3):
+        index.record_order([1, 2], timestamp=now - 40 * DAY)
+    index.record_order([1, 3], timestamp=now)
+
+    related = dict((product_id, weight) for product_id, weight, _ in index.related(1))
+
+    assert list(related) == [3, 2]
+    assert related[2] == pytest.approx(3 / 16, rel=1e-2)
+
+
+def test_future_orders_count_as_now():
+    index = CoPurchaseIndex(half_life_days=10)
+    index.record_order([1, 2], timestamp=time.time() + 40 * 365 * DAY)
+    index.record_order([1, 2], timestamp=253402300800.0)  # 9999-12-31
+    index.record_order([1, 3])
+    index.record_order([1, 3])
+
+    related = dict((product_id, weight) for product_id, weight, _ in index.related(1))
+
+    assert related[2] == pytest.approx(2.0, rel=1e-3)
+    assert related[3] == pytest.approx(2.0, rel=1e-3)
+    assert index.reference_time <= time.time()
+
+
+def test_top_n_is_maintained_incrementally():
+    index = CoPurchaseIndex(top_n=2)
+    index.record_order([1, 2])
+    index.record_order([1, 3])
+    index.record_order([1, 4])
+    index.record_order([1, 4])
+    index.record_order([1, 3])
+    index.record_order([1, 3])
+
+    assert [product_id for product_id, _, _ in index.related(1, limit=5)] == [3, 4]
+
+
+def test_duplicate_order_is_ignored():
+    index = CoPurchaseIndex()
+
+    assert index.record_order([1, 2], order_id="a")
+    assert not index.record_order([1, 2], order_id="a")
+    assert index.related(1)[0][1] == pytest.approx(1.0, rel=1e-3)
+
+
+def test_basket_excludes_its_own_items():
+    index = CoPurchaseIndex()
+    index.record_order([1, 2, 5])
+    index.record_order([2, 5])
+    index.record_order([1, 6])
+
+    related = [product_id for product_id, _, _ in index.related_to_basket([1, 2])]
+
+    assert related == [5, 6]
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    path = tmp_path / "co_purchases.json"
+    index = CoPurchaseIndex(persist_path=str(path))
+    index.record_order([1, 2], order_id="a")
+    index.record_order([1, 3], order_id="b")
+    index.record_order([1, 3], order_id="c")
+    index.save()
+
+    restored = CoPurchaseIndex(persist_path=str(path))
+    assert restored.load() == 3
+    assert [product_id for product_id, _, _ in restored.related(1)] == [3, 2]
+    assert not restored.record_order([1, 2], order_id="a")
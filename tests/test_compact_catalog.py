@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для колоночного хранения каталога (services/catalog/compact_catalog.py)
+"""
+
+import sys
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+# Добавляем директорию catalog в путь
+catalog_path = Path(__file__).parent.parent / "services" / "catalog"
+sys.path.insert(0, str(catalog_path))
+
+import compact_catalog
+from catalog_store import CatalogSnapshot, CatalogStore
+from compact_catalog import CompactProducts, CompactSnapshot
+
+
+class Record(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    name: str
+    artist: str
+    artist_id: Optional[int] = None
+    description: str
+    price: float
+    cover_url: Optional[str] = None
+
+
+def records():
+    return [
+        Record(id=1, name="Abbey Road", artist="The Beatles", artist_id=1, description="1969", price=3500.0, cover_url="a.jpg"),
+        Record(id=2, name="Кино", artist="Кино", artist_id=17, description="Группа крови", price=2500.0),
+        Record(id=3, name="Help!", artist="The Beatles", artist_id=1, description="", price=2500.0, cover_url="c.jpg"),
+        Record(id=5, name="Сборник", artist="Разные исполнители", description="СССР", price=1200.0),
+    ]
+
+
+def compact_store():
+    return CatalogStore(records(), snapshot_factory=lambda version, items: CompactSnapshot.from_products(version, items, Record))
+
+
+def test_columns_roundtrip_records():
+    columns = CompactProducts(records(), Record)
+
+    assert [columns.materialize(row) for row in range(len(columns))] == records()
+    assert columns.artists.values == ["The Beatles", "Кино", "Разные исполнители"]
+    assert columns.row_of(4) is None
+
+
+def test_select_matches_object_snapshot():
+    objects = CatalogSnapshot(1, records())
+    compact = CompactSnapshot.from_products(1, records(), Record)
+    queries = [
+        {},
+        {"artist_id": 1},
+        {"min_price": 2000, "max_price": 3000},
+        {"sort": "price"},
+        {"sort": "-price", "offset": 1, "limit": 2},
+        {"sort": "popular", "ranking": [5, 3]},
+    ]
+
+    for query in queries:
+        assert compact.select(**query) == objects.select(**query), query
+
+
+def test_updates_go_to_overlay_until_compaction(monkeypatch):
+    store = compact_store()
+    columns = store.current().base
+
+    with store.update() as draft:
+        draft.put(draft.get(2).model_copy(update={"price": 900.0}))
+        draft.delete(5)
+        draft.put(Record(id=draft.next_id(), name="New", artist="Кино", artist_id=17, description="", price=100.0))
+
+    snapshot = store.current()
+    assert snapshot.base is columns
+    assert [p.id for p in snapshot.products] == [1, 2, 3, 4]
+    assert len(snapshot) == 4
+    assert snapshot.get(5) is None
+    assert snapshot.select(artist_id=17, sort="price") == (2, [snapshot.get(4), snapshot.get(2)])
+
+    monkeypatch.setattr(compact_catalog, "COMPACT_OVERLAY_MIN", 0)
+    with store.update() as draft:
+        draft.delete(1)
+
+    compacted = store.current()
+    assert compacted.base is not columns and not compacted.overlay
+    assert [p.id for p in compacted.products] == [2, 3, 4]
+    assert compacted.get(2).price == 900.0
+
+
+def test_next_id_skips_deleted_tail():
+    store = compact_store()
+
+    with store.update() as draft:
+        draft.delete(5)
+        assert draft.next_id() == 4
+        assert not draft.delete(5)
+
+
+def test_short_page_with_ties_matches_full_sort():
+    items = [
+        Record(id=i, name=f"R{i}", artist="A", artist_id=i % 3, description="", price=float(1000 + (i * 7) % 5 * 100))
+        for i in range(1, 101)
+    ]
+    objects = CatalogSnapshot(1, items)
+    compact = CompactSnapshot.from_products(1, items, Record)
+
+    for query in ({"sort": "price", "limit": 7}, {"sort": "-price", "offset": 3, "limit": 5},
+                  {"sort": "popular", "ranking": [50, 10], "limit": 4}):
+        assert compact.select(**query) == objects.select(**query), query
+
+
+def test_fingerprint_covers_columns_and_overlay():
+    store, other = compact_store(), compact_store()
+    assert store.current().fingerprint() == other.current().fingerprint()
+
+    with store.update() as draft:
+        draft.put(draft.get(2).model_copy(update={"price": 900.0}))
+    assert store.current().fingerprint() != other.current().fingerprint()
+
+    changed = CompactSnapshot.from_products(1, [p if p.id != 3 else p.model_copy(update={"description": "x"})
+                                                for p in records()], Record)
+    assert changed.fingerprint() != other.current().fingerprint()
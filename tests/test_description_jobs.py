@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для состояния заданий массовой генерации описаний (services/recommender/description_jobs.py)
+"""
+
+import sys
+from pathlib import Path
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+import description_jobs
+from description_jobs import DescriptionJob, DescriptionJobStore
+
+
+def test_progress_counts_follow_item_status():
+    job = DescriptionJob([1, 2, 3, 4])
+    job.start()
+    job.mark(1, description_jobs.ITEM_RUNNING)
+    job.mark(1, description_jobs.ITEM_GENERATED)
+    job.mark(1, description_jobs.ITEM_SAVED)
+    job.mark(2, description_jobs.ITEM_FAILED, "LLM вернул пустое описание")
+
+    progress = job.progress()
+    assert progress["processed"] == 2
+    assert progress["percent"] == 50.0
+    assert progress["pending"] == 2
+    assert progress["saved"] == 1
+    assert progress["failed"] == 1
+
+
+def test_items_are_filtered_and_paginated():
+    job = DescriptionJob(range(1, 11))
+    for product_id in (2, 4, 6):
+        job.mark(product_id, description_jobs.ITEM_FAILED, "ошибка")
+
+    data = job.to_dict(include_items=True, item_status=description_jobs.ITEM_FAILED, offset=1, limit=1)
+    assert data["items_total"] == 3
+    assert data["items"] == [{"product_id": 4, "status": "failed", "error": "ошибка"}]
+    assert "items" not in job.to_dict()
+
+
+def test_cancel_returns_running_items_to_pending():
+    job = DescriptionJob([1, 2])
+    job.start()
+    job.mark(1, description_jobs.ITEM_RUNNING)
+    job.finish(description_jobs.JOB_CANCELLED)
+
+    assert job.items[1]["status"] == description_jobs.ITEM_PENDING
+    assert job.progress()["running"] == 0
+    assert job.finished
+
+
+def test_store_keeps_limited_number_of_finished_jobs():
+    store = DescriptionJobStore(keep_finished=1)
+    first = store.add(DescriptionJob([1]))
+    first.finish()
+    second = store.add(DescriptionJob([2]))
+    second.finish()
+    running = store.add(DescriptionJob([3]))
+
+    assert store.get(first.id) is None
+    assert [job.id for job in store.list()] == [second.id, running.id]
+    assert store.running() == [running]
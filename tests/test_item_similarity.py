@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для рекомендаций по сходству пластинок (services/recommender/item_similarity.py)
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from item_similarity import ItemSimilarityIndex, price_band
+
+RECORDS = [
+    SimpleNamespace(id=1, name="The Dark Side of the Moon", artist="Pink Floyd", description="Психоделический рок, концептуальный альбом", price=4000.0),
+    SimpleNamespace(id=2, name="The Wall", artist="Pink Floyd", description="Концептуальный двойной альбом", price=4800.0),
+    SimpleNamespace(id=3, name="Группа крови", artist="Кино", description="Советский рок, альбом 1988 года", price=3500.0),
+    SimpleNamespace(id=4, name="Kind of Blue", artist="Miles Davis", description="Джазовая классика", price=2500.0),
+]
+
+
+class TestItemSimilarityIndex:
+    """Тесты для ItemSimilarityIndex"""
+
+    def test_same_artist_is_most_similar(self):
+        index = ItemSimilarityIndex(RECORDS)
+        similar = index.similar([1], k=3)
+        assert similar[0][0].id == 2
+        # Сама исходная пластинка в рекомендации не попадает
+        assert 1 not in [record.id for record, score in similar]
+
+    def test_scores_sorted_and_bounded(self):
+        index = ItemSimilarityIndex(RECORDS)
+        scores = [score for record, score in index.similar([3], k=3)]
+        assert scores == sorted(scores, reverse=True)
+        assert all(0.0 <= score <= 1.0 + 1e-6 for score in scores)
+
+    def test_unknown_ids_and_small_catalog(self):
+        index = ItemSimilarityIndex(RECORDS)
+        assert index.similar([999]) == []
+        assert len(index.similar([1, 2, 3], k=10)) == 1
+
+    def test_price_band(self):
+        assert price_band(500) == 0
+        assert price_band(4500) == 4
+        assert price_band(100000) == 6
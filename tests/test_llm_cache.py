@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для кэша ответов LLM (services/recommender/llm_cache.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from llm_cache import LLMResponseCache
+
+MESSAGES = [
+    {"role": "system", "content": "Ты консультант магазина винила"},
+    {"role": "user", "content": "Посоветуй джаз"},
+]
+
+
+class TestLLMResponseCache:
+    """Тесты для LLMResponseCache"""
+
+    def test_key_depends_on_all_params(self):
+        """Ключ меняется при изменении модели, сообщений, температуры или лимита токенов"""
+        key = LLMResponseCache.make_key("openai/gpt-4o-mini", MESSAGES, 0.7, 1500)
+        assert key == LLMResponseCache.make_key("openai/gpt-4o-mini", list(MESSAGES), 0.7, 1500)
+        assert key != LLMResponseCache.make_key("openai/gpt-4o", MESSAGES, 0.7, 1500)
+        assert key != LLMResponseCache.make_key("openai/gpt-4o-mini", MESSAGES[:1], 0.7, 1500)
+        assert key != LLMResponseCache.make_key("openai/gpt-4o-mini", MESSAGES, 0.2, 1500)
+        assert key != LLMResponseCache.make_key("openai/gpt-4o-mini", MESSAGES, 0.7, 300)
+
+    def test_hit_and_miss(self):
+        """Повторный запрос отдается из кэша, статистика считается"""
+        cache = LLMResponseCache()
+        key = LLMResponseCache.make_key("m", MESSAGES, 0.7, 100)
+        assert cache.get(key) is None
+        cache.set(key, {"choices": []})
+        assert cache.get(key) == {"choices": []}
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется самая давно использованная запись"""
+        cache = LLMResponseCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        """Просроченные записи не отдаются"""
+        cache = LLMResponseCache(ttl_seconds=0.05)
+        cache.set("a", 1)
+        time.sleep(0.1)
+        assert cache.get("a") is None
+
+    def test_disabled_cache(self):
+        """max_entries=0 отключает кэш"""
+        cache = LLMResponseCache(max_entries=0)
+        assert not cache.enabled
+        cache.set("a", 1)
+        assert cache.stats()["entries"] == 0
+
+    def test_persistence(self, tmp_path):
+        """Кэш сохраняется на диск и подгружается новым экземпляром"""
+        path = tmp_path / "llm_cache.json"
+        cache = LLMResponseCache(persist_path=str(path))
+        cache.set("a", {"content": "Kind of Blue"})
+        assert cache.save() == 1
+
+        restored = LLMResponseCache(persist_path=str(path))
+        assert restored.load() == 1
+        assert restored.get("a") == {"content": "Kind of Blue"}
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для хеджированных запросов к моделям LLM (services/recommender/llm_hedging.py)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from llm_hedging import HedgeDeadlineExceeded, HedgePolicy, ModelLatencyTracker, hedged_call
+
+
+def fake_models(delays, failing=()):
+    """call(model): ответ через delays[model] секунд; отмененные модели запоминаются"""
+    cancelled = []
+
+    async def call(model):
+        try:
+            await asyncio.sleep(delays[model])
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        if model in failing:
+            raise RuntimeError("404 no endpoints")
+        return f"ответ {model}"
+
+    return call, cancelled
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    call, cancelled = fake_models({"primary": 5.0, "backup": 0.05})
+    policy = HedgePolicy(min_delay=0.05, default_delay=0.1, deadline=2.0)
+
+    result, model = asyncio.run(hedged_call(["primary", "backup"], call, policy, ModelLatencyTracker()))
+
+    assert (result, model) == ("ответ backup", "backup")
+    assert cancelled == ["primary"]
+
+
+def test_failed_model_starts_next_immediately():
+    call, _ = fake_models({"primary": 0.01, "backup": 0.01}, failing={"primary"})
+    policy = HedgePolicy(default_delay=10.0, deadline=1.0)
+
+    result, model = asyncio.run(hedged_call(["primary", "backup"], call, policy, ModelLatencyTracker()))
+
+    assert model == "backup"
+
+
+def test_deadline_bounds_total_time():
+    call, cancelled = fake_models({"primary": 5.0, "backup": 5.0})
+    policy = HedgePolicy(min_delay=0.01, default_delay=0.05, deadline=0.2)
+
+    with pytest.raises(HedgeDeadlineExceeded):
+        asyncio.run(hedged_call(["primary", "backup"], call, policy, ModelLatencyTracker()))
+    assert sorted(cancelled) == ["backup", "primary"]
+
+
+def test_hedge_delay_follows_observed_percentile():
+    tracker = ModelLatencyTracker()
+    policy = HedgePolicy(percentile=90.0, min_delay=1.0, default_delay=15.0)
+    assert policy.hedge_delay(tracker, "m") == 15.0
+
+    for seconds in range(1, 11):
+        tracker.record("m", float(seconds))
+    assert policy.hedge_delay(tracker, "m") == 9.0
+
+    tracker_fast = ModelLatencyTracker()
+    tracker_fast.record("m", 0.01)
+    assert policy.hedge_delay(tracker_fast, "m") == 1.0
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для ограничения одновременных запросов к LLM (services/recommender/llm_limiter.py)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from llm_limiter import LLMConcurrencyLimiter, LLMOverloadedError
+
+
+async def hold_slot(limiter, seconds):
+    async with limiter.slot():
+        await asyncio.sleep(seconds)
+        return "ok"
+
+
+async def run_concurrently(limiter, count, seconds):
+    return await asyncio.gather(
+        *[hold_slot(limiter, seconds) for _ in range(count)],
+        return_exceptions=True
+    )
+
+
+class TestLLMConcurrencyLimiter:
+    """Тесты для LLMConcurrencyLimiter"""
+
+    def test_queue_waits_for_free_slot(self):
+        """Запросы сверх лимита ждут в очереди и выполняются"""
+        limiter = LLMConcurrencyLimiter(max_concurrent=1, max_queue=2, queue_timeout=5)
+        results = asyncio.run(run_concurrently(limiter, 3, 0.01))
+        assert results == ["ok", "ok", "ok"]
+        assert limiter.stats()["completed"] == 3
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_full_queue_rejected_with_429(self):
+        limiter = LLMConcurrencyLimiter(max_concurrent=1, max_queue=0, queue_timeout=5)
+        results = asyncio.run(run_concurrently(limiter, 2, 0.05))
+        errors = [r for r in results if isinstance(r, LLMOverloadedError)]
+        assert len(errors) == 1
+        assert errors[0].status_code == 429
+        assert "Retry-After" in errors[0].headers
+
+    def test_queue_timeout_rejected_with_503(self):
+        limiter = LLMConcurrencyLimiter(max_concurrent=1, max_queue=5, queue_timeout=0.05)
+        results = asyncio.run(run_concurrently(limiter, 2, 0.3))
+        errors = [r for r in results if isinstance(r, LLMOverloadedError)]
+        assert len(errors) == 1
+        assert errors[0].status_code == 503
+        assert limiter.stats()["rejected_timeout"] == 1
+
+    def test_newcomer_does_not_jump_the_queue(self):
+        """Освободившееся место достается ожидающему в очереди, а не новому запросу"""
+        limiter = LLMConcurrencyLimiter(max_concurrent=1, max_queue=5, queue_timeout=1)
+        order = []
+
+        async def worker(name):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            release = asyncio.Event()
+
+            async def holder():
+                async with limiter.slot():
+                    await release.wait()
+
+            held = asyncio.ensure_future(holder())
+            await asyncio.sleep(0)
+            queued = asyncio.ensure_future(worker("queued"))
+            # Место освобождается, когда ожидающий уже в очереди, но еще не дошел до семафора
+            release.set()
+            newcomer = asyncio.ensure_future(worker("newcomer"))
+            await asyncio.gather(held, queued, newcomer)
+
+        asyncio.run(run())
+        assert order == ["queued", "newcomer"]
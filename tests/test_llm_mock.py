@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для заглушки OpenRouter (services/llm-mock/main.py)
+"""
+
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Каталог сервиса содержит дефис - загружаем модуль по пути
+mock_path = Path(__file__).parent.parent / "services" / "llm-mock" / "main.py"
+spec = importlib.util.spec_from_file_location("llm_mock_main", mock_path)
+llm_mock = importlib.util.module_from_spec(spec)
+sys.modules["llm_mock_main"] = llm_mock
+spec.loader.exec_module(llm_mock)
+
+CATALOG_PROMPT = """Ты - эксперт по виниловым пластинкам.
+
+## КАТАЛОГ ДОСТУПНЫХ ВИНИЛОВЫХ ПЛАСТИНОК
+ID: 1 | Название: Abbey Road | Исполнитель: The Beatles | Описание: ... | Цена: 3500₽
+ID: 2 | Название: The Dark Side of the Moon | Исполнитель: Pink Floyd | Описание: ... | Цена: 4000₽
+ID: 3 | Название: Kind of Blue | Исполнитель: Miles Davis | Описание: ... | Цена: 3000₽
+"""
+
+
+@pytest.fixture
+def client():
+    llm_mock.config = llm_mock.MockConfig(latency_distribution="fixed", latency_mean_ms=0, seed=1)
+    llm_mock.stats.clear()
+    llm_mock.stats_by_model.clear()
+    return TestClient(llm_mock.app)
+
+
+def completion(client, system, user="Посоветуй пластинку", **extra):
+    response = client.post("/api/v1/chat/completions", json={
+        "model": "openai/gpt-4o-mini",
+        "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+        **extra,
+    })
+    return response
+
+
+def test_recommendation_request_gets_json_with_catalog_ids(client):
+    response = completion(client, CATALOG_PROMPT + "- Количество рекомендаций: 2\n")
+
+    assert response.status_code == 200
+    data = json.loads(response.json()["choices"][0]["message"]["content"])
+    assert len(data["recommendations"]) == 2
+    assert {rec["id"] for rec in data["recommendations"]} <= {1, 2, 3}
+    assert response.json()["usage"]["total_tokens"] > 0
+
+
+def test_chat_answer_mentions_catalog_ids(client):
+    content = completion(client, CATALOG_PROMPT).json()["choices"][0]["message"]["content"]
+
+    assert "ID: " in content
+
+
+def test_stream_returns_openai_chunks(client):
+    llm_mock.config = llm_mock.config.model_copy(update={"stream_tokens_per_second": 0})
+    response = completion(client, CATALOG_PROMPT, stream=True)
+
+    events = [line[len("data: "):] for line in response.text.split("\n\n") if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    text = "".join(json.loads(event)["choices"][0]["delta"].get("content", "") for event in events[:-1])
+    assert "ID: " in text
+
+
+def test_error_rate_returns_provider_errors(client):
+    client.put("/api/v1/mock/config", json={"error_rate": 1.0, "error_statuses": [429]})
+
+    response = completion(client, CATALOG_PROMPT)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/api/v1/mock/stats").json()["errors"] == 1
+
+
+def test_invalid_config_is_rejected(client):
+    assert client.put("/api/v1/mock/config", json={"error_rate": 2}).status_code == 422
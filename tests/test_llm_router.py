@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для выбора модели LLM (services/recommender/llm_router.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from llm_hedging import ModelLatencyTracker
+from llm_router import ModelHealth, ModelRouter, Route, llm_deadline, remaining_time
+
+TIERS = {"big": "quality", "large": "quality", "small": "fast"}
+
+
+def make_router(**kwargs):
+    latency = ModelLatencyTracker()
+    routes = {
+        "chat": Route(["big", "large", "small"], tier="quality", deadline=30.0),
+        "simple": Route(["small", "big"], tier="fast", deadline=10.0),
+    }
+    return latency, ModelRouter(latency, routes, TIERS, **kwargs)
+
+
+def observe(latency, model, seconds, times=20):
+    for _ in range(times):
+        latency.record(model, seconds)
+
+
+def test_slow_primary_is_shifted_away():
+    latency, router = make_router()
+    observe(latency, "big", 12.0)
+    observe(latency, "large", 2.0)
+
+    assert router.candidates("chat")[:2] == ["large", "big"]
+
+
+def test_preferred_model_kept_while_close_to_best():
+    latency, router = make_router(switch_ratio=1.5)
+    observe(latency, "big", 3.0)
+    observe(latency, "large", 2.5)
+
+    assert router.candidates("chat", preferred="big")[0] == "big"
+    observe(latency, "big", 9.0, times=200)
+    assert router.candidates("chat", preferred="big")[0] == "large"
+
+
+def test_failing_model_is_ejected_for_cooldown(monkeypatch):
+    latency, router = make_router(health=ModelHealth(eject_after=2, cooldown_seconds=30))
+    observe(latency, "big", 1.0)
+    observe(latency, "large", 2.0)
+    router.health.record("big", ok=False)
+    router.health.record("big", ok=False)
+
+    assert "big" not in router.candidates("chat")
+
+    later = time.monotonic() + 31
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert "big" in router.candidates("chat")
+    # Отказ после cooldown снова исключает модель, успех - возвращает
+    router.health.record("big", ok=False)
+    assert not router.health.available("big")
+    router.health.record("big", ok=True)
+    assert router.health.available("big")
+
+
+def test_same_tier_models_come_before_downgrade():
+    latency, router = make_router()
+    observe(latency, "small", 0.5)
+    observe(latency, "big", 4.0)
+    observe(latency, "large", 5.0)
+
+    assert router.candidates("chat") == ["big", "large", "small"]
+    assert router.candidates("simple")[0] == "small"
+
+
+def test_models_slower_than_remaining_time_go_last():
+    latency, router = make_router()
+    observe(latency, "big", 8.0)
+    observe(latency, "large", 9.0)
+    observe(latency, "small", 1.0)
+
+    assert router.candidates("chat", remaining=5.0)[0] == "small"
+
+
+def test_timeout_follows_p99_and_remaining_time():
+    latency, router = make_router(timeout_multiplier=2.0, min_timeout=5.0, max_timeout=60.0)
+
+    assert router.timeout("big") == 60.0
+    observe(latency, "big", 4.0)
+    assert router.timeout("big") == pytest.approx(8.0)
+    observe(latency, "small", 0.5)
+    assert router.timeout("small") == 5.0
+    assert router.timeout("big", remaining=3.0) == 3.0
+
+
+def test_remaining_time_uses_deadline_context():
+    assert remaining_time() is None
+    token = llm_deadline.set(time.monotonic() + 10)
+    try:
+        assert 9 < remaining_time() <= 10
+    finally:
+        llm_deadline.reset(token)
+
+
+def test_route_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTE_CHAT_MODELS", "small, big")
+    monkeypatch.setenv("LLM_ROUTE_CHAT_DEADLINE_SECONDS", "12")
+
+    route = Route.from_env("chat", TIERS, tier="quality")
+
+    assert (route.models, route.tier, route.deadline) == (["small", "big"], "quality", 12.0)
+    assert Route.from_env("simple", TIERS, tier="fast").models == ["small", "big", "large"]
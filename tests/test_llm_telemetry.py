@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для телеметрии вызовов LLM (services/recommender/llm_telemetry.py)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from llm_telemetry import LatencyHistogram, LLMTelemetry, llm_endpoint
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    histogram = LatencyHistogram(buckets=(1.0, 2.0, 5.0))
+    for seconds in (0.5, 0.7, 1.5, 4.0, 9.0):
+        histogram.observe(seconds)
+
+    assert histogram.percentile(40) == 1.0
+    assert histogram.percentile(60) == 2.0
+    assert histogram.percentile(100) == 9.0
+    assert histogram.to_dict()["buckets_le"] == {"1.0": 2, "2.0": 3, "5.0": 4, "+Inf": 5}
+
+
+def test_calls_are_grouped_by_endpoint_and_model_with_cost():
+    telemetry = LLMTelemetry(prices={"m": (1.0, 2.0)})
+
+    llm_endpoint.set("generate")
+    telemetry.record_call("m", 1.2, prompt_tokens=1_000_000, completion_tokens=500_000, retries=1)
+    telemetry.record_cache_hit("m")
+    llm_endpoint.set("chat/message")
+    telemetry.record_call("m", 0.4, outcome="timeout")
+
+    endpoints = telemetry.metrics()["endpoints"]
+    generate = endpoints["generate"]["models"]["m"]
+    assert (generate["calls"], generate["ok"], generate["retries"], generate["cache_hits"]) == (1, 1, 1, 1)
+    assert generate["cost_usd"] == pytest.approx(2.0)
+    assert endpoints["chat/message"]["models"]["m"]["timeout"] == 1
+
+
+def test_endpoint_is_inherited_by_tasks():
+    telemetry = LLMTelemetry(prices={})
+
+    async def handler():
+        llm_endpoint.set("generate-description")
+        await asyncio.create_task(asyncio.sleep(0, result=telemetry.record_endpoint_event("fallbacks")))
+        await asyncio.gather(*(call() for _ in range(2)))
+
+    async def call():
+        telemetry.record_call("m", 0.1)
+
+    asyncio.run(handler())
+
+    endpoint = telemetry.metrics()["endpoints"]["generate-description"]
+    assert endpoint["fallbacks"] == 1
+    assert endpoint["models"]["m"]["calls"] == 2
+
+
+def test_summary_covers_only_recent_window():
+    telemetry = LLMTelemetry(prices={"m": (1.0, 1.0)}, window_seconds=60)
+    llm_endpoint.set("generate")
+    telemetry.record_call("m", 3.0, prompt_tokens=100)
+    telemetry.record_call("m", 1.0, outcome="error")
+    telemetry._recent[0] = (telemetry._recent[0][0] - 120,) + telemetry._recent[0][1:]
+
+    summary = telemetry.summary()
+
+    assert summary["calls"] == 1
+    assert summary["endpoints"]["generate"]["errors"] == 1
+    assert summary["endpoints"]["generate"]["p50_seconds"] == 1.0
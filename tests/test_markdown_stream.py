@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для потоковой очистки Markdown (services/recommender/markdown_stream.py)
+"""
+
+import random
+import sys
+from pathlib import Path
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from markdown_stream import MarkdownStreamCleaner, clean_markdown_line
+
+LLM_RESPONSE = """### Рекомендации для вас
+
+1. **Abbey Road** (ID 1) - классика *The Beatles*, 1969 год.
+2. **“Группа крови”** — ID 37.
+
+- Цена:   3500₽
+## Итог
+Приятного   прослушивания!"""
+
+EXPECTED = """Рекомендации для вас
+Abbey Road (ID 1) - классика The Beatles, 1969 год.
+"Группа крови" — ID 37.
+Цена: 3500₽
+Итог
+Приятного прослушивания!"""
+
+
+def stream_through_cleaner(text, chunk_sizes):
+    cleaner = MarkdownStreamCleaner()
+    output = []
+    position = 0
+    for size in chunk_sizes:
+        output.append(cleaner.feed(text[position:position + size]))
+        position += size
+    output.append(cleaner.feed(text[position:]))
+    output.append(cleaner.flush())
+    return "".join(output)
+
+
+class TestMarkdownStreamCleaner:
+    """Тесты для MarkdownStreamCleaner"""
+
+    def test_clean_markdown_line(self):
+        assert clean_markdown_line("### **Заголовок**") == "Заголовок"
+        assert clean_markdown_line("  - пункт списка") == "пункт списка"
+        assert clean_markdown_line("2. “Кино”") == '"Кино"'
+
+    def test_whole_text_at_once(self):
+        assert stream_through_cleaner(LLM_RESPONSE, []) == EXPECTED
+
+    def test_random_chunking_gives_same_result(self):
+        """Результат не зависит от того, как LLM разбил ответ на фрагменты"""
+        rng = random.Random(42)
+        for _ in range(50):
+            chunk_sizes = [rng.randint(1, 7) for _ in range(len(LLM_RESPONSE))]
+            assert stream_through_cleaner(LLM_RESPONSE, chunk_sizes) == EXPECTED
+
+    def test_markup_tail_is_held_back(self):
+        """Незавершенная разметка в конце фрагмента не отдается клиенту"""
+        cleaner = MarkdownStreamCleaner()
+        assert cleaner.feed("Привет **") == "Привет"
+        assert cleaner.feed("мир**") == " мир"
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для межсервисных вызовов внутри монолита (services/monolith/in_process.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import anyio
+import anyio.to_thread
+import httpx
+import requests
+from fastapi import FastAPI
+
+# Добавляем директорию monolith в путь
+monolith_path = Path(__file__).parent.parent / "services" / "monolith"
+sys.path.insert(0, str(monolith_path))
+
+import in_process
+from in_process import InProcessAdapter
+
+POOL_SIZE = 4
+
+
+def make_apps():
+    """catalog -> sync-эндпоинт; cart -> sync-эндпоинт, который синхронно вызывает catalog"""
+    catalog = FastAPI()
+    cart = FastAPI()
+    session = requests.Session()
+    session.mount("http://catalog", InProcessAdapter(catalog))
+
+    @catalog.get("/price")
+    def price():
+        time.sleep(0.02)
+        return {"price": 100.0, "depth": in_process.nesting_depth.get()}
+
+    @cart.get("/total")
+    def total():
+        return session.get("http://catalog/price", timeout=10).json()
+
+    return cart
+
+
+def test_nested_sync_calls_beyond_pool_size_do_not_deadlock():
+    in_process.install(POOL_SIZE)
+    cart = make_apps()
+
+    async def main():
+        # Общий пул меньше числа одновременных запросов: все его потоки ждут вложенных вызовов
+        anyio.to_thread.current_default_thread_limiter().total_tokens = POOL_SIZE
+        results = []
+
+        async def get_total(client):
+            response = await client.get("/total")
+            results.append(response.json())
+
+        with anyio.fail_after(5):
+            transport = httpx.ASGITransport(app=cart)
+            async with httpx.AsyncClient(transport=transport, base_url="http://cart") as client:
+                async with anyio.create_task_group() as tasks:
+                    for _ in range(POOL_SIZE * 4):
+                        tasks.start_soon(get_total, client)
+        return results
+
+    results = anyio.run(main)
+
+    assert results == [{"price": 100.0, "depth": 1}] * (POOL_SIZE * 4)
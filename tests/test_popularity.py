@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для счетчиков популярности пластинок (services/catalog/popularity.py)
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию catalog в путь
+catalog_path = Path(__file__).parent.parent / "services" / "catalog"
+sys.path.insert(0, str(catalog_path))
+
+from popularity import PopularityCounters
+
+DAY = 86400
+
+
+def test_orders_outweigh_views():
+    counters = PopularityCounters(event_weights={"order": 1.0, "view": 0.1})
+    for _ in range(5):
+        counters.record("view", 3)
+    counters.record("order", 7, quantity=2)
+
+    assert counters.ranking() == [7, 3]
+    assert counters.score(7) == pytest.approx(2.0, rel=1e-3)
+    assert counters.score(3) == pytest.approx(0.5, rel=1e-3)
+
+
+def test_old_events_decay():
+    counters = PopularityCounters(half_life_days=7)
+    now = time.time()
+    for _ in range(4):
+        counters.record("order", 1, timestamp=now - 21 * DAY)
+    counters.record("order", 2, timestamp=now)
+
+    assert counters.top(2)[0][0] == 2
+    assert counters.score(1) == pytest.approx(0.5, rel=1e-2)
+
+
+def test_rescale_keeps_scores():
+    counters = PopularityCounters(half_life_days=1)
+    counters.record("order", 1, quantity=3)
+    counters.reference_time -= 100 * DAY  # Веса накоплены давно - следующее событие пересчитает масштаб
+    old = counters.score(1)
+    counters.record("order", 2)
+
+    assert counters.reference_time == pytest.approx(time.time(), abs=5)
+    assert counters.score(1) == pytest.approx(old, abs=1e-12)
+    assert counters.ranking() == [2, 1]
+
+
+def test_forget_removes_product():
+    counters = PopularityCounters()
+    counters.record("order", 1)
+    counters.record("order", 2)
+    counters.forget(1)
+
+    assert counters.ranking() == [2]
+    assert counters.top(5) == [(2, pytest.approx(1.0, rel=1e-3))]
+
+
+@pytest.fixture
+def catalog_client(monkeypatch):
+    """Catalog service в процессе (счетчики популярности - свежие)"""
+    import importlib.util
+    from fastapi.testclient import TestClient
+
+    spec = importlib.util.spec_from_file_location("catalog_main_popularity", catalog_path / "main.py")
+    catalog_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(catalog_main)
+    monkeypatch.setattr(catalog_main, "popularity", PopularityCounters())
+    return catalog_main, TestClient(catalog_main.app)
+
+
+def test_unknown_or_huge_ids_are_ignored(catalog_client):
+    catalog_main, client = catalog_client
+    client.post("/api/v1/products/events", json={"event": "view", "product_ids": ["3"]})
+    size = len(catalog_main.popularity._scores)
+
+    response = client.post("/api/v1/products/events", json={"event": "view", "product_ids": ["50000000", "999", "-1", "x"]})
+
+    assert response.json() == {"recorded": 0}
+    assert len(catalog_main.popularity._scores) == size
+
+
+def test_order_quantity_is_clamped_and_orders_without_token_rejected(catalog_client):
+    catalog_main, client = catalog_client
+    service = {"X-Service-Token": catalog_main.SERVICE_TOKEN}
+
+    client.post("/api/v1/products/events", json={"event": "order", "product_ids": ["3"], "quantities": {"3": 1000000}},
+                headers=service)
+    anonymous = client.post("/api/v1/products/events", json={"event": "order", "product_ids": ["5"]})
+    forged = client.post("/api/v1/products/events", json={"event": "order", "product_ids": ["5"]},
+                         headers={"X-Service-Token": "guess"})
+
+    assert catalog_main.popularity.score(3) == pytest.approx(catalog_main.POPULARITY_MAX_QUANTITY, rel=1e-3)
+    assert anonymous.status_code == 403 and forged.status_code == 403
+    assert catalog_main.popularity.score(5) == 0.0
+
+
+def test_deleted_product_score_is_forgotten(catalog_client):
+    catalog_main, client = catalog_client
+    last_id = max(p.id for p in catalog_main.catalog.current().products)
+    client.post("/api/v1/products/events", json={"event": "order", "product_ids": [str(last_id)]},
+                headers={"X-Service-Token": catalog_main.SERVICE_TOKEN})
+    assert catalog_main.popularity.score(last_id) > 0
+
+    assert client.delete(f"/api/v1/admin/products/{last_id}").status_code == 200
+    assert catalog_main.popularity.score(last_id) == 0.0
+
+    # Событие по старому снимку после удаления не достается новой пластинке с тем же ID
+    catalog_main.popularity.record("order", last_id)
+    created = client.post("/api/v1/admin/products", json={"name": "New", "artist_name": "A", "description": "", "price": 1.0})
+    assert created.json()["id"] == last_id
+    assert catalog_main.popularity.score(last_id) == 0.0
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для локальной таблицы цен cart service (services/cart/price_table.py)
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию cart в путь
+cart_path = Path(__file__).parent.parent / "services" / "cart"
+sys.path.insert(0, str(cart_path))
+
+from cart_store import CartLine, CartStore
+from price_table import PriceTable
+
+
+class FakeCatalog:
+    """Каталог с версией: на If-None-Match текущей версии отвечает 304"""
+
+    def __init__(self, products):
+        self.products = products
+        self.version = 1
+        self.available = True
+        self.requests = []
+        self.seq = 0  # Позиция ленты изменений на момент загрузки
+
+    def update(self, products):
+        self.products = products
+        self.version += 1
+
+    def fetch(self, etag):
+        self.requests.append(etag)
+        if not self.available:
+            raise ConnectionError("catalog down")
+        current = f'"{self.version}"'
+        if etag == current:
+            return 304, current, None
+        return 200, current, {"products": self.products, "version": self.version, "epoch": "e1", "seq": self.seq}
+
+
+def product(product_id, price):
+    return {"id": product_id, "name": f"Album {product_id}", "artist": "Artist", "price": price}
+
+
+def test_load_and_lookup():
+    catalog = FakeCatalog([product(1, 10.0), product(2, 25.5)])
+    table = PriceTable()
+
+    assert table.refresh(catalog.fetch)
+    assert table.get("2").price == 25.5
+    assert table.get("2").title == "Album 2"
+    assert table.get("3") is None
+    assert table.version == 1
+
+
+def test_unchanged_catalog_is_not_downloaded_again():
+    catalog = FakeCatalog([product(1, 10.0)])
+    table = PriceTable()
+    table.refresh(catalog.fetch)
+    entries = table.entries
+
+    assert not table.refresh(catalog.fetch)
+    assert table.entries is entries
+    assert table.not_modified == 1
+    assert catalog.requests == [None, '"1"']
+
+
+def test_new_version_replaces_table():
+    catalog = FakeCatalog([product(1, 10.0), product(2, 20.0)])
+    table = PriceTable()
+    table.refresh(catalog.fetch)
+    catalog.update([product(1, 12.0)])
+
+    assert table.refresh(catalog.fetch)
+    assert table.get("1").price == 12.0
+    assert table.get("2") is None
+    assert table.version == 2
+
+
+def test_failure_keeps_last_version():
+    catalog = FakeCatalog([product(1, 10.0)])
+    table = PriceTable()
+    table.refresh(catalog.fetch)
+    catalog.available = False
+
+    with pytest.raises(ConnectionError):
+        table.refresh(catalog.fetch)
+    assert table.get("1").price == 10.0
+    assert table.failures == 1
+    assert table.stats()["last_error"] == "catalog down"
+
+
+def test_cart_is_repriced_once_per_catalog_version():
+    store = CartStore()
+    cart = store.create()
+    store.update(cart, [(CartLine("1", "A", "X", 10.0), 2), (CartLine("2", "B", "Y", 5.0), 1)])
+    prices = {"1": 12.0}
+
+    assert store.reprice(cart, 2, prices.get)
+    assert cart.total_cents == 2900
+    assert cart.lines["2"].price_cents == 500
+    prices["1"] = 15.0
+    assert not store.reprice(cart, 2, prices.get)
+    assert cart.total_cents == 2900
+
+
+def test_changes_feed_updates_table():
+    catalog = FakeCatalog([product(1, 10.0), product(2, 20.0)])
+    catalog.seq = 4
+    table = PriceTable()
+    table.refresh(catalog.fetch)
+
+    assert table.apply_changes({"epoch": "e1", "seq": 6, "version": 3, "etag": '"3"', "reset": False, "changes": [
+        {"seq": 5, "op": "update", "product_id": 1, "product": product(1, 15.0)},
+        {"seq": 6, "op": "delete", "product_id": 2, "product": None},
+    ]})
+    assert table.get("1").price == 15.0
+    assert table.get("2") is None
+    assert table.feed_seq == 6 and table.etag == '"3"'
+    assert not table.apply_changes({"epoch": "e2", "seq": 1, "reset": False, "changes": []})
+    assert not table.apply_changes({"epoch": "e1", "seq": 6, "reset": True, "changes": []})
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для сборки промпта чата в бюджете токенов (services/recommender/prompt_budget.py)
+"""
+
+import sys
+from pathlib import Path
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from prompt_budget import TokenCounter, fit_history, summarize_history
+
+
+def make_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Вопрос {i} про джаз и рок семидесятых"})
+        history.append({"role": "assistant", "content": f"Рекомендую ID: {i + 1} - отличная пластинка"})
+    return history
+
+
+def test_token_count_depends_on_model():
+    text = "Атмосферный прог-рок семидесятых " * 10
+    # Без токенизатора - оценка по символам с коэффициентом провайдера
+    assert TokenCounter("meta-llama/llama-3-8b-instruct").count(text) > TokenCounter("google/gemini-pro-1.5").count(text)
+    assert TokenCounter("openai/gpt-4o-mini").count("") == 0
+
+
+def test_fit_history_keeps_most_recent_messages_within_budget():
+    counter = TokenCounter("google/gemini-pro-1.5")
+    history = make_history(10)
+    budget = sum(counter.count_message(message) for message in history[-4:])
+
+    kept, older = fit_history(history, budget, counter.count_message)
+
+    assert kept == history[-4:]
+    assert older == history[:-4]
+    assert fit_history(history, 10 ** 6, counter.count_message) == (history, [])
+
+
+def test_summary_lists_user_requests_and_suggested_ids():
+    summary = summarize_history(make_history(2), budget=1000, count=TokenCounter("openai/gpt-4o-mini").count)
+
+    assert summary.splitlines() == [
+        "- Пользователь: Вопрос 0 про джаз и рок семидесятых",
+        "- Консультант предложил пластинки: ID 1",
+        "- Пользователь: Вопрос 1 про джаз и рок семидесятых",
+        "- Консультант предложил пластинки: ID 2",
+    ]
+
+
+def test_summary_drops_oldest_points_to_fit_budget():
+    counter = TokenCounter("openai/gpt-4o-mini")
+    full = summarize_history(make_history(50), budget=10 ** 6, count=counter.count)
+    short = summarize_history(make_history(50), budget=60, count=counter.count)
+
+    assert counter.count(short) <= 60
+    assert full.endswith(short)
+    assert "ID 50" in short
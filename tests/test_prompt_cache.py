@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для кэша промптов recommender (services/recommender/prompt_cache.py)
+"""
+
+import sys
+from pathlib import Path
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from prompt_cache import PromptCache
+
+
+class TestPromptCache:
+    """Тесты для PromptCache"""
+
+    def test_hit_and_ttl(self):
+        """Свежий промпт отдается из кэша, просроченный - нет, но доступен как stale"""
+        cache = PromptCache(ttl_seconds=300)
+        assert cache.get("chat_consultant_prompt") is None
+        cache.set("chat_consultant_prompt", "Ты консультант", version=1)
+        assert cache.get("chat_consultant_prompt") == "Ты консультант"
+
+        cache.ttl_seconds = 0
+        assert cache.get("chat_consultant_prompt") is None
+        assert cache.get_stale("chat_consultant_prompt") == "Ты консультант"
+
+    def test_feed_invalidates_changed_prompt(self):
+        """Изменение из ленты удаляет только измененный промпт"""
+        cache = PromptCache()
+        cache.apply_changes({"epoch": "e1", "seq": 0, "reset": False, "changes": []})
+        cache.set("description_prompt", "v1", version=1)
+        cache.set("recommendation_prompt", "r1", version=1)
+
+        cache.apply_changes({
+            "epoch": "e1", "seq": 1, "reset": False,
+            "changes": [{"seq": 1, "prompt_id": "description_prompt", "version": 2}]
+        })
+        assert cache.get("description_prompt") is None
+        assert cache.get("recommendation_prompt") == "r1"
+        assert cache.feed_seq == 1
+
+    def test_feed_skips_already_fetched_version(self):
+        """Если в кэше уже та же версия, что и в ленте, промпт не сбрасывается"""
+        cache = PromptCache()
+        cache.apply_changes({"epoch": "e1", "seq": 0, "reset": False, "changes": []})
+        cache.set("description_prompt", "v2", version=2)
+        cache.apply_changes({
+            "epoch": "e1", "seq": 1, "reset": False,
+            "changes": [{"seq": 1, "prompt_id": "description_prompt", "version": 2}]
+        })
+        assert cache.get("description_prompt") == "v2"
+
+    def test_epoch_change_resets_cache(self):
+        """Перезапуск prompts-manager (новый epoch) сбрасывает весь кэш"""
+        cache = PromptCache()
+        cache.apply_changes({"epoch": "e1", "seq": 5, "reset": False, "changes": []})
+        cache.set("description_prompt", "v1", version=1)
+        cache.apply_changes({"epoch": "e2", "seq": 0, "reset": True, "changes": []})
+        assert cache.get("description_prompt") is None
+        assert cache.feed_epoch == "e2"
+        assert cache.feed_seq == 0
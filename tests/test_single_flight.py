@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для объединения одинаковых одновременных запросов (services/recommender/single_flight.py)
+"""
+
+import asyncio
+import contextvars
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from single_flight import SingleFlight
+
+
+def counting_factory(result="ответ", delay=0.05, error=None):
+    """factory(): запрос с задержкой; calls - сколько раз он реально выполнялся"""
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return factory, calls
+
+
+def test_concurrent_calls_share_one_request():
+    flight = SingleFlight("test")
+    factory, calls = counting_factory()
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", factory, label="model") for _ in range(5)))
+
+    assert asyncio.run(run()) == ["ответ"] * 5
+    assert len(calls) == 1
+    stats = flight.stats()
+    assert (stats["executed"], stats["coalesced"], stats["peak_waiters"]) == (1, 4, 5)
+    assert stats["top_coalesced"] == {"model": 4}
+    assert stats["in_flight"] == []
+
+
+def test_error_is_shared_and_next_call_runs_again():
+    flight = SingleFlight("test")
+    factory, calls = counting_factory(error=RuntimeError("catalog down"))
+
+    async def run():
+        results = await asyncio.gather(flight.do("key", factory), flight.do("key", factory), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            await flight.do("key", factory)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_others():
+    flight = SingleFlight("test")
+    factory, _ = counting_factory(delay=0.1)
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("key", factory))
+        second = asyncio.ensure_future(flight.do("key", factory))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "ответ"
+
+
+def test_request_is_cancelled_when_all_waiters_leave():
+    flight = SingleFlight("test")
+    cancelled = []
+
+    async def factory():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        waiter = asyncio.ensure_future(flight.do("key", factory))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert cancelled == [True]
+    assert flight.stats()["in_flight"] == []
+
+
+def test_shared_request_does_not_inherit_first_caller_context():
+    flight = SingleFlight("test")
+    endpoint = contextvars.ContextVar("endpoint", default="other")
+    deadline = contextvars.ContextVar("deadline", default=None)
+    seen = []
+
+    async def factory():
+        seen.append((endpoint.get(), deadline.get()))
+        await asyncio.sleep(0.05)
+        return "ответ"
+
+    async def call(name, call_deadline, timeout=None):
+        endpoint.set(name)
+        deadline.set(call_deadline)
+        return await flight.do("key", factory, timeout=timeout)
+
+    async def run():
+        first = asyncio.ensure_future(call("generate-description", 1.0, timeout=0.01))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(call("chat/message", 60.0))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(run())
+
+    # Контекст первого вызывающего не попадает в общий запрос, его таймаут не касается второго
+    assert seen == [("other", None)]
+    assert isinstance(first, asyncio.TimeoutError)
+    assert second == "ответ"
+    assert flight.stats()["coalesced"] == 1
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для поиска упоминаний пластинок в ответе LLM (services/recommender/title_matcher.py)
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем директорию recommender в путь
+recommender_path = Path(__file__).parent.parent / "services" / "recommender"
+sys.path.insert(0, str(recommender_path))
+
+from title_matcher import TitleMatcher
+
+
+def make_record(record_id, name):
+    return SimpleNamespace(id=record_id, name=name)
+
+
+RECORDS = [
+    make_record(1, "Abbey Road"),
+    make_record(2, "The Dark Side of the Moon"),
+    make_record(3, "Kind of Blue"),
+    make_record(4, "Blue"),
+    # Названия из каталога, совпадающие с обычными словами
+    make_record(28, "Это всё"),
+    make_record(31, "Разлука"),
+    make_record(38, "Аквариум"),
+]
+
+
+def found(text):
+    return [(mention.record.id, mention.kind) for mention in TitleMatcher(RECORDS).find_mentions(text)]
+
+
+def test_titles_found_in_one_pass_in_text_order():
+    text = 'Послушайте **“Kind of Blue”** - модальный джаз, а затем "abbey road".'
+    assert found(text) == [(3, "title"), (1, "title")]
+
+
+def test_longest_title_wins_and_word_boundaries_are_respected():
+    # "Blue" внутри "Kind of Blue" и в слове "Bluesman" не считается отдельным упоминанием
+    assert found('"Kind of Blue" и **Bluesman**') == [(3, "title")]
+
+
+def test_title_without_article_and_id_mentions():
+    mentions = TitleMatcher(RECORDS).find_mentions('ID: 1 и "Dark Side of the Moon" (#2), ID: 99')
+    assert [(m.record.id, m.kind) for m in mentions] == [(1, "id"), (2, "title"), (2, "id")]
+    assert mentions[1].start == len('ID: 1 и "')
+
+
+def test_quoted_title_with_changed_words_matched_fuzzily():
+    assert found('Рекомендую "Dark Side of Moon Remastered"') == [(2, "fuzzy")]
+
+
+def test_titles_outside_quotes_or_bold_are_not_mentions():
+    assert found("Это всё, что я могу предложить из нашего каталога.") == []
+    assert found("Аквариум — отличная группа, но их пластинок сейчас нет.") == []
+    assert found("Разлука с любимой музыкой не продлится долго.") == []
+
+
+def test_quoted_and_bold_common_word_titles_are_mentions():
+    assert found('Рекомендую "Это всё" и **Разлука** - классика рока.') == [(28, "title"), (31, "title")]